@@ -0,0 +1,234 @@
+"""
+analytics.py  —  Slot history log and time-bucketed occupancy rollups
+─────────────────────────────────────────────────────────────────────
+Every committed ParkingSlot.status change becomes one append-only event:
+
+    (lot_id, slot_code, old_status, new_status, since, at, source)
+
+`since` is when the slot entered old_status (ParkingSlot.status_since), so
+each event describes a whole closed interval on its own. That makes the
+rollups additive: any worker can fold its own events into the shared
+buckets with "x = x + delta" and the totals stay correct, whatever order
+events arrive in.
+
+Per lot, slot and minute / hour bucket the rollup keeps:
+
+  occupied_s / reserved_s / blocked_s   seconds spent in that status
+  arrivals / departures                 transitions into / out of occupied
+  dwell_s                               summed dwell of the departures
+  block_incidents                       transitions into blocked
+
+Request handlers only enqueue events; a background thread writes them in
+batches (bulk insert + one upsert per touched bucket). Dashboards read the
+rollups, so a query costs O(buckets), not O(events). Intervals that are
+still open (a car parked right now) are added at read time from the live
+slot table — see open_intervals().
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+import metrics
+from log_config import get_logger
+
+log = get_logger("smartpark.analytics")
+
+GRANULARITIES = {"minute": timedelta(minutes=1), "hour": timedelta(hours=1)}
+TRACKED = {"occupied": "occupied_s", "reserved": "reserved_s", "blocked": "blocked_s"}
+COUNTERS = ("occupied_s", "reserved_s", "blocked_s",
+            "arrivals", "departures", "dwell_s", "block_incidents")
+
+FLUSH_INTERVAL = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", 1.0))
+QUEUE_SIZE = int(os.getenv("ANALYTICS_QUEUE_SIZE", 10000))
+MINUTE_RETENTION = timedelta(days=int(os.getenv("ANALYTICS_MINUTE_RETENTION_DAYS", 7)))
+
+EVENTS = metrics.REGISTRY.counter(
+    "smartpark_slot_events_total", "Slot status events by outcome", labels=("outcome",))
+
+
+def bucket_start(ts, granularity):
+    if granularity == "minute":
+        return ts.replace(second=0, microsecond=0)
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def split_interval(start, end, granularity):
+    """Yield (bucket_start, seconds) for the part of [start, end) in each bucket."""
+    step = GRANULARITIES[granularity]
+    b = bucket_start(start, granularity)
+    while b < end:
+        lo, hi = max(start, b), min(end, b + step)
+        if hi > lo:
+            yield b, (hi - lo).total_seconds()
+        b += step
+
+
+def rollup(events, granularities=tuple(GRANULARITIES), now=None):
+    """
+    Fold events into {(granularity, bucket_start, lot_id, slot_code): {counter: delta}}.
+    Minute buckets older than MINUTE_RETENTION would only be purged again, so
+    a long interval is split into minutes from the retention cutoff on; the
+    hour buckets still cover all of it.
+    """
+    cutoff = (now or datetime.now()) - MINUTE_RETENTION
+    out = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    for e in events:
+        lot, slot, old, new, since, at = (e["lot_id"], e["slot_code"], e["old_status"],
+                                          e["new_status"], e["status_since"], e["created_at"])
+        for g in granularities:
+            if old in TRACKED and since is not None and since < at:
+                start = max(since, cutoff) if g == "minute" else since
+                for b, seconds in split_interval(start, at, g):
+                    out[(g, b, lot, slot)][TRACKED[old]] += seconds
+            cell = out[(g, bucket_start(at, g), lot, slot)]
+            if new == "occupied" and old != "occupied":
+                cell["arrivals"] += 1
+            if old == "occupied" and new != "occupied":
+                cell["departures"] += 1
+                if since is not None:
+                    cell["dwell_s"] += (at - since).total_seconds()
+            if new == "blocked" and old != "blocked":
+                cell["block_incidents"] += 1
+    return out
+
+
+def open_intervals(slots, start, end, granularity):
+    """
+    Rollup deltas for intervals that have not closed yet.
+    `slots` is an iterable of (lot_id, slot_code, status, status_since).
+    """
+    out = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    for lot, code, status, since in slots:
+        if status not in TRACKED or since is None:
+            continue
+        for b, seconds in split_interval(max(since, start), end, granularity):
+            out[(granularity, b, lot, code)][TRACKED[status]] += seconds
+    return out
+
+
+class SlotHistory:
+    """Asynchronous writer for the slot event log and its rollups."""
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL, maxsize=QUEUE_SIZE):
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._purged_at = 0.0
+        self.app = None
+
+    def bind(self, app, db, event_model, rollup_model):
+        self.app, self.db = app, db
+        self.Event, self.Rollup = event_model, rollup_model
+
+    def record(self, events):
+        """Queue events (dicts) for writing; never blocks the caller."""
+        self._ensure_thread()
+        for e in events:
+            try:
+                self._queue.put_nowait(e)
+                EVENTS.inc(outcome="queued")
+            except queue.Full:
+                EVENTS.inc(outcome="dropped")
+
+    def flush(self):
+        """Block until everything queued so far has been written."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def _ensure_thread(self):
+        # started lazily so each gunicorn worker gets its own writer after fork
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True,
+                                                name="slot-history")
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < 1000:
+                try:
+                    batch.append(self._queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                with self.app.app_context():
+                    self.write(batch)
+                    EVENTS.inc(len(batch), outcome="written")
+            except Exception as e:
+                EVENTS.inc(len(batch), outcome="failed")
+                log.warning("slot history write failed", extra={"events": len(batch),
+                                                                "error": str(e)})
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def write(self, events):
+        """Insert events and add their rollup deltas, in one transaction."""
+        session = self.db.session
+        deltas = rollup(events)
+        for attempt in (1, 2):
+            try:
+                session.bulk_insert_mappings(self.Event, events)
+                self._add(deltas)
+                session.commit()
+                break
+            except IntegrityError:
+                # another worker created one of our buckets first: re-read, retry
+                session.rollback()
+                if attempt == 2:
+                    raise
+            except Exception:
+                session.rollback()
+                raise
+        self._purge()
+
+    def _add(self, deltas):
+        R = self.Rollup
+        session = self.db.session
+        keys = list(deltas)
+        existing = set()
+        for g in {k[0] for k in keys}:
+            buckets = {k[1] for k in keys if k[0] == g}
+            existing.update(
+                tuple(row) for row in
+                session.query(R.granularity, R.bucket_start, R.lot_id, R.slot_code)
+                .filter(R.granularity == g, R.bucket_start.in_(buckets),
+                        R.lot_id.in_({k[2] for k in keys}),
+                        R.slot_code.in_({k[3] for k in keys}))
+            )
+        inserts = []
+        for key in keys:
+            values = deltas[key]
+            g, b, lot, slot = key
+            if not any(values.values()):
+                continue
+            if key in existing:
+                session.query(R).filter_by(granularity=g, bucket_start=b, lot_id=lot,
+                                           slot_code=slot).update(
+                    {getattr(R, c): getattr(R, c) + v for c, v in values.items() if v},
+                    synchronize_session=False)
+            else:
+                inserts.append({"granularity": g, "bucket_start": b, "lot_id": lot,
+                                "slot_code": slot, **values})
+        session.bulk_insert_mappings(R, inserts)
+
+    def _purge(self):
+        if time.monotonic() - self._purged_at < 3600:
+            return
+        self._purged_at = time.monotonic()
+        R = self.Rollup
+        self.db.session.query(R).filter(
+            R.granularity == "minute", R.bucket_start < datetime.now() - MINUTE_RETENTION
+        ).delete(synchronize_session=False)
+        self.db.session.commit()
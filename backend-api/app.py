@@ -1,24 +1,58 @@
 # app.py
 
 from __future__ import annotations
-from flask import Flask, request, jsonify, Response
+from flask import Flask, g, request, jsonify, Response, redirect, has_request_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from datetime import datetime, timedelta
+from functools import wraps
+from sqlalchemy import event, func, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
 import cv2
 import numpy as np
+import atexit
+import hashlib
+import json
+import os
+import random
 import threading
-
-from db_config import SQLALCHEMY_DATABASE_URI
+import time
+
+import analytics
+import compression
+import encoders
+import forecast
+import frame_bus
+import json_provider
+import lots
+import metrics
+import ratelimit
+import slot_states
+from db_config import SQLALCHEMY_BINDS, SQLALCHEMY_DATABASE_URI, SQLALCHEMY_ENGINE_OPTIONS
+from db_routing import RoutingSession, configure_engines, read_only, use_primary
+from json_provider import fmt_minute
+from log_config import get_logger
+from overlay import GridOverlay
+from serving import MAX_STREAMS_PER_WORKER, SERVING_ROLE, STREAM_BASE_URL
 
 app = Flask(__name__)
 CORS(app)
 
 app.config["SQLALCHEMY_DATABASE_URI"] = SQLALCHEMY_DATABASE_URI
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = SQLALCHEMY_ENGINE_OPTIONS
+app.config["SQLALCHEMY_BINDS"] = SQLALCHEMY_BINDS
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={"class_": RoutingSession})
+with app.app_context():
+    configure_engines(db)
+metrics.instrument_app(app)
+json_provider.install(app)
+compression.install(app)
+ratelimit.install(app)
+log = get_logger("smartpark.api")
 
 # ==========================================================
 # MODELS
@@ -32,6 +66,10 @@ class User(db.Model):
 
 
 class Vehicle(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "plate_number", name="uq_vehicle_user_plate"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     plate_number = db.Column(db.String(60), nullable=False)
     vehicle_type = db.Column(db.String(60), default="CAR")
@@ -39,29 +77,64 @@ class Vehicle(db.Model):
     width = db.Column(db.Float, nullable=True)
     height = db.Column(db.Float, nullable=True)
     door_type = db.Column(db.String(60), nullable=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
+
+
+class Lot(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    code = db.Column(db.String(40), unique=True, nullable=False)
+    name = db.Column(db.String(120), nullable=False)
+    rows = db.Column(db.Integer, nullable=False, default=lots.DEFAULT_ROWS)
+    cols = db.Column(db.Integer, nullable=False, default=lots.DEFAULT_COLS)
+    created_at = db.Column(db.DateTime, default=datetime.now)
 
 
 class ParkingSlot(db.Model):
+    # slot codes repeat across lots; every allocator query leads with lot_id
+    __table_args__ = (
+        db.UniqueConstraint("lot_id", "slot_code", name="uq_parking_slot_lot_code"),
+        db.Index("ix_parking_slot_lot_status", "lot_id", "status"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    slot_code = db.Column(db.String(20), unique=True, nullable=False)
+    lot_id = db.Column(db.Integer, db.ForeignKey("lot.id", ondelete="RESTRICT"), nullable=False)
+    slot_code = db.Column(db.String(20), nullable=False)
     status = db.Column(db.String(20), default="available")
-    # available / reserved / occupied
+    # available / reserved / occupied / blocked — see slot_states.TRANSITIONS
+    status_since = db.Column(db.DateTime, default=datetime.now)   # stamped on every change
+    version = db.Column(db.Integer, nullable=False)               # compare-and-swap on UPDATE
+
+    __mapper_args__ = {"version_id_col": version}
 
 
 class Reservation(db.Model):
+    # Composite indexes for the hot queries (see migrations/versions/0002_*)
+    __table_args__ = (
+        db.Index("ix_reservation_lot_status_end", "lot_id", "status", "end_time"),
+        db.Index("ix_reservation_slot_status", "slot_id", "status"),
+        db.Index("ix_reservation_user_status_start", "user_id", "status", "start_time"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
-    vehicle_id = db.Column(db.Integer, db.ForeignKey("vehicle.id"), nullable=False)
-    slot_id = db.Column(db.Integer, db.ForeignKey("parking_slot.id"), nullable=False)
+    lot_id = db.Column(db.Integer, db.ForeignKey("lot.id", ondelete="RESTRICT"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
+    vehicle_id = db.Column(db.Integer, db.ForeignKey("vehicle.id", ondelete="CASCADE"), nullable=False)
+    slot_id = db.Column(db.Integer, db.ForeignKey("parking_slot.id", ondelete="RESTRICT"), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
     end_time = db.Column(db.DateTime, nullable=False)
     status = db.Column(db.String(20), default="active")
+    version = db.Column(db.Integer, nullable=False)
+
+    __mapper_args__ = {"version_id_col": version}
 
 
 class Notification(db.Model):
+    __table_args__ = (
+        db.Index("ix_notification_user_created", "user_id", "created_at"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
     title = db.Column(db.String(120), nullable=False)
     message = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.now)
@@ -69,12 +142,156 @@ class Notification(db.Model):
 
 class Feedback(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
     message = db.Column(db.Text, nullable=False)
     rating = db.Column(db.Integer, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.now)
 
 
+class IdempotencyKey(db.Model):
+    # Responses of POSTs sent with an Idempotency-Key header (see idempotent())
+    key = db.Column(db.String(64), primary_key=True)
+    endpoint = db.Column(db.String(60), primary_key=True)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer, nullable=True)       # NULL while in progress
+    response = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.now, index=True)
+
+
+class SlotEvent(db.Model):
+    # Append-only log of slot status changes, written by analytics.SlotHistory
+    __table_args__ = (
+        db.Index("ix_slot_event_lot_slot_created", "lot_id", "slot_code", "created_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    lot_id = db.Column(db.Integer, nullable=False)
+    slot_code = db.Column(db.String(20), nullable=False)
+    old_status = db.Column(db.String(20), nullable=True)
+    new_status = db.Column(db.String(20), nullable=False)
+    status_since = db.Column(db.DateTime, nullable=True)       # when old_status began
+    source = db.Column(db.String(60), nullable=True)           # endpoint that changed it
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class SlotRollup(db.Model):
+    # Per-slot minute / hour buckets folded from SlotEvent (see analytics.py)
+    granularity = db.Column(db.String(6), primary_key=True)
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    lot_id = db.Column(db.Integer, primary_key=True)
+    slot_code = db.Column(db.String(20), primary_key=True)
+    occupied_s = db.Column(db.Float, nullable=False, default=0)
+    reserved_s = db.Column(db.Float, nullable=False, default=0)
+    blocked_s = db.Column(db.Float, nullable=False, default=0)
+    arrivals = db.Column(db.Integer, nullable=False, default=0)
+    departures = db.Column(db.Integer, nullable=False, default=0)
+    dwell_s = db.Column(db.Float, nullable=False, default=0)
+    block_incidents = db.Column(db.Integer, nullable=False, default=0)
+
+
+# ==========================================================
+# LOTS  (request scoping and partition routing, see lots.py)
+# ==========================================================
+
+lot_directory = lots.LotDirectory()
+lot_directory.bind(db, Lot)
+lot_router = lots.LotRouter()
+
+
+@event.listens_for(Lot.__table__, "after_create")
+def _forget_lots(target, connection, **kw):
+    lot_directory.clear()
+
+
+def partition_redirect(code):
+    """307 to the partition that owns lot `code`, or None when it is ours."""
+    base = lot_router.redirect_base(code)
+    return redirect(base + request.full_path, code=307) if base else None
+
+
+def lot_scoped(view):
+    """
+    Resolve the lot the request names into g.lot (404 if unknown). Requests
+    for a lot another partition owns are redirected there before anything
+    else runs, so place this above @idempotent.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        code = lots.requested_lot(request)
+        elsewhere = partition_redirect(code)
+        if elsewhere:
+            return elsewhere
+        lot = lot_directory.get(code)
+        if lot is None:
+            return jsonify({"message": "Lot not found"}), 404
+        g.lot = lot
+        return view(*args, **kwargs)
+    return wrapper
+
+
+# ==========================================================
+# SLOT HISTORY  (every committed status change → analytics)
+# ==========================================================
+
+slot_history = analytics.SlotHistory()
+slot_history.bind(app, db, SlotEvent, SlotRollup)
+
+
+@event.listens_for(RoutingSession, "before_flush")
+def _collect_slot_events(session, flush_context, instances):
+    now = datetime.now()
+    for obj in session.dirty:
+        if not isinstance(obj, ParkingSlot):
+            continue
+        hist = inspect(obj).attrs.status.history
+        old = hist.deleted[0] if hist.deleted else None
+        new = hist.added[0] if hist.added else None
+        if not hist.added or old == new:
+            continue
+        session.info.setdefault("slot_events", []).append({
+            "lot_id": obj.lot_id,
+            "slot_code": obj.slot_code,
+            "old_status": old,
+            "new_status": new,
+            "status_since": obj.status_since,
+            "source": request.url_rule.rule if has_request_context() and request.url_rule else None,
+            "created_at": now,
+        })
+        obj.status_since = now
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _publish_slot_events(session):
+    events = session.info.pop("slot_events", None)
+    if events:
+        slot_history.record(events)
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _discard_slot_events(session):
+    session.info.pop("slot_events", None)
+
+
+# ==========================================================
+# DEMAND FORECAST  (steers slot choice, see forecast.py)
+# ==========================================================
+
+demand = forecast.Demand()
+demand.bind(app, db, Reservation)
+
+
+def slot_depth(slot):
+    """Distance rank from the entrance: A1 is nearest (see /guidance)."""
+    digits = "".join(ch for ch in slot.slot_code if ch.isdigit())
+    return int(digits) - 1 if digits else 10 ** 6
+
+
+def pick_slot(lot, free, start, end):
+    """Choose a slot for [start, end) from the lot's free ones; None if there are none."""
+    demand.ensure_started()
+    return forecast.choose_slot(free, slot_depth, start, end, demand.forecast(lot.id))
+
+
 # ==========================================================
 # HELPERS
 # ==========================================================
@@ -93,35 +310,174 @@ def push_notification(user_id, title, message):
     # commit is done by caller inside its own commit
 
 
+SLOT_CAS_RETRIES = int(os.getenv("SLOT_CAS_RETRIES", 5))
+SLOT_CAS_BACKOFF = 0.005                # s, times the attempt number, jittered
+
+CAS_CONFLICTS = metrics.REGISTRY.counter(
+    "smartpark_cas_conflicts_total", "Optimistic-concurrency conflicts on slot / reservation rows",
+    labels=("outcome",))
+
+
+def with_cas_retry(attempt):
+    """
+    Run attempt() and commit. When a versioned UPDATE lost a race
+    (StaleDataError) everything is rolled back and attempt() runs again on
+    fresh rows, up to SLOT_CAS_RETRIES times; attempt() must therefore do
+    its own reads. Returns attempt()'s result.
+    """
+    for n in range(1, SLOT_CAS_RETRIES + 1):
+        try:
+            result = attempt()
+            db.session.commit()
+            return result
+        except StaleDataError:
+            db.session.rollback()
+            if n == SLOT_CAS_RETRIES:
+                CAS_CONFLICTS.inc(outcome="exhausted")
+                raise
+            CAS_CONFLICTS.inc(outcome="retried")
+            time.sleep(random.uniform(0, SLOT_CAS_BACKOFF * n))
+
+
+@app.errorhandler(StaleDataError)
+def _cas_exhausted(e):
+    return jsonify({"message": "Slot changed concurrently, try again"}), 409, {"Retry-After": "1"}
+
+
+IDEMPOTENCY_TTL = timedelta(hours=int(os.getenv("IDEMPOTENCY_TTL_HOURS", 24)))
+# an in-progress key older than this belongs to a request that died
+IDEMPOTENCY_LOCK_TIMEOUT = timedelta(seconds=int(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", 60)))
+_idem_purged_at = 0.0
+
+
+def _purge_idempotency_keys():
+    """Delete expired keys, at most once a minute per process."""
+    global _idem_purged_at
+    if time.monotonic() - _idem_purged_at < 60:
+        return
+    _idem_purged_at = time.monotonic()
+    IdempotencyKey.query.filter(
+        IdempotencyKey.created_at < datetime.now() - IDEMPOTENCY_TTL
+    ).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def idempotent(view):
+    """
+    Replay the stored response when a request repeats its Idempotency-Key.
+
+    The key row is committed before the view runs, so a concurrent
+    duplicate hits the primary key and gets 409 instead of booking twice,
+    and the view stays free to roll back and retry (with_cas_retry). The
+    response is stored right after; 5xx responses are not kept so the
+    client can retry them.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get("Idempotency-Key")
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > 64:
+            return jsonify({"message": "Idempotency-Key must be at most 64 characters"}), 400
+
+        _purge_idempotency_keys()
+        endpoint = request.url_rule.rule
+        body = request.get_json(silent=True)
+        digest = hashlib.sha256(json.dumps(body, sort_keys=True, default=str).encode()).hexdigest()
+
+        row = db.session.get(IdempotencyKey, (key, endpoint))
+        now = datetime.now()
+        if row is not None and (row.created_at < now - IDEMPOTENCY_TTL or (
+                row.status_code is None and row.created_at < now - IDEMPOTENCY_LOCK_TIMEOUT)):
+            db.session.delete(row)
+            db.session.commit()
+            row = None
+        if row is None:
+            row = IdempotencyKey(key=key, endpoint=endpoint, request_hash=digest)
+            db.session.add(row)
+            try:
+                db.session.commit()
+            except IntegrityError:                      # a duplicate got there first
+                db.session.rollback()
+                row = db.session.get(IdempotencyKey, (key, endpoint))
+            else:
+                return _run_idempotent(view, row, args, kwargs)
+
+        if row is None or row.status_code is None:
+            return (jsonify({"message": "A request with this Idempotency-Key is in progress"}),
+                    409, {"Retry-After": "1"})
+        if row.request_hash != digest:
+            return jsonify({"message": "Idempotency-Key was used with a different request"}), 422
+        return Response(row.response, row.status_code, mimetype="application/json",
+                        headers={"Idempotent-Replayed": "true"})
+    return wrapper
+
+
+def _run_idempotent(view, row, args, kwargs):
+    key = (row.key, row.endpoint)
+    try:
+        resp = app.make_response(view(*args, **kwargs))
+    except Exception:
+        db.session.rollback()
+        _forget_idempotency_key(key)
+        raise
+    if resp.status_code >= 500:
+        db.session.rollback()
+        _forget_idempotency_key(key)
+        return resp
+
+    # the view has usually committed; reattach the row to store the response
+    row = db.session.get(IdempotencyKey, key) or db.session.merge(row)
+    row.status_code = resp.status_code
+    row.response = resp.get_data(as_text=True)
+    db.session.commit()
+    return resp
+
+
+def _forget_idempotency_key(key):
+    IdempotencyKey.query.filter_by(key=key[0], endpoint=key[1]).delete()
+    db.session.commit()
+
+
 def parse_dt(dt_str):
     return datetime.strptime(dt_str.strip(), "%Y-%m-%d %H:%M")
 
 
-def ensure_slots():
-    if ParkingSlot.query.count() == 0:
-        for i in range(1, 13):
+def ensure_slots(lot):
+    """Create the lot's rows x cols slots if it has none yet (on the primary)."""
+    if ParkingSlot.query.filter_by(lot_id=lot.id).count() == 0:
+        for i in range(1, lot.rows * lot.cols + 1):
             db.session.add(ParkingSlot(
+                lot_id=lot.id,
                 slot_code=f"A{i}",
                 status="available"
             ))
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:                          # another request seeded them first
+            db.session.rollback()
 
 
-def expire_reservations():
-    now = datetime.now()
-    expired = Reservation.query.filter(
-        Reservation.status == "active",
-        Reservation.end_time <= now
-    ).all()
-
-    for r in expired:
-        r.status = "completed"
-        slot = ParkingSlot.query.get(r.slot_id)
-        if slot and slot.status != "occupied":
-            slot.status = "available"
+def release_slot(slot):
+    """Free `slot` after its reservation ended (occupied / blocked slots stay)."""
+    if slot:
+        slot.status = slot_states.settle(slot.status, slot_states.RELEASE)
+
+
+def expire_reservations(lot):
+    def attempt():
+        now = datetime.now()
+        expired = Reservation.query.filter(
+            Reservation.lot_id == lot.id,
+            Reservation.status == "active",
+            Reservation.end_time <= now
+        ).all()
+
+        for r in expired:
+            r.status = "completed"
+            release_slot(db.session.get(ParkingSlot, r.slot_id))
 
-    if expired:
-        db.session.commit()
+    with_cas_retry(attempt)
 
 
 # ==========================================================
@@ -241,9 +597,12 @@ def list_vehicles(email):
 # ==========================================================
 
 @app.post("/reservation/create")
+@lot_scoped
+@idempotent
 def create_reservation():
-    expire_reservations()
-    ensure_slots()
+    lot = g.lot
+    expire_reservations(lot)
+    ensure_slots(lot)
 
     data = request.get_json() or {}
     required = require_fields(data, ["email", "vehicle_id", "start_time", "end_time"])
@@ -258,71 +617,135 @@ def create_reservation():
     if not vehicle:
         return jsonify({"message": "Vehicle not found"}), 404
 
-    slot = ParkingSlot.query.filter_by(status="available").first()
-    if not slot:
-        return jsonify({"message": "Parking Full"}), 404
-
     start = parse_dt(data["start_time"])
     end = parse_dt(data["end_time"])
 
-    slot.status = "reserved"
+    user_id, vehicle_id = user.id, vehicle.id
 
-    reservation = Reservation(
-        user_id=user.id,
-        vehicle_id=vehicle.id,
-        slot_id=slot.id,
-        start_time=start,
-        end_time=end
-    )
+    def book():
+        slot = pick_slot(lot, ParkingSlot.query.filter_by(lot_id=lot.id, status="available").all(),
+                         start, end)
+        if not slot:
+            return None
 
-    db.session.add(reservation)
+        slot.status = slot_states.settle(slot.status, slot_states.RESERVE)
 
-    # Auto-notification
-    push_notification(
-        user_id=user.id,
-        title="Reservation Confirmed",
-        message=(
-            f"Your slot {slot.slot_code} has been reserved from "
-            f"{start.strftime('%Y-%m-%d %H:%M')} to {end.strftime('%Y-%m-%d %H:%M')}."
+        reservation = Reservation(
+            lot_id=lot.id,
+            user_id=user_id,
+            vehicle_id=vehicle_id,
+            slot_id=slot.id,
+            start_time=start,
+            end_time=end
         )
-    )
 
-    db.session.commit()
+        db.session.add(reservation)
+
+        # Auto-notification
+        push_notification(
+            user_id=user_id,
+            title="Reservation Confirmed",
+            message=(
+                f"Your slot {slot.slot_code} has been reserved from "
+                f"{start.strftime('%Y-%m-%d %H:%M')} to {end.strftime('%Y-%m-%d %H:%M')}."
+            )
+        )
+
+        db.session.flush()              # a slot someone else just took fails here
+        return slot.slot_code, reservation.id
+
+    # concurrent bookings may pick the same slot; the loser re-picks
+    booked = with_cas_retry(book)
+    if not booked:
+        return jsonify({"message": "Parking Full"}), 404
+    slot_code, reservation_id = booked
 
     return jsonify({
-        "slot": slot.slot_code,
-        "reservation_id": reservation.id,
+        "lot": lot.code,
+        "slot": slot_code,
+        "reservation_id": reservation_id,
         "start_time": start.strftime("%Y-%m-%d %H:%M"),
         "end_time": end.strftime("%Y-%m-%d %H:%M")
     }), 201
 
 
 @app.get("/reservation/list/<email>")
+@read_only
 def list_reservations(email):
-    user = User.query.filter_by(email=email.lower().strip()).first()
-    if not user:
+    user_id = db.session.query(User.id).filter_by(email=email.lower().strip()).scalar()
+    if user_id is None:
         return jsonify([]), 200
 
-    reservations = (
-        Reservation.query
-        .filter_by(user_id=user.id, status="active")
+    # column tuples + one join instead of ORM objects and a query per row
+    rows = (
+        db.session.query(Reservation.id, Lot.code, ParkingSlot.slot_code, Reservation.slot_id,
+                         Reservation.start_time, Reservation.end_time, Reservation.status)
+        .outerjoin(ParkingSlot, ParkingSlot.id == Reservation.slot_id)
+        .outerjoin(Lot, Lot.id == Reservation.lot_id)
+        .filter(Reservation.user_id == user_id, Reservation.status == "active")
         .order_by(Reservation.start_time.desc())
-        .all()
     )
 
-    result = []
-    for r in reservations:
-        slot = ParkingSlot.query.get(r.slot_id)
-        result.append({
-            "id": r.id,
-            "slot": slot.slot_code if slot else "?",
-            "slot_id": r.slot_id,
-            "start_time": r.start_time.strftime("%Y-%m-%d %H:%M"),
-            "end_time": r.end_time.strftime("%Y-%m-%d %H:%M"),
-            "status": r.status,
-        })
+    return jsonify([
+        {
+            "id": rid,
+            "lot": lot_code,
+            "slot": slot_code or "?",
+            "slot_id": slot_id,
+            "start_time": fmt_minute(start),
+            "end_time": fmt_minute(end),
+            "status": status,
+        }
+        for rid, lot_code, slot_code, slot_id, start, end, status in rows
+    ]), 200
 
-    return jsonify(result), 200
+
+# ==========================================================
+# LOTS
+# ==========================================================
+
+LOT_MAX_DIMENSION = 50
+
+
+@app.get("/lots")
+@read_only
+def list_lots():
+    return jsonify([
+        {"code": lot.code, "name": lot.name, "rows": lot.rows, "cols": lot.cols,
+         "partition": lot_router.owner(lot.code) or None}
+        for lot in lot_directory.all()
+    ]), 200
+
+
+@app.post("/lots")
+def create_lot():
+    """Create a lot (on the partition that owns its code) and seed its slots."""
+    data = request.get_json() or {}
+    required = require_fields(data, ["lot", "name"])
+    if required:
+        return required
+
+    code = lots.normalize(data["lot"])
+    elsewhere = partition_redirect(code)
+    if elsewhere:
+        return elsewhere
+    if len(code) > 40:
+        return jsonify({"message": "lot must be at most 40 characters"}), 400
+    try:
+        rows = int(data.get("rows", lots.DEFAULT_ROWS))
+        cols = int(data.get("cols", lots.DEFAULT_COLS))
+    except (TypeError, ValueError):
+        return jsonify({"message": "rows and cols must be integers"}), 400
+    if not (0 < rows <= LOT_MAX_DIMENSION and 0 < cols <= LOT_MAX_DIMENSION):
+        return jsonify({"message": f"rows and cols must be 1..{LOT_MAX_DIMENSION}"}), 400
+    if Lot.query.filter_by(code=code).first():
+        return jsonify({"message": "Lot exists"}), 409
+
+    lot_directory.add(code, data["name"], rows, cols)
+    lot = lot_directory.get(code)
+    ensure_slots(lot)
+    return jsonify({"code": lot.code, "name": lot.name, "rows": lot.rows, "cols": lot.cols,
+                    "slots": lot.rows * lot.cols}), 201
 
 
 # ==========================================================
@@ -330,14 +753,22 @@ def list_reservations(email):
 # ==========================================================
 
 @app.get("/slots/status")
+@lot_scoped
+@read_only
 def slot_status():
-    ensure_slots()
-    slots = ParkingSlot.query.all()
+    query = (db.session.query(ParkingSlot.slot_code, ParkingSlot.status)
+             .filter(ParkingSlot.lot_id == g.lot.id).order_by(ParkingSlot.id))
+    slots = query.all()
+    if not slots:
+        # a new lot, or a lagging replica: check and seed on the primary only
+        use_primary()
+        ensure_slots(g.lot)
+        slots = query.all()
 
     return jsonify([
-        {"slot_code": s.slot_code, "status": s.status}
-        for s in slots
-        if s.status != "blocked"          # hide vision-blocked slots from the UI
+        {"slot_code": code, "status": status}
+        for code, status in slots
+        if status != "blocked"            # hide vision-blocked slots from the UI
     ]), 200
 
 
@@ -345,28 +776,28 @@ def slot_status():
 # VISION SYSTEM UPDATE
 # ==========================================================
 
-@app.post("/update-slot")
-def update_slot():
-    data = request.get_json() or {}
-    slot_code = data.get("slot_code")
-    new_status = data.get("status")
-
-    slot = ParkingSlot.query.filter_by(slot_code=slot_code).first()
-    if not slot:
-        return jsonify({"message": "Slot not found"}), 404
-
-    # Log incoming update for debugging
-    print(f"[DEBUG] Slot {slot_code} Update: {slot.status} -> {new_status}")
+def apply_slot_update(slot, new_status):
+    """
+    Apply a vision status to `slot` per slot_states.TRANSITIONS (reallocating
+    its reservation when an obstacle blocks it). Stages the changes; the
+    caller commits through with_cas_retry. Returns the response body, or
+    None when `new_status` is not a slot status.
+    """
+    log.debug("slot update", extra={"slot": slot.slot_code, "old": slot.status, "new": new_status})
+    action = slot_states.transition(slot.status, new_status)
+    if action is None:
+        return None
 
     # PROTECT 'reserved' status from being overwritten by 'available'
     # If the database thinks it's reserved, we don't let vision say 'available'
     # because vision only sees if a car is PHYSICALLY there, not the booking.
-    if slot.status == "reserved" and new_status == "available":
-        return jsonify({"message": "Kept as reserved"}), 200
+    if action == slot_states.KEEP:
+        return {"message": "Kept as reserved"}
 
     # DYNAMIC RE-ALLOCATION LOGIC
     # If a green obstacle enters a reserved OR occupied slot, move the reservation.
-    if new_status == "blocked" and slot.status in ("reserved", "occupied"):
+    if action == slot_states.REALLOCATE:
+        slot.status = slot_states.BLOCKED
         # Find the active reservation for this slot
         res = Reservation.query.filter_by(slot_id=slot.id, status="active").first()
         if res:
@@ -374,6 +805,7 @@ def update_slot():
             new_slot = (
                 ParkingSlot.query
                 .filter(
+                    ParkingSlot.lot_id == slot.lot_id,
                     ParkingSlot.status == "available",
                     ParkingSlot.id != slot.id
                 )
@@ -381,10 +813,10 @@ def update_slot():
             )
             if new_slot:
                 old_code = slot.slot_code
-                print(f"[RE-ALLOCATE] Moving reservation {res.id} from {old_code} → {new_slot.slot_code}")
+                log.info("reservation reallocated", extra={
+                    "reservation_id": res.id, "from_slot": old_code, "to_slot": new_slot.slot_code})
                 res.slot_id = new_slot.id
-                new_slot.status = "reserved"
-                slot.status = "blocked"
+                new_slot.status = slot_states.settle(new_slot.status, slot_states.RESERVE)
 
                 push_notification(
                     user_id=res.user_id,
@@ -394,14 +826,12 @@ def update_slot():
                         f"Your reservation has been automatically moved to slot {new_slot.slot_code}."
                     )
                 )
-                db.session.commit()
-                return jsonify({
+                return {
                     "message": "Slot blocked; reservation moved",
                     "new_slot": new_slot.slot_code
-                }), 200
+                }
             else:
                 # No free slot to move to — still block it and notify
-                slot.status = "blocked"
                 push_notification(
                     user_id=res.user_id,
                     title="Slot Blocked — No Alternative",
@@ -411,21 +841,55 @@ def update_slot():
                         f"Please contact parking staff."
                     )
                 )
-                db.session.commit()
-                return jsonify({"message": "Slot blocked; no free slot for reallocation"}), 200
+                return {"message": "Slot blocked; no free slot for reallocation"}
+        return {"message": "Updated"}
 
-    slot.status = new_status
-    db.session.commit()
-    return jsonify({"message": "Updated"}), 200
+    # The car left, or the obstacle cleared, but a booking still holds the bay:
+    # it goes back to reserved, not up for grabs. Booking and cancelling both
+    # bump the slot's version, so the CAS catches a reservation that changes
+    # under this decision.
+    if action == slot_states.AVAILABLE and Reservation.query.filter_by(
+            slot_id=slot.id, status="active").first():
+        action = slot_states.RESERVED
+
+    slot.status = action
+    return {"message": "Updated"}
+
+
+@app.post("/update-slot")
+@lot_scoped
+def update_slot():
+    data = request.get_json() or {}
+    slot_code = data.get("slot_code")
+    new_status = data.get("status")
+
+    # read, decide and write again if the slot changed under us
+    def attempt():
+        slot = ParkingSlot.query.filter_by(lot_id=g.lot.id, slot_code=slot_code).first()
+        if not slot:
+            return jsonify({"message": "Slot not found"}), 404
+        result = apply_slot_update(slot, new_status)
+        if result is None:
+            return jsonify({"message": "status must be one of "
+                                       + ", ".join(slot_states.VISION_EVENTS)}), 400
+        return jsonify(result), 200
+
+    return with_cas_retry(attempt)
 
 
 # ==========================================================
 # WEBCAM FEED (laptop camera → mobile app)
 # ==========================================================
 
-ROWS, COLS = 3, 4                        # parking grid layout
+DEFAULT_GRID = (lots.DEFAULT_ROWS, lots.DEFAULT_COLS)     # (rows, cols) when no lot is given
 _cam = None
 _cam_lock = threading.Lock()
+_stream_slots = threading.BoundedSemaphore(MAX_STREAMS_PER_WORKER)
+
+# With FRAME_BUS set the vision process owns the camera and frames (plus its
+# car detections) are read from shared memory instead (see frame_bus.py).
+_frame_bus = frame_bus.FrameReader() if frame_bus.FRAME_BUS else None
+DETECT = object()                        # car_rect placeholder: detect on the frame
 
 
 def _get_camera():
@@ -471,32 +935,65 @@ def _detect_car(hsv):
     return None
 
 
-def _draw_overlay(frame, target_slot=None):
-    """Detect red/yellow car, draw grid, size the slot to the car, and guide it."""
+def _paint_idle(layer, code, x1, y1, x2, y2):
+    layer.rectangle((x1, y1), (x2, y2), (180, 180, 180), 1)
+    layer.text(code, ((x1 + x2) // 2 - 12, (y1 + y2) // 2 + 6),
+               0.45, (200, 200, 200), 1)
+
+
+def _paint_target(layer, code, x1, y1, x2, y2):
+    _paint_idle(layer, code, x1, y1, x2, y2)
+    layer.rectangle((x1, y1), (x2, y2), (0, 255, 0), 2)
+    layer.text(code, (x1 + 4, y1 + 18), 0.5, (0, 255, 0), 1)
+
+
+# Grid lines, labels and the static target highlight are rendered once per
+# frame size and blended in one pass (see overlay.py), with one GridOverlay
+# per lot layout. Every open stream may want a different target, so one
+# composite per stream (plus idle) is kept.
+_grids = {}
+_grids_lock = threading.Lock()
+
+
+def _grid_overlay(rows, cols):
+    grid = _grids.get((rows, cols))
+    if grid is None:
+        with _grids_lock:
+            grid = _grids.setdefault((rows, cols), GridOverlay(
+                rows, cols, {"idle": _paint_idle, "target": _paint_target},
+                cache=min(MAX_STREAMS_PER_WORKER, rows * cols) + 1))
+    return grid
+
+
+def _slot_cell(target_slot, cols):
+    """'A7' -> (row, col) in a lot `cols` wide, or None for an unparseable slot code."""
+    try:
+        num = int(target_slot.replace("A", "")) - 1
+    except (AttributeError, ValueError):
+        return None
+    return num // cols, num % cols
+
+
+def _draw_overlay(frame, target_slot=None, car_rect=DETECT, grid=DEFAULT_GRID):
+    """
+    Detect red/yellow car (unless given), draw the lot's rows x cols `grid`,
+    size the slot to the car, and guide it.
+    """
+    rows, cols = grid
     h, w = frame.shape[:2]
-    slot_w = w // COLS
-    slot_h = h // ROWS
-    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-
-    # ---- Draw faint grid lines & slot labels ----
-    for r in range(ROWS + 1):
-        y = r * slot_h
-        cv2.line(frame, (0, y), (w, y), (180, 180, 180), 1)
-    for c in range(COLS + 1):
-        x = c * slot_w
-        cv2.line(frame, (x, 0), (x, h), (180, 180, 180), 1)
-
-    for r in range(ROWS):
-        for c in range(COLS):
-            slot_num = r * COLS + c + 1
-            code = f"A{slot_num}"
-            lx = c * slot_w + slot_w // 2 - 12
-            ly = r * slot_h + slot_h // 2 + 6
-            cv2.putText(frame, code, (lx, ly),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.45, (200, 200, 200), 1)
+    slot_w = w // cols
+    slot_h = h // rows
 
     # ---- Detect the car (red / yellow object) ----
-    car_rect = _detect_car(hsv)
+    if car_rect is DETECT:
+        car_rect = _detect_car(cv2.cvtColor(frame, cv2.COLOR_BGR2HSV))
+
+    # ---- Faint grid lines & slot labels (+ static target when no car) ----
+    states = {}
+    cell = _slot_cell(target_slot, cols) if target_slot else None
+    if cell and not car_rect:
+        states[f"A{cell[0] * cols + cell[1] + 1}"] = "target"
+    _grid_overlay(rows, cols).render(frame, (0, 0, slot_w * cols, slot_h * rows), states)
 
     if car_rect:
         cx, cy, cw, ch = car_rect
@@ -512,8 +1009,8 @@ def _draw_overlay(frame, target_slot=None):
         if target_slot:
             try:
                 num = int(target_slot.replace("A", "")) - 1
-                tr = num // COLS
-                tc = num % COLS
+                tr = num // cols
+                tc = num % cols
 
                 # Slot centre (grid-based)
                 slot_cx = tc * slot_w + slot_w // 2
@@ -569,57 +1066,236 @@ def _draw_overlay(frame, target_slot=None):
         # No car detected
         cv2.putText(frame, "No vehicle detected", (10, h - 15),
                     cv2.FONT_HERSHEY_SIMPLEX, 0.6, (100, 100, 255), 2)
-        # Still show static slot highlight when no car
-        if target_slot:
-            try:
-                num = int(target_slot.replace("A", "")) - 1
-                tr = num // COLS
-                tc = num % COLS
-                x1, y1 = tc * slot_w, tr * slot_h
-                x2, y2 = x1 + slot_w, y1 + slot_h
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                cv2.putText(frame, target_slot, (x1 + 4, y1 + 18),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
-            except Exception:
-                pass
 
     return frame
 
 
-def _generate_mjpeg(target_slot):
-    """Generator that yields MJPEG frames."""
+# Adaptive quality ladder, picked from the client's observed fetch latency.
+# (max latency ms, width px, JPEG quality, max fps)
+QUALITY_LADDER = [
+    (150,  640, 75, 15),
+    (300,  480, 65, 10),
+    (600,  360, 55, 6),
+    (1200, 256, 45, 4),
+    (None, 192, 35, 2),
+]
+
+
+def _int_arg(args, name, lo, hi):
+    try:
+        return max(lo, min(int(float(args[name])), hi))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _stream_params(args, default_quality):
+    """
+    Encode settings from the query string:
+      w=<px>  q=<1-95>  fps=<max>  crop=1  (around the target slot)
+      adaptive=1&rtt=<ms>  -> w / q / fps picked from QUALITY_LADDER
+    Explicit q / fps win over the adaptive choice; in adaptive mode an
+    explicit w is a ceiling (the client's display width), not an override.
+    `grid` (rows, cols) is the layout of the lot being viewed.
+    """
+    params = {"width": None, "quality": default_quality, "fps": None,
+              "crop": args.get("crop") in ("1", "true", "yes"),
+              "grid": DEFAULT_GRID}
+
+    if args.get("adaptive") in ("1", "true", "yes"):
+        rtt = _int_arg(args, "rtt", 0, 60000)
+        for max_ms, width, quality, fps in QUALITY_LADDER:
+            if rtt is None or max_ms is None or rtt <= max_ms:
+                params.update(width=width, quality=quality, fps=fps)
+                break
+
+    width = _int_arg(args, "w", 64, 1920)
+    quality = _int_arg(args, "q", 10, 95)
+    fps = _int_arg(args, "fps", 1, 30)
+    if width is not None:
+        params["width"] = min(width, params["width"] or width)
+    if quality is not None:
+        params["quality"] = quality
+    if fps is not None:
+        params["fps"] = fps
+    return params
+
+
+def _shape_frame(frame, target_slot, params):
+    """Optionally crop to the target slot's neighbourhood, then downscale."""
+    rows, cols = params["grid"]
+    if params["crop"] and target_slot:
+        cell = _slot_cell(target_slot, cols)
+        if cell and 0 <= cell[0] < rows and 0 <= cell[1] < cols:
+            h, w = frame.shape[:2]
+            slot_w, slot_h = w // cols, h // rows
+            # the target cell plus one cell either side, so the car is visible
+            x1 = max(cell[1] - 1, 0) * slot_w
+            x2 = min(cell[1] + 2, cols) * slot_w
+            y1 = max(cell[0] - 1, 0) * slot_h
+            y2 = min(cell[0] + 2, rows) * slot_h
+            frame = frame[y1:y2, x1:x2]
+
+    width = params["width"]
+    h, w = frame.shape[:2]
+    if width and width < w:
+        size = (width, max(1, round(h * width / w)))
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    return frame
+
+
+def _capture():
+    """Read one frame from the shared camera. Returns (ok, frame)."""
+    with metrics.stage("camera_read"), _cam_lock:
+        cam = _get_camera()
+        return cam.read()
+
+
+def _render(frame, target_slot, params, car_rect=DETECT):
+    with metrics.stage("overlay"):
+        frame = _draw_overlay(frame, target_slot, car_rect, params["grid"])
+    with metrics.stage("resize"):
+        return _shape_frame(frame, target_slot, params)
+
+
+def _next_frame(target_slot, params, view=None, after=None):
+    """
+    One rendered frame as (frame, shared, seq); frame is None when there is
+    none. With the frame bus it is the newest frame other than seq `after`:
+    view=grid serves the vision process's own overlay straight from shared
+    memory, in which case `shared` is returned and must still be valid()
+    once the frame has been encoded. Guidance is drawn per viewer, so that
+    path renders onto a private copy.
+    """
+    if _frame_bus is None:
+        ok, frame = _capture()
+        return (_render(frame, target_slot, params) if ok else None), None, after
+    with metrics.stage("frame_bus_read"):
+        shared = _frame_bus.read(after)
+    if shared is None:
+        return None, None, after
+    if view == "grid":
+        with metrics.stage("resize"):
+            frame = _shape_frame(shared.overlay, target_slot, params)
+        return frame, (shared if np.may_share_memory(frame, shared.overlay) else None), shared.seq
+    frame = shared.image.copy()
+    if not shared.valid():
+        return None, None, after
+    return _render(frame, target_slot, params, shared.car), None, shared.seq
+
+
+def _read_frames(target_slot, params, view=None):
+    """Capture → overlay → resize loop, throttled to params['fps']. Yields (frame, shared)."""
+    min_interval = 1.0 / params["fps"] if params["fps"] else 0.0
+    last = 0.0
+    seq = None
     while True:
-        with _cam_lock:
-            cam = _get_camera()
-            ok, frame = cam.read()
-        if not ok:
+        if min_interval:
+            wait = last + min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            last = time.monotonic()
+        frame, shared, seq = _next_frame(target_slot, params, view, after=seq)
+        if frame is None:
             continue
-        frame = _draw_overlay(frame, target_slot)
-        _, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 70])
-        yield (b"--frame\r\n"
-               b"Content-Type: image/jpeg\r\n\r\n" + buf.tobytes() + b"\r\n")
+        yield frame, shared
+
+
+def _generate_mjpeg(target_slot, params, view=None):
+    """Generator that yields MJPEG frames.
+
+    Encoding runs on the encoder pool; the next frame is captured and drawn
+    while the previous one is being encoded.
+    """
+    pending = None
+    for frame, shared in _read_frames(target_slot, params, view):
+        job = encoders.encode_async(frame, "jpeg", params["quality"]), shared
+        if pending is not None:
+            (buf, _), shared = pending[0].result(), pending[1]
+            if shared is None or shared.valid():
+                yield (b"--frame\r\n"
+                       b"Content-Type: image/jpeg\r\n\r\n" + buf + b"\r\n")
+        pending = job
+
+
+def _generate_h264(target_slot, params, view=None):
+    """Generator that yields a fragmented-MP4 (H.264) byte stream.
+
+    Like the MJPEG path, encoding runs on the encoder pool while the next
+    frame is captured; one push is in flight at a time to keep frame order.
+    """
+    stream = pending = None
+    try:
+        for frame, shared in _read_frames(target_slot, params, view):
+            if shared is not None:
+                # encoded after the bus may have moved on, and a torn frame cannot be unsent
+                frame = frame.copy()
+                if not shared.valid():
+                    continue
+            if stream is None:
+                h, w = frame.shape[:2]
+                stream = encoders.H264Stream(w, h, fps=params["fps"] or 10)
+            if pending is not None:
+                data = pending.result()
+                if data:
+                    yield data
+            pending = stream.push_async(frame)
+    finally:
+        if pending is not None:
+            pending.exception()              # wait for it; the stream is closing anyway
+        if stream is not None:
+            stream.close()
 
 
 @app.get("/video-feed")
+@lot_scoped
 def video_feed():
-    """MJPEG stream — open in a browser for live video."""
+    """Live stream — MJPEG by default, codec=h264 for fragmented MP4.
+    Accepts w / q / fps / crop / adaptive, and view=grid (frame bus only)."""
+    if STREAM_BASE_URL and SERVING_ROLE == "api":
+        return redirect(STREAM_BASE_URL + request.full_path, code=307)
+
     slot = request.args.get("slot", None)
-    return Response(_generate_mjpeg(slot),
-                    mimetype="multipart/x-mixed-replace; boundary=frame")
+    view = request.args.get("view")
+    params = _stream_params(request.args, default_quality=70)
+    params["grid"] = (g.lot.rows, g.lot.cols)
+    if request.args.get("codec") == "h264":
+        if not encoders.h264_available():
+            return jsonify({"message": "H.264 encoder not available"}), 501
+        params["fps"] = params["fps"] or 10
+        gen, mimetype = _generate_h264(slot, params, view), "video/mp4"
+    else:
+        gen, mimetype = (_generate_mjpeg(slot, params, view),
+                         "multipart/x-mixed-replace; boundary=frame")
+
+    # Streams only get the threads reserved for them (see serving.py)
+    if not _stream_slots.acquire(blocking=False):
+        return jsonify({"message": "Too many open video streams"}), 503, {"Retry-After": "5"}
+    resp = Response(gen, mimetype=mimetype)
+    resp.call_on_close(_stream_slots.release)
+    return resp
 
 
 @app.get("/video-snapshot")
+@lot_scoped
 def video_snapshot():
-    """Single JPEG frame — used by the mobile app (polled every 500 ms)."""
+    """Single frame — used by the mobile app. Accepts w / q / crop / adaptive&rtt,
+    format=jpeg|webp and view=grid (frame bus only)."""
+    if STREAM_BASE_URL and SERVING_ROLE == "api":
+        return redirect(STREAM_BASE_URL + request.full_path, code=307)
+
     slot = request.args.get("slot", None)
-    with _cam_lock:
-        cam = _get_camera()
-        ok, frame = cam.read()
-    if not ok:
-        return jsonify({"message": "Camera not available"}), 503
-    frame = _draw_overlay(frame, slot)
-    _, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 75])
-    return Response(buf.tobytes(), mimetype="image/jpeg")
+    params = _stream_params(request.args, default_quality=75)
+    params["grid"] = (g.lot.rows, g.lot.cols)
+    for _ in range(3):                  # a bus frame overwritten while encoding is retried
+        frame, shared, _ = _next_frame(slot, params, request.args.get("view"))
+        if frame is None:
+            break
+        buf, mimetype = encoders.encode(frame, request.args.get("format", "jpeg"),
+                                        params["quality"])
+        if shared is None or shared.valid():
+            return Response(buf, mimetype=mimetype,
+                            headers={"Cache-Control": "no-store"})
+    return jsonify({"message": "Camera not available"}), 503
 
 
 # ==========================================================
@@ -627,6 +1303,7 @@ def video_snapshot():
 # ==========================================================
 
 @app.get("/guidance/<slot_code>")
+@lot_scoped
 def guidance(slot_code):
     """Return turn-by-turn text instructions for reaching the given slot."""
     try:
@@ -634,8 +1311,9 @@ def guidance(slot_code):
     except ValueError:
         return jsonify({"instructions": ["Invalid slot code."]}), 400
 
-    row = num // COLS  # 0-based row
-    col = num % COLS   # 0-based column
+    cols = g.lot.cols
+    row = num // cols  # 0-based row
+    col = num % cols   # 0-based column
 
     steps = ["Enter the parking lot through the main gate."]
 
@@ -691,10 +1369,17 @@ def submit_feedback():
 # ==========================================================
 
 @app.get("/reset-slots")
+@lot_scoped
 def reset_slots():
-    ParkingSlot.query.update({"status": "available"})
-    Reservation.query.delete()
-    db.session.commit()
+    # per row (not Query.update) so every change lands in the slot history;
+    # an operator reset deliberately bypasses slot_states.TRANSITIONS
+    def attempt():
+        for slot in ParkingSlot.query.filter(ParkingSlot.lot_id == g.lot.id,
+                                             ParkingSlot.status != "available"):
+            slot.status = "available"
+        Reservation.query.filter_by(lot_id=g.lot.id).delete()
+
+    with_cas_retry(attempt)
     return jsonify({"message": "Reset complete"}), 200
 
 
@@ -703,56 +1388,519 @@ def reset_slots():
 # ==========================================================
 
 @app.get("/notifications/<email>")
+@read_only
 def get_notifications(email):
-    user = User.query.filter_by(email=email.lower().strip()).first()
-    if not user:
+    user_id = db.session.query(User.id).filter_by(email=email.lower().strip()).scalar()
+    if user_id is None:
         return jsonify([]), 200
 
     notes = (
-        Notification.query
-        .filter_by(user_id=user.id)
+        db.session.query(Notification.id, Notification.title,
+                         Notification.message, Notification.created_at)
+        .filter(Notification.user_id == user_id)
         .order_by(Notification.created_at.desc())
         .limit(50)
-        .all()
     )
 
     return jsonify([
         {
-            "id":         n.id,
-            "title":      n.title,
-            "message":    n.message,
-            "created_at": n.created_at.strftime("%Y-%m-%d %H:%M")
+            "id":         nid,
+            "title":      title,
+            "message":    message,
+            "created_at": fmt_minute(created_at)
         }
-        for n in notes
+        for nid, title, message, created_at in notes
     ]), 200
 
 
 # also expose reservation cancel notification
 @app.post("/reservation/cancel")
+@lot_scoped
+@idempotent
 def cancel_reservation():
     data = request.get_json() or {}
     rid = data.get("reservation_id")
-    r = Reservation.query.get(rid)
-    if not r:
-        return jsonify({"message": "Reservation not found"}), 404
-
-    r.status = "cancelled"
-    slot = ParkingSlot.query.get(r.slot_id)
-    if slot and slot.status not in ("occupied", "blocked"):
-        slot.status = "available"
-
-    push_notification(
-        user_id=r.user_id,
-        title="Reservation Cancelled",
-        message=f"Your reservation (ID {r.id}) for slot {slot.slot_code if slot else ''} has been cancelled."
+
+    def attempt():
+        r = Reservation.query.filter_by(id=rid, lot_id=g.lot.id).first()
+        if not r:
+            return jsonify({"message": "Reservation not found"}), 404
+        if r.status == "cancelled":
+            return jsonify({"message": "Cancelled"}), 200
+        if r.status != "active":
+            return jsonify({"message": f"Reservation is {r.status}"}), 409
+
+        r.status = "cancelled"
+        slot = db.session.get(ParkingSlot, r.slot_id)
+        release_slot(slot)
+
+        push_notification(
+            user_id=r.user_id,
+            title="Reservation Cancelled",
+            message=f"Your reservation (ID {r.id}) for slot {slot.slot_code if slot else ''} has been cancelled."
+        )
+        return jsonify({"message": "Cancelled"}), 200
+
+    return with_cas_retry(attempt)
+
+
+# ==========================================================
+# ANALYTICS  (reads the rollups, never the live tables' history)
+# ==========================================================
+
+ANALYTICS_MAX_BUCKETS = 2000
+ROLLUP_SUMS = [func.coalesce(func.sum(getattr(SlotRollup, c)), 0) for c in analytics.COUNTERS]
+
+
+def _analytics_window(args):
+    """(granularity, start, end) from ?granularity=&from=&to=, or an error response."""
+    granularity = args.get("granularity", "hour")
+    if granularity not in analytics.GRANULARITIES:
+        return None, (jsonify({"message": "granularity must be minute or hour"}), 400)
+    step = analytics.GRANULARITIES[granularity]
+    try:
+        end = parse_dt(args["to"]) if args.get("to") else datetime.now()
+        start = parse_dt(args["from"]) if args.get("from") else end - step * (
+            24 if granularity == "hour" else 60)
+    except ValueError:
+        return None, (jsonify({"message": "from / to must be YYYY-MM-DD HH:MM"}), 400)
+    end = min(end, datetime.now())
+    if start >= end or (end - start) / step > ANALYTICS_MAX_BUCKETS:
+        return None, (jsonify({"message": f"Window must cover 1..{ANALYTICS_MAX_BUCKETS} buckets"}), 400)
+    return (granularity, analytics.bucket_start(start, granularity), end), None
+
+
+def _rollup_totals(lot, granularity, start, end, group_by, slot_code=None):
+    """{group: {counter: total}} for one lot from the rollups plus still-open intervals."""
+    totals = {}
+    query = (db.session.query(group_by, *ROLLUP_SUMS)
+             .filter(SlotRollup.granularity == granularity, SlotRollup.lot_id == lot.id,
+                     SlotRollup.bucket_start >= start, SlotRollup.bucket_start < end)
+             .group_by(group_by))
+    live = (db.session.query(ParkingSlot.lot_id, ParkingSlot.slot_code,
+                             ParkingSlot.status, ParkingSlot.status_since)
+            .filter(ParkingSlot.lot_id == lot.id))
+    if slot_code:
+        query = query.filter(SlotRollup.slot_code == slot_code)
+        live = live.filter(ParkingSlot.slot_code == slot_code)
+    for key, *values in query:
+        totals[key] = dict(zip(analytics.COUNTERS, values))
+
+    by_bucket = group_by is SlotRollup.bucket_start
+    for (_, bucket, _, code), delta in analytics.open_intervals(live, start, end, granularity).items():
+        cell = totals.setdefault(bucket if by_bucket else code, dict.fromkeys(analytics.COUNTERS, 0))
+        for c, v in delta.items():
+            cell[c] += v
+    return totals
+
+
+def _summary(t, seconds):
+    return {
+        "occupancy": round(t["occupied_s"] / seconds, 4) if seconds else 0,
+        "reserved": round(t["reserved_s"] / seconds, 4) if seconds else 0,
+        "blocked": round(t["blocked_s"] / seconds, 4) if seconds else 0,
+        "arrivals": int(t["arrivals"]),
+        "departures": int(t["departures"]),
+        "avg_dwell_min": round(t["dwell_s"] / t["departures"] / 60, 1) if t["departures"] else None,
+        "block_incidents": int(t["block_incidents"]),
+    }
+
+
+@app.get("/analytics/occupancy")
+@lot_scoped
+@read_only
+def analytics_occupancy():
+    """Time series over the lot's slots (or ?slot=A3): one row per bucket."""
+    window, error = _analytics_window(request.args)
+    if error:
+        return error
+    granularity, start, end = window
+    slot_code = request.args.get("slot")
+    n_slots = 1 if slot_code else (db.session.query(func.count(ParkingSlot.id))
+                                   .filter(ParkingSlot.lot_id == g.lot.id).scalar())
+
+    totals = _rollup_totals(g.lot, granularity, start, end, SlotRollup.bucket_start, slot_code)
+    step = analytics.GRANULARITIES[granularity]
+    series, bucket = [], start
+    while bucket < end:
+        seconds = (min(bucket + step, end) - bucket).total_seconds() * n_slots
+        t = totals.get(bucket, dict.fromkeys(analytics.COUNTERS, 0))
+        series.append({"bucket": fmt_minute(bucket), **_summary(t, seconds)})
+        bucket += step
+    return jsonify({"granularity": granularity, "slots": n_slots, "series": series}), 200
+
+
+@app.get("/analytics/slots")
+@lot_scoped
+@read_only
+def analytics_slots():
+    """Per-slot occupancy, turnover, dwell and block incidents over the window."""
+    window, error = _analytics_window(request.args)
+    if error:
+        return error
+    granularity, start, end = window
+    seconds = (end - start).total_seconds()
+
+    totals = _rollup_totals(g.lot, granularity, start, end, SlotRollup.slot_code)
+    codes = [c for (c,) in db.session.query(ParkingSlot.slot_code)
+             .filter(ParkingSlot.lot_id == g.lot.id).order_by(ParkingSlot.id)]
+    empty = dict.fromkeys(analytics.COUNTERS, 0)
+    return jsonify({
+        "from": fmt_minute(start),
+        "to": fmt_minute(end),
+        "slots": [{"slot_code": c, **_summary(totals.get(c, empty), seconds)} for c in codes],
+    }), 200
+
+
+@app.get("/forecast/occupancy")
+@lot_scoped
+@read_only
+def forecast_occupancy():
+    """Expected concurrent reservations in the lot for the next ?hours= hours (default 24)."""
+    hours = min(max(request.args.get("hours", 24, type=int), 1), forecast.HOURS_PER_WEEK)
+    demand.ensure_started()
+    f = demand.forecast(g.lot.id)
+    return jsonify({
+        "lot": g.lot.code,
+        "trained_at": fmt_minute(f.trained_at) if f.trained_at else None,
+        "reservations": f.reservations,
+        "capacity": (db.session.query(func.count(ParkingSlot.id))
+                     .filter(ParkingSlot.lot_id == g.lot.id).scalar()),
+        "curve": [
+            {"hour": fmt_minute(h), "short_stays": round(short, 2), "long_stays": round(long_, 2)}
+            for h, short, long_ in f.curve(datetime.now(), hours)
+        ],
+    }), 200
+
+
+# ==========================================================
+# BATCH ENDPOINTS (fleet / operator workloads)
+# ==========================================================
+# Each batch runs in one transaction with bulk INSERT / UPDATE statements
+# and answers 200 with one result per item, in request order:
+#   {"results": [{"index": 0, "ok": true, ...}, ...], "succeeded": n, "failed": m}
+# Items that fail validation are reported and skipped; the rest commit.
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 500))
+
+
+def _batch_items(data, key):
+    items = data.get(key)
+    if not isinstance(items, list) or not items:
+        return None, (jsonify({"message": f"{key} must be a non-empty list"}), 400)
+    if len(items) > BATCH_MAX_ITEMS:
+        return None, (jsonify({"message": f"At most {BATCH_MAX_ITEMS} {key} per batch"}), 413)
+    return items, None
+
+
+def _batch_response(results):
+    ok = sum(1 for r in results if r["ok"])
+    return jsonify({"results": results, "succeeded": ok, "failed": len(results) - ok}), 200
+
+
+def _item_error(index, message, **extra):
+    return {"index": index, "ok": False, "message": message, **extra}
+
+
+def _item_id(value):
+    """A row id from a batch item (1 or "1"), or None for anything else."""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return None
+
+
+VEHICLE_FIELDS = {"length_m": "length", "width_m": "width", "height_m": "height"}
+
+
+@app.post("/vehicle/details/batch")
+def save_vehicle_details_batch():
+    data = request.get_json() or {}
+    required = require_fields(data, ["email"])
+    if required:
+        return required
+    items, error = _batch_items(data, "vehicles")
+    if error:
+        return error
+
+    user = User.query.filter_by(email=data["email"].lower().strip()).first()
+    if not user:
+        return jsonify({"message": "User not found"}), 404
+
+    plates = {str(v.get("plate_number") or "").strip().upper()
+              for v in items if isinstance(v, dict)}
+    existing = dict(
+        db.session.query(Vehicle.plate_number, Vehicle.id)
+        .filter(Vehicle.user_id == user.id, Vehicle.plate_number.in_(plates))
     )
+
+    # one row per plate; later items for the same plate win
+    inserts, updates, results = {}, {}, []
+    for i, item in enumerate(items):
+        plate = str(item.get("plate_number") or "").strip().upper() if isinstance(item, dict) else ""
+        if not plate:
+            results.append(_item_error(i, "plate_number required"))
+            continue
+        try:
+            fields = {col: float(item[key]) for key, col in VEHICLE_FIELDS.items() if key in item}
+        except (TypeError, ValueError):
+            results.append(_item_error(i, "Dimensions must be numbers", plate_number=plate))
+            continue
+        if "door_opening_type" in item:
+            if not isinstance(item["door_opening_type"], (str, type(None))):
+                results.append(_item_error(i, "door_opening_type must be a string", plate_number=plate))
+                continue
+            fields["door_type"] = item["door_opening_type"]
+
+        if plate in existing:
+            updates.setdefault(plate, {"id": existing[plate]}).update(fields)
+            action = "updated"
+        else:
+            inserts.setdefault(plate, {"plate_number": plate, "vehicle_type": "CAR",
+                                       "user_id": user.id}).update(fields)
+            action = "created"
+        results.append({"index": i, "ok": True, "plate_number": plate, "action": action})
+
+    db.session.bulk_insert_mappings(Vehicle, list(inserts.values()))
+    db.session.bulk_update_mappings(Vehicle, [u for u in updates.values() if len(u) > 1])
     db.session.commit()
-    return jsonify({"message": "Cancelled"}), 200
+
+    if inserts:
+        existing.update(
+            db.session.query(Vehicle.plate_number, Vehicle.id)
+            .filter(Vehicle.user_id == user.id, Vehicle.plate_number.in_(list(inserts)))
+        )
+    for r in results:
+        if r["ok"]:
+            r["vehicle_id"] = existing[r["plate_number"]]
+    return _batch_response(results)
 
 
+@app.post("/reservation/create/batch")
+@lot_scoped
+def create_reservation_batch():
+    lot = g.lot
+    expire_reservations(lot)
+    ensure_slots(lot)
+
+    data = request.get_json() or {}
+    required = require_fields(data, ["email"])
+    if required:
+        return required
+    items, error = _batch_items(data, "reservations")
+    if error:
+        return error
+
+    user = User.query.filter_by(email=data["email"].lower().strip()).first()
+    if not user:
+        return jsonify({"message": "User not found"}), 404
+
+    results, parsed = [None] * len(items), []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[i] = _item_error(i, "Reservation must be an object")
+            continue
+        missing = [f for f in ("vehicle_id", "start_time", "end_time") if not item.get(f)]
+        if missing:
+            results[i] = _item_error(i, f"{', '.join(missing)} required")
+            continue
+        vehicle_id = _item_id(item["vehicle_id"])
+        if vehicle_id is None:
+            results[i] = _item_error(i, "vehicle_id must be an integer")
+            continue
+        try:
+            start, end = parse_dt(str(item["start_time"])), parse_dt(str(item["end_time"]))
+        except ValueError:
+            results[i] = _item_error(i, "Times must be YYYY-MM-DD HH:MM")
+            continue
+        parsed.append((i, vehicle_id, start, end))
+
+    known_vehicles = {vid for (vid,) in db.session.query(Vehicle.id)
+                      .filter(Vehicle.id.in_({p[1] for p in parsed}))}
+    valid = []
+    for i, vehicle_id, start, end in parsed:
+        if vehicle_id not in known_vehicles:
+            results[i] = _item_error(i, "Vehicle not found")
+            continue
+        valid.append((i, vehicle_id, start, end))
+
+    user_id = user.id
+
+    # all-or-nothing per attempt: a slot taken concurrently re-runs the allocation
+    def book():
+        free = ParkingSlot.query.filter_by(lot_id=lot.id, status="available").all()
+        reservations, notes, booked, full = [], [], [], []
+        for i, vehicle_id, start, end in valid:
+            slot = pick_slot(lot, free, start, end)
+            if slot is None:
+                full.append(i)
+                continue
+            free.remove(slot)
+            slot.status = slot_states.settle(slot.status, slot_states.RESERVE)
+            reservations.append({"lot_id": lot.id, "user_id": user_id, "vehicle_id": vehicle_id,
+                                 "slot_id": slot.id,
+                                 "start_time": start, "end_time": end, "status": "active"})
+            notes.append({"user_id": user_id, "title": "Reservation Confirmed", "message": (
+                f"Your slot {slot.slot_code} has been reserved from "
+                f"{start.strftime('%Y-%m-%d %H:%M')} to {end.strftime('%Y-%m-%d %H:%M')}.")})
+            booked.append((i, slot.slot_code, start, end))
+
+        # return_defaults fills in each mapping's new id (RETURNING where supported)
+        db.session.bulk_insert_mappings(Reservation, reservations, return_defaults=True)
+        db.session.bulk_insert_mappings(Notification, notes)
+        return [(*b, r["id"]) for b, r in zip(booked, reservations)], full
+
+    booked, full = with_cas_retry(book)
+    for i in full:
+        results[i] = _item_error(i, "Parking Full")
+
+    for i, slot_code, start, end, reservation_id in booked:
+        results[i] = {
+            "index": i, "ok": True,
+            "lot": lot.code,
+            "slot": slot_code,
+            "reservation_id": reservation_id,
+            "start_time": start.strftime("%Y-%m-%d %H:%M"),
+            "end_time": end.strftime("%Y-%m-%d %H:%M"),
+        }
+    return _batch_response(results)
+
+
+@app.post("/reservation/cancel/batch")
+@lot_scoped
+def cancel_reservation_batch():
+    data = request.get_json() or {}
+    raw_ids, error = _batch_items(data, "reservation_ids")
+    if error:
+        return error
+    ids = [_item_id(rid) for rid in raw_ids]
+
+    def attempt():
+        found = {r.id: r for r in Reservation.query.filter(Reservation.lot_id == g.lot.id,
+                                                           Reservation.id.in_(set(ids) - {None}))}
+        slots = {s.id: s for s in ParkingSlot.query.filter(
+            ParkingSlot.id.in_({r.slot_id for r in found.values()}))}
+
+        results, res_updates, notes, done = [], [], [], set()
+        for i, rid in enumerate(ids):
+            if rid is None:
+                results.append(_item_error(i, "reservation_id must be an integer"))
+                continue
+            r = found.get(rid)
+            if not r:
+                results.append(_item_error(i, "Reservation not found", reservation_id=rid))
+                continue
+            if r.status not in ("active", "cancelled"):
+                results.append(_item_error(i, f"Reservation is {r.status}", reservation_id=rid))
+                continue
+            if r.status == "active" and rid not in done:
+                done.add(rid)
+                # the version makes this a compare-and-swap like any ORM update
+                res_updates.append({"id": r.id, "version": r.version, "status": "cancelled"})
+                slot = slots.get(r.slot_id)
+                release_slot(slot)
+                notes.append({"user_id": r.user_id, "title": "Reservation Cancelled", "message": (
+                    f"Your reservation (ID {r.id}) for slot "
+                    f"{slot.slot_code if slot else ''} has been cancelled.")})
+            results.append({"index": i, "ok": True, "reservation_id": rid, "message": "Cancelled"})
+
+        db.session.bulk_update_mappings(Reservation, res_updates)
+        db.session.bulk_insert_mappings(Notification, notes)
+        return results
+
+    return _batch_response(with_cas_retry(attempt))
+
+
+@app.post("/update-slot/batch")
+@lot_scoped
+def update_slot_batch():
+    data = request.get_json() or {}
+    items, error = _batch_items(data, "updates")
+    if error:
+        return error
+
+    # anything but a string code / status is reported per item like an unknown one
+    items = [item if isinstance(item, dict) else {} for item in items]
+    codes = {item.get("slot_code") for item in items if isinstance(item.get("slot_code"), str)}
+
+    # applied in order through the ORM so reallocations see earlier items;
+    # the unit of work flushes the slot UPDATEs as one executemany
+    def attempt():
+        slots = {s.slot_code: s for s in ParkingSlot.query.filter(ParkingSlot.lot_id == g.lot.id,
+                                                                  ParkingSlot.slot_code.in_(codes))}
+        results = []
+        for i, item in enumerate(items):
+            code, status = item.get("slot_code"), item.get("status")
+            slot = slots.get(code) if isinstance(code, str) else None
+            if not slot:
+                results.append(_item_error(i, "Slot not found"))
+                continue
+            result = apply_slot_update(slot, status) if isinstance(status, str) else None
+            if result is None:
+                results.append(_item_error(
+                    i, f"status must be one of {', '.join(slot_states.VISION_EVENTS)}",
+                    slot_code=slot.slot_code))
+                continue
+            results.append({"index": i, "ok": True, "slot_code": slot.slot_code, **result})
+        return results
+
+    return _batch_response(with_cas_retry(attempt))
+
+
+# ==========================================================
+# METRICS & PROFILING
 # ==========================================================
 
-if __name__ == "__main__":
+# PROFILE_OUTPUT=<file> samples the whole process and writes collapsed
+# stacks at exit; ENABLE_PROFILER=1 exposes on-demand /debug/profile.
+_profiler = metrics.SamplingProfiler()
+if os.getenv("PROFILE_OUTPUT"):
+    _profiler.start()
+
+    @atexit.register
+    def _dump_profile():
+        with open(os.environ["PROFILE_OUTPUT"], "w") as f:
+            f.write(_profiler.stop())
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
+
+@app.get("/debug/profile")
+def debug_profile():
+    """Sample all threads for ?seconds=N (max 120) and return collapsed stacks."""
+    if os.getenv("ENABLE_PROFILER") != "1":
+        return jsonify({"message": "Profiler disabled"}), 404
+    if _profiler.running:
+        return jsonify({"message": "Profiler already running"}), 409
+    seconds = request.args.get("seconds", 10, type=float)       # not a number: 10
+    seconds = min(max(seconds, 0.1), 120) if seconds == seconds else 10   # NaN: 10
+    _profiler.start()
+    time.sleep(seconds)
+    return Response(_profiler.stop(), mimetype="text/plain")
+
+
+# ==========================================================
+
+def upgrade_database():
+    """Apply pending schema migrations (alembic upgrade head)."""
+    from alembic import command
+    from alembic.config import Config
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    cfg = Config(os.path.join(here, "alembic.ini"))
+    cfg.set_main_option("script_location", os.path.join(here, "migrations"))
     with app.app_context():
-        db.create_all()
+        cfg.set_main_option("sqlalchemy.url",
+                            db.engine.url.render_as_string(hide_password=False).replace("%", "%%"))
+    cfg.attributes["target_metadata"] = db.metadata
+    cfg.attributes["configure_logger"] = False
+    command.upgrade(cfg, "head")
+
+
+if __name__ == "__main__":
+    upgrade_database()
     app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
@@ -0,0 +1,131 @@
+"""
+bench_encoders.py  —  Encode time and bytes per frame for each backend
+
+    python bench_encoders.py                  # synthetic 640x480 parking frames
+    python bench_encoders.py --camera 0       # frames from a webcam
+    python bench_encoders.py --width 360 --quality 55 --frames 200
+"""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+import encoders
+from overlay import GridOverlay
+
+
+def synthetic_frames(n, width, height):
+    """Noisy grey lot with a white sheet, a moving red car and the grid overlay."""
+    rng = np.random.default_rng(0)
+    base = rng.normal(110, 18, (height, width, 3)).clip(0, 255).astype(np.uint8)
+    cv2.rectangle(base, (width // 10, height // 10),
+                  (width * 9 // 10, height * 9 // 10), (235, 235, 235), cv2.FILLED)
+
+    def paint(layer, code, x1, y1, x2, y2):
+        layer.rectangle((x1, y1), (x2, y2), (180, 180, 180), 1)
+        layer.text(code, (x1 + 4, y1 + 20), 0.4, (200, 200, 200), 1)
+
+    grid = GridOverlay(3, 4, {"available": paint})
+    frames = []
+    for i in range(n):
+        frame = base.copy()
+        x = int((i * 7) % (width * 3 // 4)) + width // 10
+        cv2.rectangle(frame, (x, height // 3), (x + width // 8, height // 3 + height // 6),
+                      (0, 0, 220), cv2.FILLED)
+        grid.render(frame, (width // 10, height // 10, width * 8 // 10, height * 8 // 10), {})
+        frames.append(frame)
+    return frames
+
+
+def camera_frames(index, n, width):
+    cap = cv2.VideoCapture(index)
+    frames = []
+    while len(frames) < n:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        if width and frame.shape[1] > width:
+            h = round(frame.shape[0] * width / frame.shape[1])
+            frame = cv2.resize(frame, (width, h), interpolation=cv2.INTER_AREA)
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def bench_still(encoder, frames, quality):
+    sizes = []
+    t0 = time.perf_counter()
+    for f in frames:
+        sizes.append(len(encoder.encode(f, quality)))
+    elapsed = time.perf_counter() - t0
+    return elapsed / len(frames) * 1000, sum(sizes) / len(sizes)
+
+
+def bench_pool(frames, quality):
+    t0 = time.perf_counter()
+    jobs = [encoders.encode_async(f, "jpeg", quality) for f in frames]
+    total = sum(len(j.result()[0]) for j in jobs)
+    elapsed = time.perf_counter() - t0
+    return elapsed / len(frames) * 1000, total / len(frames)
+
+
+def bench_h264(frames, fps):
+    h, w = frames[0].shape[:2]
+    stream = encoders.H264Stream(w, h, fps=fps)
+    total = 0
+    t0 = time.perf_counter()
+    for f in frames:
+        total += len(stream.push(f))
+    total += len(stream.close())
+    elapsed = time.perf_counter() - t0
+    return stream.backend, elapsed / len(frames) * 1000, total / len(frames)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--frames", type=int, default=120)
+    ap.add_argument("--width", type=int, default=640)
+    ap.add_argument("--height", type=int, default=480)
+    ap.add_argument("--quality", type=int, default=70)
+    ap.add_argument("--fps", type=int, default=10)
+    ap.add_argument("--camera", type=int, default=None)
+    args = ap.parse_args()
+
+    if args.camera is not None:
+        frames = camera_frames(args.camera, args.frames, args.width)
+    else:
+        frames = synthetic_frames(args.frames, args.width, args.height)
+    if not frames:
+        print("[ERROR] No frames captured.")
+        return
+
+    h, w = frames[0].shape[:2]
+    print(f"{len(frames)} frames  {w}x{h}  quality={args.quality}\n")
+    print(f"{'backend':<22}{'ms/frame':>10}{'KB/frame':>11}")
+
+    candidates = [encoders.OpenCVJpegEncoder(), encoders.WebPEncoder()]
+    try:
+        candidates.insert(1, encoders.TurboJpegEncoder())
+    except Exception as e:
+        print(f"{'turbojpeg':<22}{'n/a':>10}   ({e})".splitlines()[0])
+
+    for enc in candidates:
+        ms, size = bench_still(enc, frames, args.quality)
+        print(f"{enc.name:<22}{ms:>10.2f}{size / 1024:>11.1f}")
+
+    ms, size = bench_pool(frames, args.quality)
+    label = f"{encoders.get_encoder('jpeg').name} x{encoders.ENCODE_WORKERS} pool"
+    print(f"{label:<22}{ms:>10.2f}{size / 1024:>11.1f}")
+
+    if encoders.h264_available():
+        backend, ms, size = bench_h264(frames, args.fps)
+        print(f"{'h264 fmp4 (' + backend + ')':<22}{ms:>10.2f}{size / 1024:>11.1f}")
+    else:
+        print(f"{'h264 fmp4':<22}{'n/a':>10}   (install PyAV or ffmpeg)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+bench_json.py  —  CPU per request for the polling endpoints
+
+Drives /slots/status, /notifications/<email> and /reservation/list/<email>
+through the Flask test client against a seeded in-memory database and
+reports process CPU time (µs) and response bytes per request for:
+
+  stdlib     Flask's default json provider, no compression
+  orjson     json_provider.OrjsonProvider (if orjson is installed)
+  +gzip/+br  orjson plus Accept-Encoding negotiation (compression.py)
+
+plus whole-handler CPU before (ORM objects, strftime, stdlib json) and
+after (column tuples, fmt_minute, installed provider).
+
+    python bench_json.py
+    python bench_json.py --slots 200 --notes 50 --reservations 30 --requests 2000
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import benchmark
+
+
+def seed(m, n_slots, n_notes, n_reservations):
+    users = benchmark.seed(m, 1, n_slots)
+    email, vehicle_id = users[0]
+    uid = m.db.session.query(m.User.id).scalar()
+    now = datetime.now().replace(microsecond=0)
+    m.db.session.bulk_insert_mappings(m.Notification, [
+        {"user_id": uid, "title": "Reservation Confirmed",
+         "message": f"Your slot A{i % n_slots + 1} has been reserved from "
+                    f"2030-01-01 10:00 to 2030-01-01 12:00.",
+         "created_at": now - timedelta(minutes=i)}
+        for i in range(n_notes)
+    ])
+    m.db.session.bulk_insert_mappings(m.Reservation, [
+        {"lot_id": 1, "user_id": uid, "vehicle_id": vehicle_id, "slot_id": i % n_slots + 1,
+         "start_time": now + timedelta(hours=i), "end_time": now + timedelta(hours=i + 2),
+         "status": "active"}
+        for i in range(n_reservations)
+    ])
+    m.db.session.commit()
+    return email
+
+
+def cpu_per_request(client, path, n, headers=None):
+    client.get(path, headers=headers)                   # warm caches
+    size = 0
+    t0 = time.process_time()
+    for _ in range(n):
+        size = len(client.get(path, headers=headers).data)
+    return (time.process_time() - t0) / n * 1e6, size
+
+
+# the handler bodies before column projections, for comparison
+def legacy_notifications(m, email):
+    user = m.User.query.filter_by(email=email).first()
+    notes = (m.Notification.query.filter_by(user_id=user.id)
+             .order_by(m.Notification.created_at.desc()).limit(50).all())
+    return [{"id": n.id, "title": n.title, "message": n.message,
+             "created_at": n.created_at.strftime("%Y-%m-%d %H:%M")} for n in notes]
+
+
+def legacy_reservations(m, email):
+    user = m.User.query.filter_by(email=email).first()
+    rows = (m.Reservation.query.filter_by(user_id=user.id, status="active")
+            .order_by(m.Reservation.start_time.desc()).all())
+    out = []
+    for r in rows:
+        slot = m.db.session.get(m.ParkingSlot, r.slot_id)
+        out.append({"id": r.id, "slot": slot.slot_code if slot else "?", "slot_id": r.slot_id,
+                    "start_time": r.start_time.strftime("%Y-%m-%d %H:%M"),
+                    "end_time": r.end_time.strftime("%Y-%m-%d %H:%M"), "status": r.status})
+    return out
+
+
+def cpu_per_call(fn, n):
+    fn()
+    t0 = time.process_time()
+    for _ in range(n):
+        fn()
+    return (time.process_time() - t0) / n * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--slots", type=int, default=120)
+    ap.add_argument("--notes", type=int, default=50)
+    ap.add_argument("--reservations", type=int, default=30)
+    ap.add_argument("--requests", type=int, default=1000)
+    args = ap.parse_args()
+
+    m = benchmark.load_app("sqlite://")
+    import compression
+    import json_provider
+    from flask.json.provider import DefaultJSONProvider
+
+    with m.app.app_context():
+        email = seed(m, args.slots, args.notes, args.reservations)
+
+    paths = {"/slots/status": "/slots/status",
+             "/notifications/<email>": f"/notifications/{email}",
+             "/reservation/list/<email>": f"/reservation/list/{email}"}
+    stdlib = DefaultJSONProvider(m.app)
+    configs = [("stdlib", stdlib, None)]
+    if json_provider.orjson is not None:
+        fast = json_provider.OrjsonProvider(m.app)
+        configs.append(("orjson", fast, None))
+        configs += [(f"orjson+{enc}", fast, {"Accept-Encoding": enc})
+                    for enc in compression.PREFERENCE if enc in compression.ENCODERS]
+    else:
+        print("orjson not installed: only the stdlib provider is measured")
+
+    client = m.app.test_client()
+    print(f"{args.requests} requests each  slots={args.slots}  notes={args.notes}  "
+          f"reservations={args.reservations}\n")
+    print(f"{'endpoint':<28}{'config':<14}{'µs CPU/req':>12}{'bytes':>9}")
+    for label, path in paths.items():
+        base = None
+        for name, provider, headers in configs:
+            m.app.json = provider
+            us, size = cpu_per_request(client, path, args.requests, headers)
+            base = base or us
+            print(f"{label:<28}{name:<14}{us:>12.0f}{size:>9}   {us - base:+.0f}")
+    json_provider.install(m.app)
+
+    print(f"\n{'handler':<28}{'before':>10}{'after':>10}")
+    with m.app.test_request_context():
+        view = m.app.view_functions
+        for label, legacy, current in (
+                ("/notifications/<email>", legacy_notifications, view["get_notifications"]),
+                ("/reservation/list/<email>", legacy_reservations, view["list_reservations"])):
+            old = cpu_per_call(lambda: stdlib.response(legacy(m, email)), args.requests)
+            new = cpu_per_call(lambda: current(email), args.requests)
+            print(f"{label:<28}{old:>8.0f}µs{new:>8.0f}µs   {new - old:+.0f}")
+
+
+if __name__ == "__main__":
+    main()
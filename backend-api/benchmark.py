@@ -0,0 +1,479 @@
+"""
+benchmark.py  —  Load / latency benchmark for the backend API
+──────────────────────────────────────────────────────────────
+Runs the Flask app in-process against a throwaway database (a temporary
+SQLite file by default, or any SQLAlchemy URL via --db-url, e.g. a
+disposable MySQL container), seeds users / vehicles / slots and drives
+concurrent request mixes:
+
+  poll_storm     /slots/status, /notifications/<email>, /reservation/list/<email>
+  booking_burst  /reservation/create + /reservation/cancel
+  vision_flood   /update-slot with random statuses (incl. reallocation)
+  mixed          all of the above at realistic ratios
+
+--batch N compares the batch endpoints against N single-item requests
+(vehicle upsert, reservation create / cancel, slot updates) in items/s
+and SQL statements per item.
+
+Per scenario and endpoint it reports throughput, p50 / p95 / p99 latency,
+SQL statements per request, error counts and allocation conflicts (slots
+holding more than one active reservation). Results are written to
+bench_results/<timestamp>-<commit>.json so runs can be compared:
+
+    python benchmark.py --users 200 --slots 120 --threads 8 --seconds 10
+    python benchmark.py --scenario poll_storm booking_burst
+    python benchmark.py --scenario --batch 200
+    python benchmark.py --compare bench_results/a.json bench_results/b.json
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_results")
+
+STATUSES = ["available", "occupied", "blocked"]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Setup
+# ─────────────────────────────────────────────────────────────────────────────
+
+def load_app(db_url):
+    """Import app.py bound to `db_url` (must happen before the first import)."""
+    os.environ["DATABASE_URL"] = db_url
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")   # one client, thousands of req/s
+    import app as app_module
+    return app_module
+
+
+def seed(m, n_users, n_slots):
+    from werkzeug.security import generate_password_hash
+
+    db = m.db
+    db.drop_all()
+    db.create_all()
+
+    pw = generate_password_hash("password")       # hashing is slow; reuse one
+    db.session.bulk_insert_mappings(m.User, [
+        {"name": f"Bench {i}", "email": f"bench{i}@example.com", "password_hash": pw}
+        for i in range(n_users)
+    ])
+    lot = m.lot_directory.get(m.lots.DEFAULT_LOT)
+    db.session.bulk_insert_mappings(m.ParkingSlot, [
+        {"lot_id": lot.id, "slot_code": f"A{i}", "status": "available"}
+        for i in range(1, n_slots + 1)
+    ])
+    db.session.commit()
+
+    users = db.session.query(m.User.id, m.User.email).all()
+    db.session.bulk_insert_mappings(m.Vehicle, [
+        {"user_id": uid, "plate_number": f"BEN-{uid:04d}", "vehicle_type": "CAR"}
+        for uid, _ in users
+    ])
+    db.session.commit()
+
+    vehicles = dict(db.session.query(m.Vehicle.user_id, m.Vehicle.id).all())
+    return [(email, vehicles[uid]) for uid, email in users]
+
+
+def reset_state(m):
+    m.db.session.query(m.Reservation).delete()
+    m.db.session.query(m.Notification).delete()
+    m.db.session.query(m.ParkingSlot).update({"status": "available"})
+    m.db.session.commit()
+
+
+class QueryCounter:
+    """Counts SQL statements per endpoint via SQLAlchemy cursor events."""
+
+    def __init__(self, engine):
+        from flask import has_request_context, request
+        from sqlalchemy import event
+
+        self.counts = defaultdict(int)
+        self._lock = threading.Lock()
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _count(conn, cursor, statement, parameters, context, executemany):
+            if has_request_context() and request.url_rule is not None:
+                key = f"{request.method} {request.url_rule.rule}"
+                with self._lock:
+                    self.counts[key] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Operations  (each returns the endpoint label and the response)
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _times():
+    start = datetime.now() + timedelta(minutes=random.randint(1, 600))
+    end = start + timedelta(minutes=random.choice([30, 60, 120, 240]))
+    return start.strftime("%Y-%m-%d %H:%M"), end.strftime("%Y-%m-%d %H:%M")
+
+
+def op_slot_status(client, ctx):
+    return "GET /slots/status", client.get("/slots/status")
+
+
+def op_notifications(client, ctx):
+    email, _ = random.choice(ctx["users"])
+    return "GET /notifications/<email>", client.get(f"/notifications/{email}")
+
+
+def op_list_reservations(client, ctx):
+    email, _ = random.choice(ctx["users"])
+    return "GET /reservation/list/<email>", client.get(f"/reservation/list/{email}")
+
+
+def op_create(client, ctx):
+    email, vehicle_id = random.choice(ctx["users"])
+    start, end = _times()
+    resp = client.post("/reservation/create", json={
+        "email": email, "vehicle_id": vehicle_id, "start_time": start, "end_time": end})
+    if resp.status_code == 201:
+        with ctx["lock"]:
+            ctx["reservations"].append(resp.get_json()["reservation_id"])
+    return "POST /reservation/create", resp
+
+
+def op_cancel(client, ctx):
+    with ctx["lock"]:
+        rid = ctx["reservations"].pop() if ctx["reservations"] else None
+    if rid is None:
+        return op_create(client, ctx)
+    return "POST /reservation/cancel", client.post("/reservation/cancel",
+                                                   json={"reservation_id": rid})
+
+
+def op_update_slot(client, ctx):
+    code = f"A{random.randint(1, ctx['n_slots'])}"
+    status = random.choices(STATUSES, weights=[6, 3, 1])[0]
+    return "POST /update-slot", client.post("/update-slot",
+                                            json={"slot_code": code, "status": status})
+
+
+SCENARIOS = {
+    "poll_storm":    [(op_slot_status, 70), (op_notifications, 20), (op_list_reservations, 10)],
+    "booking_burst": [(op_create, 80), (op_cancel, 20)],
+    "vision_flood":  [(op_update_slot, 100)],
+    "mixed":         [(op_slot_status, 45), (op_notifications, 15), (op_list_reservations, 10),
+                      (op_update_slot, 20), (op_create, 7), (op_cancel, 3)],
+}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Driver
+# ─────────────────────────────────────────────────────────────────────────────
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+def summarise(samples, queries, seconds):
+    by_ep = defaultdict(list)
+    errors = defaultdict(int)
+    for label, ms, status in samples:
+        by_ep[label].append(ms)
+        if status >= 500:
+            errors[label] += 1
+
+    endpoints = {}
+    for label, values in sorted(by_ep.items()):
+        values.sort()
+        endpoints[label] = {
+            "requests": len(values),
+            "rps": round(len(values) / seconds, 1),
+            "p50_ms": round(percentile(values, 50), 2),
+            "p95_ms": round(percentile(values, 95), 2),
+            "p99_ms": round(percentile(values, 99), 2),
+            "queries_per_req": round(queries.get(label, 0) / len(values), 2),
+            "errors": errors[label],
+        }
+    all_ms = sorted(ms for _, ms, _ in samples)
+    return {
+        "requests": len(all_ms),
+        "rps": round(len(all_ms) / seconds, 1),
+        "p50_ms": round(percentile(all_ms, 50) or 0, 2),
+        "p95_ms": round(percentile(all_ms, 95) or 0, 2),
+        "p99_ms": round(percentile(all_ms, 99) or 0, 2),
+        "errors": sum(errors.values()),
+        "endpoints": endpoints,
+    }
+
+
+def allocation_conflicts(m):
+    from sqlalchemy import func
+    R = m.Reservation
+    return (m.db.session.query(R.slot_id)
+            .filter(R.status == "active")
+            .group_by(R.slot_id)
+            .having(func.count(R.id) > 1)
+            .count())
+
+
+def run_scenario(m, counter, name, users, n_slots, threads, seconds):
+    with m.app.app_context():
+        reset_state(m)
+
+    mix = SCENARIOS[name]
+    ops, weights = zip(*mix)
+    ctx = {"users": users, "n_slots": n_slots, "reservations": [],
+           "lock": threading.Lock()}
+    samples = []
+    samples_lock = threading.Lock()
+    stop = threading.Event()
+    before = counter.snapshot()
+
+    def worker(seed_):
+        random.seed(seed_)
+        client = m.app.test_client()
+        local = []
+        while not stop.is_set():
+            op = random.choices(ops, weights=weights)[0]
+            t0 = time.perf_counter()
+            try:
+                label, resp = op(client, ctx)
+                status = resp.status_code
+            except Exception:
+                label, status = op.__name__, 599
+            local.append((label, (time.perf_counter() - t0) * 1000, status))
+        with samples_lock:
+            samples.extend(local)
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    t_start = time.perf_counter()
+    for t in pool:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - t_start
+
+    after = counter.snapshot()
+    queries = {k: after.get(k, 0) - before.get(k, 0) for k in after}
+    result = summarise(samples, queries, elapsed)
+    with m.app.app_context():
+        result["allocation_conflicts"] = allocation_conflicts(m)
+    return result
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Batch vs single-item throughput
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _run_pair(m, counter, n, single, batch, setup=None):
+    """Time `n` single-item calls against one batch call of `n` items."""
+    out = {}
+    for mode, fn in (("single", single), ("batch", batch)):
+        with m.app.app_context():
+            reset_state(m)
+        if setup:
+            setup(mode)
+        before = sum(counter.snapshot().values())
+        t0 = time.perf_counter()
+        ok = fn()
+        elapsed = time.perf_counter() - t0
+        queries = sum(counter.snapshot().values()) - before
+        out[mode] = {"items_per_s": round(n / elapsed, 1), "ms": round(elapsed * 1000, 1),
+                     "queries_per_item": round(queries / n, 2), "ok": ok}
+    out["speedup"] = round(out["batch"]["items_per_s"] / out["single"]["items_per_s"], 1)
+    return out
+
+
+def run_batch_comparison(m, counter, users, n_slots, n):
+    """Single-item endpoints vs their /batch counterparts, `n` items each."""
+    client = m.app.test_client()
+    email, vehicle_id = users[0]
+    n = min(n, n_slots)                 # every reservation needs a free slot
+    run = 0
+
+    def vehicles():
+        return [{"plate_number": f"B{run}-{i:05d}", "length_m": 4.5, "width_m": 1.8}
+                for i in range(n)]
+
+    def upsert_single():
+        nonlocal run
+        run += 1
+        return sum(client.post("/vehicle/details", json={"email": email, **v}).status_code == 200
+                   for v in vehicles())
+
+    def upsert_batch():
+        nonlocal run
+        run += 1
+        resp = client.post("/vehicle/details/batch", json={"email": email, "vehicles": vehicles()})
+        return resp.get_json()["succeeded"]
+
+    bookings = [dict(zip(("start_time", "end_time"), _times()), vehicle_id=vehicle_id)
+                for _ in range(n)]
+    created = []
+
+    def create_single():
+        created[:] = [client.post("/reservation/create", json={"email": email, **b})
+                      .get_json().get("reservation_id") for b in bookings]
+        return sum(1 for rid in created if rid)
+
+    def create_batch():
+        resp = client.post("/reservation/create/batch", json={"email": email, "reservations": bookings})
+        created[:] = [r["reservation_id"] for r in resp.get_json()["results"] if r["ok"]]
+        return len(created)
+
+    def cancel_single():
+        return sum(client.post("/reservation/cancel", json={"reservation_id": rid}).status_code == 200
+                   for rid in created)
+
+    def cancel_batch():
+        resp = client.post("/reservation/cancel/batch", json={"reservation_ids": created})
+        return resp.get_json()["succeeded"]
+
+    updates = [{"slot_code": f"A{random.randint(1, n_slots)}",
+                "status": random.choice(["available", "occupied"])} for _ in range(n)]
+
+    def update_single():
+        return sum(client.post("/update-slot", json=u).status_code == 200 for u in updates)
+
+    def update_batch():
+        return client.post("/update-slot/batch", json={"updates": updates}).get_json()["succeeded"]
+
+    results = {
+        "vehicle_upsert": _run_pair(m, counter, n, upsert_single, upsert_batch),
+        "reservation_create": _run_pair(m, counter, n, create_single, create_batch),
+        # cancel what a fresh create of the same kind booked
+        "reservation_cancel": _run_pair(m, counter, n, cancel_single, cancel_batch,
+                                        setup=lambda mode: create_single() if mode == "single"
+                                        else create_batch()),
+        "slot_update": _run_pair(m, counter, n, update_single, update_batch),
+    }
+    with m.app.app_context():
+        reset_state(m)
+    return results
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Reporting
+# ─────────────────────────────────────────────────────────────────────────────
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "nogit"
+
+
+def print_scenario(name, r):
+    print(f"\n== {name}: {r['requests']} req  {r['rps']} req/s  "
+          f"p50 {r['p50_ms']}  p95 {r['p95_ms']}  p99 {r['p99_ms']} ms  "
+          f"errors {r['errors']}  conflicts {r['allocation_conflicts']}")
+    print(f"  {'endpoint':<34}{'req/s':>8}{'p50':>8}{'p95':>8}{'p99':>8}{'q/req':>7}{'err':>5}")
+    for label, e in r["endpoints"].items():
+        print(f"  {label:<34}{e['rps']:>8}{e['p50_ms']:>8}{e['p95_ms']:>8}"
+              f"{e['p99_ms']:>8}{e['queries_per_req']:>7}{e['errors']:>5}")
+
+
+def print_batch(n, results):
+    print(f"\n== batch vs single ({n} items)")
+    print(f"  {'operation':<22}{'single/s':>10}{'batch/s':>10}{'speedup':>9}{'q/item':>14}")
+    for name, r in results.items():
+        s, b = r["single"], r["batch"]
+        print(f"  {name:<22}{s['items_per_s']:>10}{b['items_per_s']:>10}{r['speedup']:>8}x"
+              f"{s['queries_per_item']:>7} → {b['queries_per_item']:<5}")
+
+
+def compare(path_a, path_b):
+    with open(path_a) as f:
+        a = json.load(f)
+    with open(path_b) as f:
+        b = json.load(f)
+    print(f"{a['commit']} → {b['commit']}")
+    for name in b["scenarios"]:
+        if name not in a["scenarios"]:
+            continue
+        print(f"\n== {name}")
+        print(f"  {'endpoint':<34}{'req/s':>16}{'p99 ms':>18}{'q/req':>14}")
+        ea, eb = a["scenarios"][name]["endpoints"], b["scenarios"][name]["endpoints"]
+        for label in eb:
+            if label not in ea:
+                continue
+            x, y = ea[label], eb[label]
+            print(f"  {label:<34}{x['rps']:>7} → {y['rps']:<7}"
+                  f"{x['p99_ms']:>8} → {y['p99_ms']:<8}"
+                  f"{x['queries_per_req']:>5} → {y['queries_per_req']:<5}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--db-url", default=None,
+                    help="SQLAlchemy URL of a throwaway database (default: temp SQLite file)")
+    ap.add_argument("--users", type=int, default=100)
+    ap.add_argument("--slots", type=int, default=60)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--seconds", type=float, default=5)
+    ap.add_argument("--scenario", nargs="*", choices=list(SCENARIOS), default=list(SCENARIOS))
+    ap.add_argument("--batch", type=int, default=0, metavar="N",
+                    help="also compare batch endpoints with N single-item requests")
+    ap.add_argument("--out", default=None, help="result file (default: bench_results/…)")
+    ap.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = ap.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    tmpdir = None
+    db_url = args.db_url
+    if db_url is None:
+        tmpdir = tempfile.mkdtemp(prefix="smartpark-bench-")
+        db_url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+
+    m = load_app(db_url)
+    with m.app.app_context():
+        users = seed(m, args.users, args.slots)
+        counter = QueryCounter(m.db.engine)
+
+    print(f"db={db_url}  users={args.users}  slots={args.slots}  "
+          f"threads={args.threads}  {args.seconds}s per scenario")
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {"db": db_url.split("://")[0], "users": args.users, "slots": args.slots,
+                   "threads": args.threads, "seconds": args.seconds},
+        "scenarios": {},
+    }
+    for name in args.scenario:
+        r = run_scenario(m, counter, name, users, args.slots, args.threads, args.seconds)
+        results["scenarios"][name] = r
+        print_scenario(name, r)
+    if args.batch:
+        results["batch"] = run_batch_comparison(m, counter, users, args.slots, args.batch)
+        print_batch(min(args.batch, args.slots), results["batch"])
+
+    out = args.out
+    if out is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        out = os.path.join(RESULTS_DIR, f"{stamp}-{results['commit']}.json")
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved {out}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
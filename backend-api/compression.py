@@ -0,0 +1,67 @@
+"""
+compression.py  —  Content-Encoding negotiation for JSON responses
+──────────────────────────────────────────────────────────────────
+install(app) compresses JSON responses of at least COMPRESS_MIN_BYTES
+(default 1 KiB) — in practice the list endpoints — with the best encoding
+the client accepts:
+
+  • br    → Brotli, when the optional `brotli` package is installed
+  • gzip  → stdlib zlib
+
+Small bodies (status messages, single records) are sent as-is: below ~1 KiB
+compression costs more CPU than the bytes it saves. Streams, images and
+/metrics are never touched.
+"""
+
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:                     # brotli not installed
+    brotli = None
+
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 5))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 4))
+
+ENCODERS = {"gzip": lambda data: gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)}
+if brotli is not None:
+    ENCODERS["br"] = lambda data: brotli.compress(data, quality=BROTLI_QUALITY)
+
+PREFERENCE = ("br", "gzip")
+
+
+def negotiate(accept_encodings):
+    """Best supported encoding from a werkzeug Accept header, or None."""
+    best, best_q = None, 0
+    for name in PREFERENCE:
+        q = accept_encodings[name]
+        if name in ENCODERS and q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def install(app, min_size=COMPRESS_MIN_BYTES):
+    from flask import request
+
+    @app.after_request
+    def _compress(response):
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code != 200
+                or response.mimetype != "application/json"
+                or "Content-Encoding" in response.headers):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        encoding = negotiate(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        response.set_data(ENCODERS[encoding](data))
+        response.headers["Content-Encoding"] = encoding
+        return response
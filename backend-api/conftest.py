@@ -0,0 +1,34 @@
+import os
+import tempfile
+
+import pytest
+
+# A file database (not :memory:) so the background writer threads see the
+# same data as the request under test; no rate limits for the test client.
+os.environ.setdefault("DATABASE_URL",
+                      f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='smartpark-test-'), 'test.db')}")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+
+DRIVER = "driver@example.com"
+
+
+@pytest.fixture()
+def client():
+    """Test client on freshly created tables."""
+    import app as smartpark
+    from app import db
+
+    with smartpark.app.app_context():
+        db.drop_all()
+        db.create_all()
+    yield smartpark.app.test_client()
+    with smartpark.app.app_context():
+        db.session.remove()
+
+
+@pytest.fixture()
+def driver(client):
+    """Email of a signed-up user whose vehicle has id 1."""
+    client.post("/signup", json={"name": "Driver", "email": DRIVER, "password": "pw"})
+    client.post("/vehicle/details", json={"email": DRIVER, "plate_number": "DRV-1"})
+    return DRIVER
@@ -1,11 +1,90 @@
 # db_config.py
 import os
 
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+
 DB_USER = os.getenv("DB_USER", "root")
 DB_PASS = os.getenv("DB_PASS", "Nipuna1234!")          # put your password if you have one
 DB_HOST = os.getenv("DB_HOST", "127.0.0.1")
 DB_NAME = os.getenv("DB_NAME", "smartpark_db")
+DB_READ_HOST = os.getenv("DB_READ_HOST")                # optional read replica
+
+# DB_BACKEND=sqlite runs on a local SQLite file in WAL mode (single-box
+# deployments); relative paths land in Flask's instance/ folder.
+DB_BACKEND = os.getenv("DB_BACKEND", "mysql")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "smartpark.db")
+
+
+def _mysql_uri(host):
+    return f"mysql+pymysql://{DB_USER}:{DB_PASS}@{host}/{DB_NAME}?charset=utf8mb4"
+
+
+# DATABASE_URL overrides the MySQL settings with any SQLAlchemy URL,
+# e.g. sqlite:///smartpark.db for benchmarks and tests
+if os.getenv("DATABASE_URL"):
+    SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL")
+elif DB_BACKEND == "sqlite":
+    SQLALCHEMY_DATABASE_URI = f"sqlite:///{SQLITE_PATH}"
+else:
+    SQLALCHEMY_DATABASE_URI = _mysql_uri(DB_HOST)
+
+IS_SQLITE = SQLALCHEMY_DATABASE_URI.startswith("sqlite")
+
+# ==========================================================
+# ENGINE / POOL TUNING  (values are per gunicorn worker)
+# ==========================================================
+
+DB_POOL_SIZE = _env_int("DB_POOL_SIZE", 5)
+DB_MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 10)
+DB_POOL_TIMEOUT = _env_int("DB_POOL_TIMEOUT", 10)         # s to wait for a free connection
+DB_POOL_RECYCLE = _env_int("DB_POOL_RECYCLE", 1800)       # below MySQL wait_timeout
+DB_STATEMENT_TIMEOUT_MS = _env_int("DB_STATEMENT_TIMEOUT_MS", 5000)
+DB_ISOLATION_LEVEL = os.getenv("DB_ISOLATION_LEVEL", "READ COMMITTED")
+SQLITE_BUSY_TIMEOUT = _env_int("SQLITE_BUSY_TIMEOUT", 15)  # s
+
+
+def engine_options(uri):
+    """create_engine() keyword arguments for the given database URL."""
+    if uri.startswith("sqlite"):
+        if uri in ("sqlite://", "sqlite:///:memory:"):
+            return {}
+        return {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "connect_args": {"timeout": SQLITE_BUSY_TIMEOUT, "check_same_thread": False},
+        }
+
+    options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+        "isolation_level": DB_ISOLATION_LEVEL,
+    }
+    if uri.startswith("mysql"):
+        connect_args = {"connect_timeout": 5}
+        if DB_STATEMENT_TIMEOUT_MS:
+            # MySQL 5.7+: aborts SELECTs running longer than the limit
+            connect_args["init_command"] = (
+                f"SET SESSION MAX_EXECUTION_TIME={DB_STATEMENT_TIMEOUT_MS}")
+        options["connect_args"] = connect_args
+    return options
+
+
+SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+
+
+# Read-only endpoints are routed here when a replica is configured
+# (see db_routing.py). DB_READ_URL takes any SQLAlchemy URL.
+READ_REPLICA_URI = os.getenv("DB_READ_URL") or (
+    _mysql_uri(DB_READ_HOST) if DB_READ_HOST and not IS_SQLITE else None)
 
-SQLALCHEMY_DATABASE_URI = (
-    f"mysql+pymysql://{DB_USER}:{DB_PASS}@{DB_HOST}/{DB_NAME}?charset=utf8mb4"
-)
\ No newline at end of file
+SQLALCHEMY_BINDS = {}
+if READ_REPLICA_URI:
+    SQLALCHEMY_BINDS["replica"] = {"url": READ_REPLICA_URI,
+                                   **engine_options(READ_REPLICA_URI)}
@@ -0,0 +1,249 @@
+"""
+encoders.py  —  Frame encoder backends for the live video endpoints
+───────────────────────────────────────────────────────────────────
+Snapshots / MJPEG:
+  • "jpeg" → libjpeg-turbo through PyTurboJPEG when the library is installed,
+             otherwise OpenCV's cv2.imencode
+  • "webp" → OpenCV WebP (smaller than JPEG at the same visual quality)
+
+Continuous viewers:
+  • H264Stream → fragmented MP4 (H.264) through PyAV, or a local ffmpeg
+                 binary when PyAV is not installed
+
+All optional: PyTurboJPEG, av and ffmpeg are not in requirements.txt.
+Encoding runs on a dedicated worker pool (ENCODE_WORKERS, default = CPU
+count) so concurrent viewers cannot oversubscribe the CPU, and the MJPEG
+generator can capture the next frame while the previous one is encoding.
+"""
+
+import io
+import os
+import queue
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+import metrics
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420
+except ImportError:                     # PyTurboJPEG not installed
+    TurboJPEG = None
+
+try:
+    import av
+except ImportError:                     # PyAV not installed
+    av = None
+
+
+ENCODE_WORKERS = int(os.getenv("ENCODE_WORKERS", os.cpu_count() or 2))
+
+_pool = ThreadPoolExecutor(max_workers=ENCODE_WORKERS,
+                           thread_name_prefix="encode")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Still-image encoders
+# ─────────────────────────────────────────────────────────────────────────────
+
+class OpenCVJpegEncoder:
+    name = "opencv-jpeg"
+    mimetype = "image/jpeg"
+
+    def encode(self, frame, quality):
+        _, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return buf.tobytes()
+
+
+class TurboJpegEncoder:
+    name = "turbojpeg"
+    mimetype = "image/jpeg"
+
+    def __init__(self):
+        if TurboJPEG is None:
+            raise RuntimeError("PyTurboJPEG is not installed")
+        self._tj = TurboJPEG()          # raises if libturbojpeg is missing
+
+    def encode(self, frame, quality):
+        return self._tj.encode(frame, quality=quality, pixel_format=TJPF_BGR,
+                               jpeg_subsample=TJSAMP_420)
+
+
+class WebPEncoder:
+    name = "webp"
+    mimetype = "image/webp"
+
+    def encode(self, frame, quality):
+        _, buf = cv2.imencode(".webp", frame, [cv2.IMWRITE_WEBP_QUALITY, quality])
+        return buf.tobytes()
+
+
+def _best_jpeg():
+    try:
+        return TurboJpegEncoder()
+    except Exception:
+        return OpenCVJpegEncoder()
+
+
+ENCODERS = {
+    "jpeg": _best_jpeg(),
+    "webp": WebPEncoder(),
+}
+
+
+def get_encoder(fmt):
+    """Encoder for `fmt` ("jpeg" / "webp"); unknown formats fall back to JPEG."""
+    return ENCODERS.get((fmt or "jpeg").lower(), ENCODERS["jpeg"])
+
+
+def encode_async(frame, fmt="jpeg", quality=75):
+    """Submit an encode to the worker pool. Returns a Future of (bytes, mimetype)."""
+    encoder = get_encoder(fmt)
+
+    def job():
+        with metrics.stage(f"encode_{encoder.name}"):
+            return encoder.encode(frame, quality), encoder.mimetype
+    return _pool.submit(job)
+
+
+def encode(frame, fmt="jpeg", quality=75):
+    """Encode on the worker pool and wait. Returns (bytes, mimetype)."""
+    return encode_async(frame, fmt, quality).result()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Fragmented-MP4 / H.264 stream
+# ─────────────────────────────────────────────────────────────────────────────
+
+FMP4_FLAGS = "frag_keyframe+empty_moov+default_base_moof"
+
+
+def h264_available():
+    return av is not None or shutil.which("ffmpeg") is not None
+
+
+class _Sink(io.RawIOBase):
+    """Write-only buffer that the muxer appends to and the stream drains."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class H264Stream:
+    """
+    Encode BGR frames of a fixed size into a fragmented-MP4 byte stream.
+    push(frame) returns whatever bytes the muxer produced so far (may be b"");
+    close() flushes the encoder and returns the tail.
+    """
+
+    mimetype = "video/mp4"
+
+    def __init__(self, width, height, fps=10):
+        # yuv420p needs even dimensions
+        self.width = width - width % 2
+        self.height = height - height % 2
+        self.fps = fps
+        if av is not None:
+            self._open_pyav()
+        elif shutil.which("ffmpeg"):
+            self._open_ffmpeg()
+        else:
+            raise RuntimeError("No H.264 encoder: install PyAV or ffmpeg")
+
+    def _fit(self, frame):
+        h, w = frame.shape[:2]
+        if (w, h) != (self.width, self.height):
+            frame = cv2.resize(frame, (self.width, self.height),
+                               interpolation=cv2.INTER_AREA)
+        return frame
+
+    # ── PyAV backend ─────────────────────────────────────────────────────────
+
+    def _open_pyav(self):
+        self.backend = "pyav"
+        self._sink = _Sink()
+        self._container = av.open(self._sink, mode="w", format="mp4",
+                                  options={"movflags": FMP4_FLAGS})
+        stream = self._container.add_stream("libx264", rate=self.fps)
+        stream.width = self.width
+        stream.height = self.height
+        stream.pix_fmt = "yuv420p"
+        stream.options = {"preset": "ultrafast", "tune": "zerolatency",
+                          "g": str(self.fps * 2)}
+        self._stream = stream
+
+    # ── ffmpeg subprocess backend ────────────────────────────────────────────
+
+    def _open_ffmpeg(self):
+        self.backend = "ffmpeg"
+        self._proc = subprocess.Popen(
+            ["ffmpeg", "-loglevel", "error",
+             "-f", "rawvideo", "-pix_fmt", "bgr24",
+             "-s", f"{self.width}x{self.height}", "-r", str(self.fps), "-i", "-",
+             "-c:v", "libx264", "-preset", "ultrafast", "-tune", "zerolatency",
+             "-g", str(self.fps * 2), "-pix_fmt", "yuv420p",
+             "-f", "mp4", "-movflags", FMP4_FLAGS, "-"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self._out = queue.Queue()
+        threading.Thread(target=self._read_ffmpeg, daemon=True).start()
+
+    def _read_ffmpeg(self):
+        while True:
+            chunk = self._proc.stdout.read1(64 * 1024)
+            if not chunk:
+                break
+            self._out.put(chunk)
+
+    def _drain_ffmpeg(self):
+        chunks = []
+        while True:
+            try:
+                chunks.append(self._out.get_nowait())
+            except queue.Empty:
+                return b"".join(chunks)
+
+    # ── public ───────────────────────────────────────────────────────────────
+
+    def push(self, frame):
+        frame = self._fit(frame)
+        with metrics.stage(f"encode_h264_{self.backend}"):
+            return self._push(frame)
+
+    def push_async(self, frame):
+        """push() on the worker pool. Returns a Future of the bytes; keep one in flight."""
+        return _pool.submit(self.push, frame)
+
+    def _push(self, frame):
+        if self.backend == "pyav":
+            vf = av.VideoFrame.from_ndarray(frame, format="bgr24")
+            for packet in self._stream.encode(vf):
+                self._container.mux(packet)
+            return self._sink.drain()
+        self._proc.stdin.write(frame.tobytes())
+        self._proc.stdin.flush()
+        return self._drain_ffmpeg()
+
+    def close(self):
+        if self.backend == "pyav":
+            for packet in self._stream.encode(None):
+                self._container.mux(packet)
+            self._container.close()
+            return self._sink.drain()
+        self._proc.stdin.close()
+        self._proc.wait(timeout=5)
+        return self._drain_ffmpeg()
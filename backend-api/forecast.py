@@ -0,0 +1,252 @@
+"""
+forecast.py  —  Demand forecast from reservation history, and slot steering
+───────────────────────────────────────────────────────────────────────────
+Model: a seasonal hour-of-week baseline. Every reservation covers the whole
+hours from floor(start) to ceil(end); concurrent reservations are counted
+per hour with a NumPy difference array, folded into per-week 168-hour
+rows, and averaged over the last FORECAST_HISTORY_WEEKS weeks with weight
+FORECAST_DECAY ** age, so recent weeks count more. Short stays (at most
+FORECAST_SHORT_STAY_HOURS) and long stays get separate curves.
+
+Every lot has its own DemandModel (Demand keeps them by lot id). Training
+is incremental: one background thread folds in the reservations it has not
+seen yet every FORECAST_REFRESH_SECONDS and publishes an immutable Forecast
+per lot; the booking path just reads that object. Ids are not committed in
+order, so each refresh re-reads the last FORECAST_ID_OVERLAP ids and skips
+the ones already counted. Cancelled reservations are never read, and every
+FORECAST_REBUILD_SECONDS the models are retrained from scratch, which drops
+reservations cancelled after they were counted.
+
+Steering (choose_slot): slots are ranked by depth, i.e. distance from the
+entrance. Short stays take the nearest free slot. Long stays skip the front
+slots the forecast says short stays will need during the booking window
+(at least FORECAST_FRONT_RESERVE), and fall back to the deepest free slot.
+"""
+
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from log_config import get_logger
+
+log = get_logger("smartpark.forecast")
+
+HOURS_PER_WEEK = 168
+HISTORY_WEEKS = int(os.getenv("FORECAST_HISTORY_WEEKS", 8))
+DECAY = float(os.getenv("FORECAST_DECAY", 0.8))
+SHORT_STAY = timedelta(hours=float(os.getenv("FORECAST_SHORT_STAY_HOURS", 2)))
+REFRESH_SECONDS = float(os.getenv("FORECAST_REFRESH_SECONDS", 300))
+REBUILD_SECONDS = float(os.getenv("FORECAST_REBUILD_SECONDS", 3600))
+ID_OVERLAP = int(os.getenv("FORECAST_ID_OVERLAP", 1000))      # ids re-read for late commits
+FRONT_RESERVE = int(os.getenv("FORECAST_FRONT_RESERVE", 2))   # min slots kept for short stays
+
+EPOCH = datetime(1970, 1, 5)            # a Monday: hour 0 of week 0
+SHORT, LONG = 0, 1
+
+
+def abs_hour(dt):
+    return int((dt - EPOCH) // timedelta(hours=1))
+
+
+def coverage(starts, ends):
+    """
+    Concurrent reservations per absolute hour.
+    Returns (first_hour, counts) where counts[i] covers hour first_hour + i.
+    """
+    if len(starts) == 0:
+        return 0, np.zeros(0)
+    h0 = np.floor(starts).astype(np.int64)
+    h1 = np.maximum(np.ceil(ends).astype(np.int64), h0 + 1)
+    base = int(h0.min())
+    diff = np.zeros(int(h1.max()) - base + 1)
+    np.add.at(diff, h0 - base, 1)
+    np.add.at(diff, h1 - base, -1)
+    return base, np.cumsum(diff)[:-1]
+
+
+class Forecast:
+    """Expected concurrent reservations per hour of the week (immutable)."""
+
+    def __init__(self, curves, reservations=0, trained_at=None):
+        self.curves = curves            # shape (2, 168): [SHORT, LONG]
+        self.reservations = reservations
+        self.trained_at = trained_at
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros((2, HOURS_PER_WEEK)))
+
+    def _hours(self, start, end):
+        first, last = abs_hour(start), max(abs_hour(end - timedelta(microseconds=1)), abs_hour(start))
+        return np.arange(first, min(last, first + HOURS_PER_WEEK - 1) + 1) % HOURS_PER_WEEK
+
+    def expected(self, start, end, kind=None):
+        """Peak expected concurrency over [start, end); kind SHORT / LONG / None (both)."""
+        curve = self.curves.sum(axis=0) if kind is None else self.curves[kind]
+        return float(curve[self._hours(start, end)].max())
+
+    def curve(self, start, hours):
+        """[(hour start, short, long)] for `hours` hours from `start`."""
+        first = start.replace(minute=0, second=0, microsecond=0)
+        idx = (abs_hour(first) + np.arange(hours)) % HOURS_PER_WEEK
+        return [(first + timedelta(hours=i), float(s), float(l))
+                for i, (s, l) in enumerate(zip(self.curves[SHORT][idx], self.curves[LONG][idx]))]
+
+
+EMPTY = Forecast.empty()
+
+
+class DemandModel:
+    """Weekly demand rows and the current Forecast for one lot."""
+
+    def __init__(self, weeks=HISTORY_WEEKS, decay=DECAY):
+        self.weeks = weeks
+        self.decay = decay
+        self._rows = {}                 # week number -> array (2, 168)
+        self._first_week = None
+        self._count = 0
+        self._lock = threading.Lock()
+        self.forecast = Forecast.empty()
+
+    def add(self, starts, ends):
+        """Fold reservations (datetime sequences) into the weekly rows."""
+        hour = timedelta(hours=1)
+        s = np.array([(t - EPOCH) / hour for t in starts], dtype=float)
+        e = np.array([(t - EPOCH) / hour for t in ends], dtype=float)
+        if s.size == 0:
+            return
+        short = (e - s) <= SHORT_STAY / hour
+        with self._lock:
+            for kind, mask in ((SHORT, short), (LONG, ~short)):
+                base, counts = coverage(s[mask], e[mask])
+                self._fold(kind, base, counts)
+            first = int(s.min()) // HOURS_PER_WEEK
+            self._first_week = first if self._first_week is None else min(self._first_week, first)
+            self._count += s.size
+
+    def _fold(self, kind, base, counts):
+        i = 0
+        while i < counts.size:
+            week, how = divmod(base + i, HOURS_PER_WEEK)
+            n = min(HOURS_PER_WEEK - how, counts.size - i)
+            row = self._rows.setdefault(week, np.zeros((2, HOURS_PER_WEEK)))
+            row[kind, how:how + n] += counts[i:i + n]
+            i += n
+
+    def build(self, now=None):
+        """Publish a new Forecast from the weekly rows seen so far."""
+        now = now or datetime.now()
+        current, now_how = divmod(abs_hour(now), HOURS_PER_WEEK)
+        with self._lock:
+            for week in [w for w in self._rows if w < current - self.weeks]:
+                del self._rows[week]
+            total = np.zeros((2, HOURS_PER_WEEK))
+            weight = np.zeros(HOURS_PER_WEEK)
+            first = self._first_week if self._first_week is not None else current
+            for week in range(max(first, current - self.weeks), current + 1):
+                # only hours that have already happened are observations
+                observed = np.arange(HOURS_PER_WEEK) < (now_how if week == current else HOURS_PER_WEEK)
+                w = (self.decay ** (current - week)) * observed
+                total += self._rows.get(week, np.zeros((2, HOURS_PER_WEEK))) * w
+                weight += w
+            curves = np.divide(total, weight, out=np.zeros_like(total), where=weight > 0)
+            self.forecast = Forecast(curves, self._count, now)
+        return self.forecast
+
+
+class Demand:
+    """Per-lot DemandModels, trained from the reservation table in the background."""
+
+    def __init__(self, weeks=HISTORY_WEEKS, decay=DECAY):
+        self.weeks = weeks
+        self.decay = decay
+        self._models = {}               # lot id -> DemandModel
+        self._last_id = 0
+        self._seen = set()              # counted ids above _last_id - ID_OVERLAP
+        self._rebuilt_at = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self.app = None
+
+    def bind(self, app, db, reservation_model):
+        self.app, self.db, self.Reservation = app, db, reservation_model
+
+    def forecast(self, lot_id):
+        model = self._models.get(lot_id)
+        return model.forecast if model is not None else EMPTY
+
+    def refresh(self, rebuild=None):
+        """
+        Fold in reservations not counted yet and rebuild every lot's forecast.
+        rebuild=True retrains from scratch (into new models, so forecasts stay
+        available meanwhile); by default that happens every REBUILD_SECONDS.
+        """
+        if rebuild is None:
+            rebuild = self._rebuilt_at is None or time.monotonic() - self._rebuilt_at >= REBUILD_SECONDS
+        models, last_id, seen = ({}, 0, set()) if rebuild else (self._models, self._last_id, self._seen)
+        R = self.Reservation
+        since = datetime.now() - timedelta(weeks=self.weeks + 1)
+        rows = (self.db.session.query(R.id, R.lot_id, R.start_time, R.end_time)
+                .filter(R.id > last_id - ID_OVERLAP, R.status != "cancelled",
+                        R.start_time >= since)
+                .order_by(R.id).all())
+        rows = [row for row in rows if row[0] not in seen]
+        by_lot = {}
+        for _, lot_id, start, end in rows:
+            starts, ends = by_lot.setdefault(lot_id, ([], []))
+            starts.append(start)
+            ends.append(end)
+        for lot_id, (starts, ends) in by_lot.items():
+            if lot_id not in models:
+                models[lot_id] = DemandModel(self.weeks, self.decay)
+            models[lot_id].add(starts, ends)
+        if rows:
+            last_id = max(last_id, rows[-1][0])
+            seen = {i for i in seen.union(row[0] for row in rows) if i > last_id - ID_OVERLAP}
+        now = datetime.now()
+        for model in list(models.values()):
+            model.build(now)
+        self._models, self._last_id, self._seen = models, last_id, seen
+        if rebuild:
+            self._rebuilt_at = time.monotonic()
+        return len(rows)
+
+    # ── background job ───────────────────────────────────────────────────────
+
+    def ensure_started(self):
+        # started lazily so each gunicorn worker trains after fork
+        if self._thread is not None or self.app is None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="forecast")
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    n = self.refresh()
+                log.debug("forecast refreshed", extra={"reservations": n, "lots": len(self._models)})
+            except Exception as e:
+                log.warning("forecast refresh failed", extra={"error": str(e)})
+            time.sleep(REFRESH_SECONDS)
+
+
+def choose_slot(candidates, depth, start, end, forecast):
+    """
+    Pick a slot for a booking from the free `candidates`; `depth(slot)`
+    ranks slots by distance from the entrance (0 = nearest).
+    """
+    if not candidates:
+        return None
+    ranked = sorted(candidates, key=depth)
+    if end - start <= SHORT_STAY:
+        return ranked[0]
+    keep_free = max(FRONT_RESERVE, math.ceil(forecast.expected(start, end, SHORT)))
+    behind = [s for s in ranked if depth(s) >= keep_free]
+    return behind[0] if behind else ranked[-1]
@@ -0,0 +1,234 @@
+"""
+frame_bus.py  —  Shared-memory frame ring from the vision process to Flask
+──────────────────────────────────────────────────────────────────────────
+Only one process can open the webcam. With FRAME_BUS=<name> set,
+vision_irregular.py owns the camera and publishes every frame into a
+multiprocessing.shared_memory segment of that name; /video-feed and
+/video-snapshot read from it instead of opening the camera themselves, so
+one capture and one detection pass serve both occupancy sync and driver
+guidance.
+
+Segment layout (little endian, created by the writer from the first
+frame's shape):
+
+  header   magic, version, slot count, height, width, channels,
+           latest seq and its capture time
+  meta[n]  per slot: seq, capture time, car boxes, white-boundary rect
+  data[n]  per slot: raw frame, then the vision overlay (grid + detections)
+
+Slots are a ring indexed by seq % n. The writer zeroes a slot's seq before
+overwriting it and stores the new seq last, so a reader takes the latest
+slot's arrays as views into shared memory (no copy) and checks
+SharedFrame.valid() once it is done with them: False means the writer
+lapped the ring meanwhile and the result must be dropped. With
+FRAME_BUS_SLOTS frames of slack that only happens to a reader stalled for
+several frame intervals.
+
+Readers treat a bus whose newest frame is older than FRAME_BUS_STALE
+seconds as down, and re-attach by name (the writer recreates the segment
+when it restarts or the frame size changes).
+"""
+
+import os
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+import metrics
+from serving import FRAME_BUS                                # "" = no bus, Flask opens the camera
+
+FRAME_BUS_SLOTS = int(os.getenv("FRAME_BUS_SLOTS", 8))
+FRAME_BUS_STALE = float(os.getenv("FRAME_BUS_STALE", 2.0))   # seconds
+
+MAGIC, VERSION = b"SPFB", 1
+MAX_CARS = 8
+POLL = 0.005                 # seconds between header polls while waiting for a frame
+
+HEADER = struct.Struct("<4sHHIIIQd")          # magic version slots h w channels latest ts
+LATEST = struct.Struct("<Qd")
+META = struct.Struct(f"<Qdi4i{4 * MAX_CARS}i")  # seq ts n_cars boundary cars
+HEADER_SIZE, META_SIZE = 64, 192
+LATEST_OFFSET = HEADER.size - LATEST.size
+
+TORN = metrics.REGISTRY.counter(
+    "smartpark_frame_bus_torn_total", "Frame bus reads overwritten by the writer mid-use")
+
+
+def _layout(slots, shape):
+    frame_bytes = int(np.prod(shape))
+    data = -(-(HEADER_SIZE + slots * META_SIZE) // 64) * 64
+    return frame_bytes, data, data + slots * 2 * frame_bytes
+
+
+def _frames(buf, slots, shape):
+    """[(image, overlay)] numpy views per slot."""
+    frame_bytes, data, _ = _layout(slots, shape)
+    views = []
+    for i in range(slots):
+        off = data + i * 2 * frame_bytes
+        views.append(tuple(np.ndarray(shape, np.uint8, buf, off + k * frame_bytes)
+                           for k in (0, 1)))
+    return views
+
+
+def _attach(name):
+    """Open an existing segment without handing it to this process's resource tracker."""
+    try:
+        return shared_memory.SharedMemory(name, track=False)       # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name)
+        # the tracker would unlink the writer's segment when this process exits
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class FrameWriter:
+    """Vision side: begin(raw frame) right after capture, commit(overlay, ...) after drawing."""
+
+    def __init__(self, name=FRAME_BUS, slots=FRAME_BUS_SLOTS):
+        self.name, self.slots = name, slots
+        self.shm = None
+        self.seq = 0
+        self._slot = None
+
+    def begin(self, frame):
+        """Copy the raw camera frame into the next ring slot."""
+        if self.shm is None or frame.shape != self.shape:
+            self._create(frame.shape)
+        self.seq += 1
+        i = self.seq % self.slots
+        META.pack_into(self.shm.buf, HEADER_SIZE + i * META_SIZE, 0, 0.0, 0, *[0] * (4 + 4 * MAX_CARS))
+        image, overlay = self._views[i]
+        np.copyto(image, frame)
+        self._slot = (i, time.time())
+
+    def commit(self, overlay, cars=(), boundary=None):
+        """Publish the slot begun last with its overlay and detections (x, y, w, h boxes)."""
+        if self._slot is None:
+            return
+        i, ts = self._slot
+        np.copyto(self._views[i][1], overlay)
+        cars = list(cars)[:MAX_CARS]
+        flat = [v for box in cars for v in box] + [0] * (4 * (MAX_CARS - len(cars)))
+        META.pack_into(self.shm.buf, HEADER_SIZE + i * META_SIZE,
+                       self.seq, ts, len(cars), *(boundary or (0, 0, 0, 0)), *flat)
+        LATEST.pack_into(self.shm.buf, LATEST_OFFSET, self.seq, ts)
+        self._slot = None
+
+    def close(self):
+        if self.shm is not None:
+            self._views = None
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def _create(self, shape):
+        self.close()
+        _, _, size = _layout(self.slots, shape)
+        try:
+            self.shm = shared_memory.SharedMemory(self.name, create=True, size=size)
+        except FileExistsError:          # left behind by a writer that crashed
+            stale = shared_memory.SharedMemory(self.name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(self.name, create=True, size=size)
+        h, w, c = shape
+        HEADER.pack_into(self.shm.buf, 0, MAGIC, VERSION, self.slots, h, w, c, 0, 0.0)
+        self.shape = shape
+        self._views = _frames(self.shm.buf, self.slots, shape)
+        self.seq = 0
+
+
+class SharedFrame:
+    """One published frame. image / overlay are views into shared memory."""
+
+    __slots__ = ("seq", "ts", "image", "overlay", "cars", "boundary", "_buf", "_meta")
+
+    def __init__(self, seq, ts, image, overlay, cars, boundary, buf, meta):
+        self.seq, self.ts, self.image, self.overlay = seq, ts, image, overlay
+        self.cars, self.boundary = cars, boundary
+        self._buf, self._meta = buf, meta
+
+    @property
+    def car(self):
+        """The largest car box, or None."""
+        return max(self.cars, key=lambda b: b[2] * b[3], default=None)
+
+    def valid(self):
+        """False once the writer has started overwriting this slot."""
+        if struct.unpack_from("<Q", self._buf, self._meta)[0] == self.seq:
+            return True
+        TORN.inc()
+        return False
+
+
+class FrameReader:
+    """Flask side: read() the newest frame; safe to share between threads."""
+
+    def __init__(self, name=FRAME_BUS, stale=FRAME_BUS_STALE):
+        self.name, self.stale = name, stale
+        self._bus = None                 # (shm, slots, views), replaced as a whole
+        self._next_attach = 0.0
+
+    def read(self, after=None, timeout=1.0):
+        """
+        The newest fresh frame whose seq is not `after` (waiting up to
+        `timeout` seconds for one), or None.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            frame = self._latest()
+            if frame is not None and frame.seq != after:
+                return frame
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(POLL)
+
+    def _latest(self):
+        bus = self._bus
+        if bus is None or not _live(bus, self.stale):
+            bus = self._reattach()
+        return _newest(bus) if bus else None
+
+    def _reattach(self):
+        """Switch to the segment now under our name if it is live; at most once a second."""
+        now = time.monotonic()
+        if now < self._next_attach:
+            return None
+        self._next_attach = now + 1.0
+        try:
+            shm = _attach(self.name)
+        except FileNotFoundError:
+            return None
+        magic, version, slots, h, w, c, _, _ = HEADER.unpack_from(shm.buf, 0)
+        if (magic, version) != (MAGIC, VERSION):
+            shm.close()
+            return None
+        bus = (shm, slots, _frames(shm.buf, slots, (h, w, c)))
+        if not _live(bus, self.stale):
+            bus = None                   # release the views before closing
+            shm.close()
+            return None
+        # the previous mapping stays open: frames handed out may still use it
+        self._bus = bus
+        return bus
+
+
+def _live(bus, stale):
+    seq, ts = LATEST.unpack_from(bus[0].buf, LATEST_OFFSET)
+    return seq > 0 and time.time() - ts <= stale
+
+
+def _newest(bus):
+    shm, slots, views = bus
+    buf = shm.buf
+    latest = LATEST.unpack_from(buf, LATEST_OFFSET)[0]
+    meta = HEADER_SIZE + (latest % slots) * META_SIZE
+    seq, ts, n, *rest = META.unpack_from(buf, meta)
+    if not latest or seq != latest:
+        return None                      # nothing published yet, or being overwritten
+    cars = [tuple(rest[4 + 4 * k: 8 + 4 * k]) for k in range(n)]
+    image, overlay = views[latest % slots]
+    return SharedFrame(seq, ts, image, overlay, cars, tuple(rest[:4]), buf, meta)
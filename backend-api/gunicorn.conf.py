@@ -0,0 +1,11 @@
+# gunicorn.conf.py  —  see serving.py for the api / stream profiles
+#
+#   gunicorn -c gunicorn.conf.py app:app                       # API (default)
+#   SERVING_ROLE=stream PORT=5001 gunicorn -c gunicorn.conf.py app:app
+
+from serving import SERVING_ROLE, gunicorn_settings
+
+globals().update(gunicorn_settings(SERVING_ROLE))
+
+accesslog = "-"
+proc_name = f"smartpark-{SERVING_ROLE}"
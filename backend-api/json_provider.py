@@ -0,0 +1,52 @@
+"""
+json_provider.py  —  orjson-backed Flask JSON provider
+──────────────────────────────────────────────────────
+install(app) swaps Flask's json module for orjson when it is installed
+(orjson is optional and not in requirements.txt). Output is compact and
+unsorted; types orjson does not know (and datetimes, to keep Flask's
+HTTP-date format) go through Flask's own default hook, so jsonify() output
+is unchanged apart from key order and whitespace.
+
+fmt_minute() is the "YYYY-MM-DD HH:MM" formatter for list endpoints; it is
+cached because the polling endpoints format the same rows over and over.
+"""
+
+from functools import lru_cache
+
+from flask.json.provider import DefaultJSONProvider, _default
+
+try:
+    import orjson
+except ImportError:                     # orjson not installed
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    options = 0 if orjson is None else (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:                      # indent, sort_keys … → stdlib
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=_default, option=self.options).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=_default, option=self.options)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def install(app):
+    """Use orjson for request / response JSON if available. Returns the provider."""
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
+    return app.json
+
+
+@lru_cache(maxsize=16384)
+def fmt_minute(dt):
+    return dt.strftime("%Y-%m-%d %H:%M")
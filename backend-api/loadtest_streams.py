@@ -0,0 +1,112 @@
+"""
+loadtest_streams.py  —  API latency while N video streams are open
+
+Start the server first, e.g.
+    gunicorn -c gunicorn.conf.py app:app
+then
+    python loadtest_streams.py --streams 0 2 4 8 --seconds 15
+
+For every stream count it opens that many /video-feed connections, hammers
+the short API endpoints from --clients threads and prints p50 / p99.  With
+the gthread profile API p99 should stay flat as streams are added; with the
+old default sync workers it climbs until requests time out once every
+worker is holding a stream.
+"""
+
+import argparse
+import statistics
+import threading
+import time
+
+import requests
+
+BASE_URL = "http://127.0.0.1:5000"
+API_PATHS = ["/slots/status", "/guidance/A5", "/notifications/test@example.com"]
+
+
+def hold_stream(stop, opened):
+    try:
+        with requests.get(f"{BASE_URL}/video-feed?slot=A1&w=320&fps=10",
+                          stream=True, timeout=(5, 30)) as r:
+            opened.append(r.status_code)
+            for _ in r.iter_content(chunk_size=16384):
+                if stop.is_set():
+                    break
+    except requests.RequestException as e:
+        opened.append(f"error: {e.__class__.__name__}")
+
+
+def hammer_api(stop, latencies, errors):
+    session = requests.Session()
+    i = 0
+    while not stop.is_set():
+        path = API_PATHS[i % len(API_PATHS)]
+        i += 1
+        t0 = time.perf_counter()
+        try:
+            r = session.get(f"{BASE_URL}{path}", timeout=10)
+            if r.status_code >= 500:
+                errors.append(r.status_code)
+        except requests.RequestException:
+            errors.append("timeout")
+            continue
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run_phase(n_streams, n_clients, seconds):
+    stop = threading.Event()
+    opened, latencies, errors = [], [], []
+
+    streams = [threading.Thread(target=hold_stream, args=(stop, opened), daemon=True)
+               for _ in range(n_streams)]
+    for t in streams:
+        t.start()
+    time.sleep(1.0 if n_streams else 0)      # let the streams settle
+
+    clients = [threading.Thread(target=hammer_api, args=(stop, latencies, errors), daemon=True)
+               for _ in range(n_clients)]
+    for t in clients:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in clients + streams:
+        t.join(timeout=5)
+
+    return {
+        "streams": n_streams,
+        "streams_ok": sum(1 for s in opened if s == 200),
+        "requests": len(latencies),
+        "rps": len(latencies) / seconds,
+        "p50": statistics.median(latencies) if latencies else float("nan"),
+        "p99": percentile(latencies, 99),
+        "errors": len(errors),
+    }
+
+
+def main():
+    global BASE_URL
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", default=BASE_URL)
+    ap.add_argument("--streams", type=int, nargs="+", default=[0, 2, 4, 8])
+    ap.add_argument("--clients", type=int, default=4)
+    ap.add_argument("--seconds", type=float, default=10)
+    args = ap.parse_args()
+    BASE_URL = args.url.rstrip("/")
+
+    print(f"{'streams':>8}{'open':>6}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for n in args.streams:
+        r = run_phase(n, args.clients, args.seconds)
+        print(f"{r['streams']:>8}{r['streams_ok']:>6}{r['rps']:>9.1f}"
+              f"{r['p50']:>9.1f}{r['p99']:>9.1f}{r['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# log_config.py
+"""
+Structured, non-blocking logging.
+
+Records are pushed onto a queue by the calling thread and written as one
+JSON object per line by a background QueueListener, so request handlers and
+the vision loop never block on stdout.
+
+    log = get_logger("smartpark.vision")
+    log.info("slot synced", extra={"slot": "A3", "status": "occupied"})
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+                  + f".{int(record.msecs):03d}",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for k, v in vars(record).items():
+            if k not in _STANDARD_ATTRS and not k.startswith("_"):
+                entry[k] = v
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def setup_logging(level=None):
+    """Route the "smartpark" logger tree through a queue to a JSON stdout writer."""
+    global _listener
+    if _listener is not None:
+        return
+
+    q = queue.SimpleQueue()
+    out = logging.StreamHandler(sys.stdout)
+    out.setFormatter(JsonFormatter())
+    _listener = logging.handlers.QueueListener(q, out, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger("smartpark")
+    root.setLevel(level or os.getenv("LOG_LEVEL", "INFO").upper())
+    root.addHandler(logging.handlers.QueueHandler(q))
+    root.propagate = False
+
+
+def get_logger(name):
+    setup_logging()
+    return logging.getLogger(name)
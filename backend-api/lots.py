@@ -0,0 +1,138 @@
+"""
+lots.py  —  Parking lots: request scoping, lookup cache, partition routing
+──────────────────────────────────────────────────────────────────────────
+Every slot, reservation and slot event belongs to one Lot. A request names
+its lot with a "lot" field in the JSON body, ?lot=<code>, or an X-Lot
+header (first one wins); requests that name none use DEFAULT_LOT, so
+single-lot clients keep working unchanged.
+
+Per-lot state is keyed by lot id and never shared between lots: slot rows
+and the indexes the allocator scans lead with lot_id, the demand forecast
+is trained per lot, and lot lookups are served from LotDirectory's cache.
+
+Partitioning — lots can be spread over several backend deployments, each
+with its own database (DATABASE_URL) holding the rows of its lots:
+
+  LOT_PARTITIONS   every partition as name=base_url, comma separated, e.g.
+                   "east=http://east:5000,west=http://west:5000"
+  LOT_PARTITION    the partition this process serves
+  LOT_PLACEMENT    optional pins, lot=partition, comma separated
+
+Unpinned lots are placed by rendezvous hashing of the lot code, so adding a
+partition only moves the lots it wins. A lot-scoped request for a lot owned
+by another partition gets a 307 to that partition (method and body kept),
+the same way /video-feed is sent to STREAM_BASE_URL. Without LOT_PARTITIONS
+this process owns every lot.
+"""
+
+import hashlib
+import os
+import threading
+from collections import namedtuple
+
+from sqlalchemy.exc import IntegrityError
+
+DEFAULT_LOT = os.getenv("DEFAULT_LOT", "main")
+DEFAULT_ROWS = int(os.getenv("LOT_DEFAULT_ROWS", 3))
+DEFAULT_COLS = int(os.getenv("LOT_DEFAULT_COLS", 4))
+
+
+def _pairs(value):
+    pairs = (item.partition("=") for item in value.split(",") if item.strip())
+    return {k.strip(): v.strip().rstrip("/") for k, _, v in pairs}
+
+
+LOT_PARTITIONS = _pairs(os.getenv("LOT_PARTITIONS", ""))
+LOT_PARTITION = os.getenv("LOT_PARTITION", "")
+LOT_PLACEMENT = {k.lower(): v for k, v in _pairs(os.getenv("LOT_PLACEMENT", "")).items()}
+
+LotInfo = namedtuple("LotInfo", "id code name rows cols")
+
+
+def normalize(code):
+    return str(code).strip().lower()
+
+
+def requested_lot(request):
+    """Lot code named by the request, else DEFAULT_LOT."""
+    body = request.get_json(silent=True) if request.is_json else None
+    code = body.get("lot") if isinstance(body, dict) else None
+    code = code or request.args.get("lot") or request.headers.get("X-Lot")
+    return normalize(code) if code else DEFAULT_LOT
+
+
+class LotRouter:
+    """Maps a lot code to the partition that owns it."""
+
+    def __init__(self, partitions=None, local=LOT_PARTITION, placement=None):
+        self.partitions = LOT_PARTITIONS if partitions is None else partitions
+        self.local = local
+        self.placement = LOT_PLACEMENT if placement is None else placement
+
+    def owner(self, code):
+        if not self.partitions:
+            return self.local
+        if code in self.placement:
+            return self.placement[code]
+        return max(self.partitions, key=lambda name: hashlib.blake2b(
+            f"{name}/{code}".encode(), digest_size=8).digest())
+
+    def redirect_base(self, code):
+        """Base URL of the partition owning `code`, or None when it is ours."""
+        owner = self.owner(code)
+        if owner == self.local:
+            return None
+        return self.partitions.get(owner)
+
+
+class LotDirectory:
+    """
+    code -> LotInfo cache in front of the lot table. Lots are created far
+    more rarely than they are looked up, so entries live until the table is
+    recreated (clear()) or a lot is added through add().
+    """
+
+    def __init__(self):
+        self._lots = {}
+        self._lock = threading.Lock()
+
+    def bind(self, db, lot_model):
+        self.db, self.Lot = db, lot_model
+
+    def get(self, code):
+        """LotInfo for `code`; the default lot is created on first use."""
+        lot = self._lots.get(code)
+        if lot is not None:
+            return lot
+        row = self.db.session.query(self.Lot).filter_by(code=code).first()
+        if row is None and code == DEFAULT_LOT:
+            row = self.add(DEFAULT_LOT, "Main lot")
+        if row is None:
+            return None
+        return self._cache(row)
+
+    def add(self, code, name, rows=DEFAULT_ROWS, cols=DEFAULT_COLS):
+        """Insert a lot (committed); returns the row, or the existing one on a race."""
+        session = self.db.session
+        row = self.Lot(code=code, name=name, rows=rows, cols=cols)
+        session.add(row)
+        try:
+            session.commit()
+        except IntegrityError:
+            session.rollback()
+            row = session.query(self.Lot).filter_by(code=code).one()
+        self._cache(row)
+        return row
+
+    def all(self):
+        return [self._cache(row) for row in self.db.session.query(self.Lot).order_by(self.Lot.id)]
+
+    def clear(self):
+        with self._lock:
+            self._lots.clear()
+
+    def _cache(self, row):
+        lot = LotInfo(row.id, row.code, row.name, row.rows, row.cols)
+        with self._lock:
+            self._lots[lot.code] = lot
+        return lot
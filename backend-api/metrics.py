@@ -0,0 +1,380 @@
+"""
+metrics.py  —  In-process metrics, request instrumentation and profiler
+───────────────────────────────────────────────────────────────────────
+  • Counter / Gauge / Histogram with labels, rendered in Prometheus text
+    format by render() (served at /metrics by app.py, and by serve() for
+    the standalone vision process)
+  • instrument_app(): per-endpoint latency histograms plus SQL statement
+    count / time per request through SQLAlchemy cursor events
+  • stage(): context manager timing pipeline stages (camera read, overlay,
+    encode, detection …) into smartpark_stage_seconds
+  • SamplingProfiler: samples every thread's stack and writes collapsed
+    stacks ("a;b;c 42"), ready for flamegraph.pl / speedscope
+
+Metrics are per process; with several gunicorn workers each worker reports
+its own numbers.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+
+def _fmt_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+def _escape(v):
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_num(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, help_, labels=()):
+        self.name = name
+        self.help = help_
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(n, "") for n in self.labels)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield from self._samples()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_, labels=()):
+        super().__init__(name, help_, labels)
+        self._values = defaultdict(float)
+
+    def inc(self, amount=1, **labels):
+        with self._lock:
+            self._values[self._key(labels)] += amount
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, v in items:
+            yield f"{self.name}{_fmt_labels(self.labels, key)} {_fmt_num(v)}"
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help_, labels=()):
+        super().__init__(name, help_, labels)
+        self._values = {}
+        self._functions = []
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        with self._lock:
+            key = self._key(labels)
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn):
+        """fn() -> iterable of (labels dict, value); evaluated at scrape time."""
+        self._functions.append(fn)
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for fn in self._functions:
+            try:
+                items += [(self._key(lbl), v) for lbl, v in fn()]
+            except Exception:
+                pass
+        for key, v in items:
+            yield f"{self.name}{_fmt_labels(self.labels, key)} {_fmt_num(v)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_, labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._counts = {}
+        self._sums = defaultdict(float)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * len(self.buckets)
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    counts[i] += 1
+                    break
+            self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def _samples(self):
+        with self._lock:
+            items = [(k, list(c), self._sums[k]) for k, c in self._counts.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for b, c in zip(self.buckets, counts):
+                cumulative += c
+                le = (("le", _fmt_num(b if b == float("inf") else float(b))),)
+                yield f"{self.name}_bucket{_fmt_labels(self.labels, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_fmt_labels(self.labels, key)} {_fmt_num(total)}"
+            yield f"{self.name}_count{_fmt_labels(self.labels, key)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_, **kw):
+        with self._lock:
+            m = self._metrics.get(name)
+            if m is None:
+                m = self._metrics[name] = cls(name, help_, **kw)
+            return m
+
+    def counter(self, name, help_, labels=()):
+        return self._get(Counter, name, help_, labels=labels)
+
+    def gauge(self, name, help_, labels=()):
+        return self._get(Gauge, name, help_, labels=labels)
+
+    def histogram(self, name, help_, labels=(), buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help_, labels=labels, buckets=buckets)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for m in metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+render = REGISTRY.render
+
+HTTP_SECONDS = REGISTRY.histogram(
+    "smartpark_http_request_duration_seconds", "Request latency by endpoint",
+    labels=("method", "endpoint", "status"))
+SQL_QUERIES = REGISTRY.histogram(
+    "smartpark_sql_queries_per_request", "SQL statements issued per request",
+    labels=("endpoint",), buckets=COUNT_BUCKETS)
+SQL_SECONDS = REGISTRY.histogram(
+    "smartpark_sql_seconds_per_request", "Time spent in SQL per request",
+    labels=("endpoint",))
+STAGE_SECONDS = REGISTRY.histogram(
+    "smartpark_stage_seconds", "Frame pipeline stage timings",
+    labels=("stage",))
+STAGE_FPS = REGISTRY.gauge(
+    "smartpark_stage_fps", "Per-stage throughput of the vision loop",
+    labels=("stage",))
+
+
+def stage(name):
+    """with stage("encode"): ...  — record a pipeline stage timing."""
+    return STAGE_SECONDS.time(stage=name)
+
+
+class StageReport:
+    """
+    Per-stage timings for a frame loop. Every `period` seconds it publishes
+    each stage's fps to smartpark_stage_fps and logs one structured line.
+    """
+
+    def __init__(self, log, period=5.0):
+        self.log = log
+        self.period = period
+        self._count = defaultdict(int)
+        self._busy = defaultdict(float)
+        self._since = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            dt = time.perf_counter() - t0
+            STAGE_SECONDS.observe(dt, stage=name)
+            self._count[name] += 1
+            self._busy[name] += dt
+
+    def tick(self):
+        now = time.perf_counter()
+        elapsed = now - self._since
+        if elapsed < self.period:
+            return
+        stages = {}
+        for name, n in self._count.items():
+            fps = n / elapsed
+            STAGE_FPS.set(round(fps, 2), stage=name)
+            stages[name] = {"fps": round(fps, 1),
+                            "avg_ms": round(self._busy[name] / n * 1000, 2)}
+        self.log.info("stage rates", extra={"window_s": round(elapsed, 1), "stages": stages})
+        self._count.clear()
+        self._busy.clear()
+        self._since = now
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Flask / SQLAlchemy instrumentation
+# ─────────────────────────────────────────────────────────────────────────────
+
+def instrument_app(app):
+    """Latency per endpoint and SQL count / time per request."""
+    from flask import g, has_request_context, request
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _sql_start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_t0", []).append(time.perf_counter())
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _sql_end(conn, cursor, statement, parameters, context, executemany):
+        t0 = conn.info["_t0"].pop()
+        if has_request_context() and "sql_count" in g:
+            g.sql_count += 1
+            g.sql_time += time.perf_counter() - t0
+
+    @app.before_request
+    def _start_timer():
+        g.t_start = time.perf_counter()
+        g.sql_count = 0
+        g.sql_time = 0.0
+
+    @app.after_request
+    def _record(response):
+        if "t_start" not in g:
+            return response
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        # streaming responses are timed until the headers are ready
+        HTTP_SECONDS.observe(time.perf_counter() - g.t_start, method=request.method,
+                             endpoint=endpoint, status=response.status_code)
+        SQL_QUERIES.observe(g.sql_count, endpoint=endpoint)
+        SQL_SECONDS.observe(g.sql_time, endpoint=endpoint)
+        return response
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Standalone exporter (vision process)
+# ─────────────────────────────────────────────────────────────────────────────
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port, host="0.0.0.0"):
+    """Serve /metrics from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True,
+                     name="metrics-http").start()
+    return server
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Sampling profiler
+# ─────────────────────────────────────────────────────────────────────────────
+
+class SamplingProfiler:
+    """Samples all thread stacks every `interval` seconds into collapsed stacks."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._stacks = defaultdict(int)
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._stacks.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="profiler")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.collapsed()
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for t in threading.enumerate():
+                names[t.ident] = t.name
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                parts = []
+                while frame is not None:
+                    code = frame.f_code
+                    parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}"
+                                 f":{code.co_firstlineno})")
+                    frame = frame.f_back
+                parts.append(names.get(tid, str(tid)))
+                self._stacks[";".join(reversed(parts))] += 1
+
+    def collapsed(self):
+        return "".join(f"{stack} {n}\n" for stack, n in
+                       sorted(self._stacks.items(), key=lambda kv: -kv[1]))
@@ -0,0 +1,68 @@
+# migrations/env.py
+import os
+import sys
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_config import SQLALCHEMY_DATABASE_URI  # noqa: E402
+
+config = context.config
+if config.config_file_name and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name)
+
+
+def _target_metadata():
+    # Only needed for --autogenerate; app.upgrade_database() passes it in so
+    # the app is not imported twice.
+    if "target_metadata" in config.attributes:
+        return config.attributes["target_metadata"]
+    if context.is_offline_mode() or not getattr(config.cmd_opts, "autogenerate", False):
+        return None
+    from app import db
+    return db.metadata
+
+
+def _url():
+    url = config.get_main_option("sqlalchemy.url") or SQLALCHEMY_DATABASE_URI
+    # Flask-SQLAlchemy resolves relative SQLite paths against instance/
+    prefix = "sqlite:///"
+    if url.startswith(prefix) and url != prefix + ":memory:" and not os.path.isabs(url[len(prefix):]):
+        here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        url = prefix + os.path.join(here, "instance", url[len(prefix):])
+    return url
+
+
+def run_migrations_offline():
+    context.configure(url=_url(), target_metadata=_target_metadata(),
+                      literal_binds=True, render_as_batch=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _run(connection)
+        return
+    engine = create_engine(_url())
+    with engine.connect() as connection:
+        _run(connection)
+    engine.dispose()
+
+
+def _run(connection):
+    # render_as_batch: SQLite needs table rebuilds for constraint changes
+    context.configure(connection=connection, target_metadata=_target_metadata(),
+                      render_as_batch=True, compare_type=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,84 @@
+"""initial schema (as previously created by db.create_all())
+
+Tables that already exist are left alone, so databases created by the old
+create_all() path can simply be upgraded.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _missing(name):
+    return not sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade():
+    if _missing("user"):
+        op.create_table(
+            "user",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("name", sa.String(120), nullable=False),
+            sa.Column("email", sa.String(180), nullable=False, unique=True),
+            sa.Column("password_hash", sa.String(255), nullable=False),
+        )
+    if _missing("vehicle"):
+        op.create_table(
+            "vehicle",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("plate_number", sa.String(60), nullable=False),
+            sa.Column("vehicle_type", sa.String(60)),
+            sa.Column("length", sa.Float),
+            sa.Column("width", sa.Float),
+            sa.Column("height", sa.Float),
+            sa.Column("door_type", sa.String(60)),
+            sa.Column("user_id", sa.Integer, sa.ForeignKey("user.id"), nullable=False),
+        )
+    if _missing("parking_slot"):
+        op.create_table(
+            "parking_slot",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("slot_code", sa.String(20), nullable=False, unique=True),
+            sa.Column("status", sa.String(20)),
+        )
+    if _missing("reservation"):
+        op.create_table(
+            "reservation",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("user_id", sa.Integer, sa.ForeignKey("user.id"), nullable=False),
+            sa.Column("vehicle_id", sa.Integer, sa.ForeignKey("vehicle.id"), nullable=False),
+            sa.Column("slot_id", sa.Integer, sa.ForeignKey("parking_slot.id"), nullable=False),
+            sa.Column("start_time", sa.DateTime, nullable=False),
+            sa.Column("end_time", sa.DateTime, nullable=False),
+            sa.Column("status", sa.String(20)),
+        )
+    if _missing("notification"):
+        op.create_table(
+            "notification",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("user_id", sa.Integer, sa.ForeignKey("user.id"), nullable=False),
+            sa.Column("title", sa.String(120), nullable=False),
+            sa.Column("message", sa.Text, nullable=False),
+            sa.Column("created_at", sa.DateTime),
+        )
+    if _missing("feedback"):
+        op.create_table(
+            "feedback",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("user_id", sa.Integer, sa.ForeignKey("user.id"), nullable=False),
+            sa.Column("message", sa.Text, nullable=False),
+            sa.Column("rating", sa.Integer, nullable=False),
+            sa.Column("created_at", sa.DateTime),
+        )
+
+
+def downgrade():
+    for name in ("feedback", "notification", "reservation", "parking_slot", "vehicle", "user"):
+        op.drop_table(name)
@@ -0,0 +1,98 @@
+"""composite indexes for the hot queries, unique vehicle plates, FK cascades
+
+  reservation (status, end_time)               expire_reservations()
+  reservation (slot_id, status)                update_slot() reallocation
+  reservation (user_id, status, start_time)    /reservation/list
+  notification (user_id, created_at)           /notifications
+  parking_slot (status)                        allocation / status polls
+  vehicle UNIQUE (user_id, plate_number)       /vehicle/details upsert
+
+Duplicate (user_id, plate_number) vehicles are merged into the oldest row
+(reservations are re-pointed) before the unique constraint is added.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# Gives reflected SQLite FKs (which are unnamed) a name batch mode can drop
+NAMING = {"fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"}
+
+# table -> [(column, referred table, ON DELETE)]
+FOREIGN_KEYS = {
+    "vehicle":      [("user_id", "user", "CASCADE")],
+    "reservation":  [("user_id", "user", "CASCADE"),
+                     ("vehicle_id", "vehicle", "CASCADE"),
+                     ("slot_id", "parking_slot", "RESTRICT")],
+    "notification": [("user_id", "user", "CASCADE")],
+    "feedback":     [("user_id", "user", "CASCADE")],
+}
+
+
+def _fk_names(table):
+    """{column: existing FK name or the NAMING-convention name}"""
+    names = {}
+    for fk in sa.inspect(op.get_bind()).get_foreign_keys(table):
+        col = fk["constrained_columns"][0]
+        names[col] = fk.get("name") or f"fk_{table}_{col}_{fk['referred_table']}"
+    return names
+
+
+def _rebuild_fks(with_ondelete):
+    for table, fks in FOREIGN_KEYS.items():
+        existing = _fk_names(table)
+        with op.batch_alter_table(table, naming_convention=NAMING) as batch:
+            for col, ref, ondelete in fks:
+                if col in existing:
+                    batch.drop_constraint(existing[col], type_="foreignkey")
+                batch.create_foreign_key(f"fk_{table}_{col}_{ref}", ref, [col], ["id"],
+                                         ondelete=ondelete if with_ondelete else None)
+
+
+def upgrade():
+    # ── merge duplicate vehicles ─────────────────────────────────────────────
+    op.execute("""
+        UPDATE reservation SET vehicle_id = (
+            SELECT MIN(v2.id) FROM vehicle v1
+            JOIN vehicle v2 ON v2.user_id = v1.user_id
+                           AND v2.plate_number = v1.plate_number
+            WHERE v1.id = reservation.vehicle_id)
+        WHERE vehicle_id IN (SELECT id FROM vehicle)
+    """)
+    op.execute("""
+        DELETE FROM vehicle WHERE id NOT IN (
+            SELECT keep_id FROM (
+                SELECT MIN(id) AS keep_id FROM vehicle
+                GROUP BY user_id, plate_number) AS keep)
+    """)
+
+    # ── indexes / unique constraint ──────────────────────────────────────────
+    op.create_index("ix_reservation_status_end", "reservation", ["status", "end_time"])
+    op.create_index("ix_reservation_slot_status", "reservation", ["slot_id", "status"])
+    op.create_index("ix_reservation_user_status_start", "reservation",
+                    ["user_id", "status", "start_time"])
+    op.create_index("ix_notification_user_created", "notification", ["user_id", "created_at"])
+    op.create_index("ix_parking_slot_status", "parking_slot", ["status"])
+    with op.batch_alter_table("vehicle") as batch:
+        batch.create_unique_constraint("uq_vehicle_user_plate", ["user_id", "plate_number"])
+
+    # ── foreign keys with cascades ───────────────────────────────────────────
+    _rebuild_fks(with_ondelete=True)
+
+
+def downgrade():
+    _rebuild_fks(with_ondelete=False)
+    with op.batch_alter_table("vehicle") as batch:
+        batch.drop_constraint("uq_vehicle_user_plate", type_="unique")
+    op.drop_index("ix_parking_slot_status", "parking_slot")
+    op.drop_index("ix_notification_user_created", "notification")
+    op.drop_index("ix_reservation_user_status_start", "reservation")
+    op.drop_index("ix_reservation_slot_status", "reservation")
+    op.drop_index("ix_reservation_status_end", "reservation")
@@ -0,0 +1,32 @@
+"""idempotency_key table for /reservation/create and /reservation/cancel
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "idempotency_key",
+        sa.Column("key", sa.String(64), nullable=False),
+        sa.Column("endpoint", sa.String(60), nullable=False),
+        sa.Column("request_hash", sa.String(64), nullable=False),
+        sa.Column("status_code", sa.Integer, nullable=True),
+        sa.Column("response", sa.Text, nullable=True),
+        sa.Column("created_at", sa.DateTime, nullable=True),
+        sa.PrimaryKeyConstraint("key", "endpoint"),
+    )
+    op.create_index("ix_idempotency_key_created_at", "idempotency_key", ["created_at"])
+
+
+def downgrade():
+    op.drop_index("ix_idempotency_key_created_at", table_name="idempotency_key")
+    op.drop_table("idempotency_key")
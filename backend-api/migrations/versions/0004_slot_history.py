@@ -0,0 +1,54 @@
+"""slot history: parking_slot.status_since, slot_event log, slot_rollup buckets
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("parking_slot", sa.Column("status_since", sa.DateTime, nullable=True))
+
+    op.create_table(
+        "slot_event",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("slot_code", sa.String(20), nullable=False),
+        sa.Column("old_status", sa.String(20), nullable=True),
+        sa.Column("new_status", sa.String(20), nullable=False),
+        sa.Column("status_since", sa.DateTime, nullable=True),
+        sa.Column("source", sa.String(60), nullable=True),
+        sa.Column("created_at", sa.DateTime, nullable=False),
+    )
+    op.create_index("ix_slot_event_created_at", "slot_event", ["created_at"])
+    op.create_index("ix_slot_event_slot_created", "slot_event", ["slot_code", "created_at"])
+
+    op.create_table(
+        "slot_rollup",
+        sa.Column("granularity", sa.String(6), nullable=False),
+        sa.Column("bucket_start", sa.DateTime, nullable=False),
+        sa.Column("slot_code", sa.String(20), nullable=False),
+        sa.Column("occupied_s", sa.Float, nullable=False),
+        sa.Column("reserved_s", sa.Float, nullable=False),
+        sa.Column("blocked_s", sa.Float, nullable=False),
+        sa.Column("arrivals", sa.Integer, nullable=False),
+        sa.Column("departures", sa.Integer, nullable=False),
+        sa.Column("dwell_s", sa.Float, nullable=False),
+        sa.Column("block_incidents", sa.Integer, nullable=False),
+        sa.PrimaryKeyConstraint("granularity", "bucket_start", "slot_code"),
+    )
+
+
+def downgrade():
+    op.drop_table("slot_rollup")
+    op.drop_index("ix_slot_event_slot_created", table_name="slot_event")
+    op.drop_index("ix_slot_event_created_at", table_name="slot_event")
+    op.drop_table("slot_event")
+    with op.batch_alter_table("parking_slot") as batch:
+        batch.drop_column("status_since")
@@ -0,0 +1,150 @@
+"""lots: lot table; lot_id on parking_slot, reservation, slot_event, slot_rollup
+
+Existing rows all move into the default lot (lots.DEFAULT_LOT, id 1).
+
+  parking_slot UNIQUE (lot_id, slot_code)       replaces UNIQUE (slot_code)
+  parking_slot (lot_id, status)                 replaces (status)
+  reservation (lot_id, status, end_time)        replaces (status, end_time)
+  slot_event (lot_id, slot_code, created_at)    replaces (slot_code, created_at)
+  slot_rollup PK gains lot_id                   (table is copied)
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+from lots import DEFAULT_COLS, DEFAULT_LOT, DEFAULT_ROWS
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+# Gives reflected SQLite constraints (which are unnamed) a name batch mode can drop
+NAMING = {"uq": "uq_%(table_name)s_%(column_0_name)s"}
+
+ROLLUP_COLUMNS = ("occupied_s", "reserved_s", "blocked_s",
+                  "arrivals", "departures", "dwell_s", "block_incidents")
+
+
+def _unique_name(table, columns):
+    for uq in sa.inspect(op.get_bind()).get_unique_constraints(table):
+        if uq["column_names"] == columns:
+            return uq.get("name") or f"uq_{table}_{columns[0]}"
+    return None
+
+
+def _rollup_table(name, with_lot):
+    lot = [sa.Column("lot_id", sa.Integer, nullable=False)] if with_lot else []
+    return op.create_table(
+        name,
+        sa.Column("granularity", sa.String(6), nullable=False),
+        sa.Column("bucket_start", sa.DateTime, nullable=False),
+        *lot,
+        sa.Column("slot_code", sa.String(20), nullable=False),
+        sa.Column("occupied_s", sa.Float, nullable=False),
+        sa.Column("reserved_s", sa.Float, nullable=False),
+        sa.Column("blocked_s", sa.Float, nullable=False),
+        sa.Column("arrivals", sa.Integer, nullable=False),
+        sa.Column("departures", sa.Integer, nullable=False),
+        sa.Column("dwell_s", sa.Float, nullable=False),
+        sa.Column("block_incidents", sa.Integer, nullable=False),
+        sa.PrimaryKeyConstraint("granularity", "bucket_start",
+                                *(["lot_id"] if with_lot else []), "slot_code"),
+    )
+
+
+def _copy_rollups(with_lot):
+    keys = "granularity, bucket_start, slot_code, " + ", ".join(ROLLUP_COLUMNS)
+    _rollup_table("slot_rollup_new", with_lot)
+    if with_lot:
+        op.execute(f"INSERT INTO slot_rollup_new (lot_id, {keys}) SELECT 1, {keys} FROM slot_rollup")
+    else:
+        sums = ", ".join(f"SUM({c})" for c in ROLLUP_COLUMNS)
+        op.execute(f"INSERT INTO slot_rollup_new ({keys}) "
+                   f"SELECT granularity, bucket_start, slot_code, {sums} FROM slot_rollup "
+                   f"GROUP BY granularity, bucket_start, slot_code")
+    op.drop_table("slot_rollup")
+    op.rename_table("slot_rollup_new", "slot_rollup")
+
+
+def upgrade():
+    lot = op.create_table(
+        "lot",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("code", sa.String(40), nullable=False, unique=True),
+        sa.Column("name", sa.String(120), nullable=False),
+        sa.Column("rows", sa.Integer, nullable=False),
+        sa.Column("cols", sa.Integer, nullable=False),
+        sa.Column("created_at", sa.DateTime, nullable=True),
+    )
+    op.bulk_insert(lot, [{"id": 1, "code": DEFAULT_LOT, "name": "Main lot",
+                          "rows": DEFAULT_ROWS, "cols": DEFAULT_COLS,
+                          "created_at": datetime.now()}])
+
+    # ── parking_slot ─────────────────────────────────────────────────────────
+    op.add_column("parking_slot", sa.Column("lot_id", sa.Integer, nullable=True))
+    op.execute("UPDATE parking_slot SET lot_id = 1")
+    old_unique = _unique_name("parking_slot", ["slot_code"])
+    op.drop_index("ix_parking_slot_status", table_name="parking_slot")
+    with op.batch_alter_table("parking_slot", naming_convention=NAMING) as batch:
+        batch.alter_column("lot_id", existing_type=sa.Integer, nullable=False)
+        if old_unique:
+            batch.drop_constraint(old_unique, type_="unique")
+        batch.create_unique_constraint("uq_parking_slot_lot_code", ["lot_id", "slot_code"])
+        batch.create_foreign_key("fk_parking_slot_lot_id_lot", "lot", ["lot_id"], ["id"],
+                                 ondelete="RESTRICT")
+    op.create_index("ix_parking_slot_lot_status", "parking_slot", ["lot_id", "status"])
+
+    # ── reservation ──────────────────────────────────────────────────────────
+    op.add_column("reservation", sa.Column("lot_id", sa.Integer, nullable=True))
+    op.execute("UPDATE reservation SET lot_id = 1")
+    op.drop_index("ix_reservation_status_end", table_name="reservation")
+    with op.batch_alter_table("reservation") as batch:
+        batch.alter_column("lot_id", existing_type=sa.Integer, nullable=False)
+        batch.create_foreign_key("fk_reservation_lot_id_lot", "lot", ["lot_id"], ["id"],
+                                 ondelete="RESTRICT")
+    op.create_index("ix_reservation_lot_status_end", "reservation",
+                    ["lot_id", "status", "end_time"])
+
+    # ── slot history ─────────────────────────────────────────────────────────
+    op.add_column("slot_event", sa.Column("lot_id", sa.Integer, nullable=True))
+    op.execute("UPDATE slot_event SET lot_id = 1")
+    op.drop_index("ix_slot_event_slot_created", table_name="slot_event")
+    with op.batch_alter_table("slot_event") as batch:
+        batch.alter_column("lot_id", existing_type=sa.Integer, nullable=False)
+    op.create_index("ix_slot_event_lot_slot_created", "slot_event",
+                    ["lot_id", "slot_code", "created_at"])
+
+    _copy_rollups(with_lot=True)
+
+
+def downgrade():
+    # lots other than the default one are merged into a single namespace;
+    # clashing slot codes make the unique constraint below fail
+    _copy_rollups(with_lot=False)
+
+    op.drop_index("ix_slot_event_lot_slot_created", table_name="slot_event")
+    with op.batch_alter_table("slot_event") as batch:
+        batch.drop_column("lot_id")
+    op.create_index("ix_slot_event_slot_created", "slot_event", ["slot_code", "created_at"])
+
+    op.drop_index("ix_reservation_lot_status_end", table_name="reservation")
+    with op.batch_alter_table("reservation") as batch:
+        batch.drop_constraint("fk_reservation_lot_id_lot", type_="foreignkey")
+        batch.drop_column("lot_id")
+    op.create_index("ix_reservation_status_end", "reservation", ["status", "end_time"])
+
+    op.drop_index("ix_parking_slot_lot_status", table_name="parking_slot")
+    with op.batch_alter_table("parking_slot") as batch:
+        batch.drop_constraint("fk_parking_slot_lot_id_lot", type_="foreignkey")
+        batch.drop_constraint("uq_parking_slot_lot_code", type_="unique")
+        batch.drop_column("lot_id")
+        batch.create_unique_constraint("uq_parking_slot_slot_code", ["slot_code"])
+    op.create_index("ix_parking_slot_status", "parking_slot", ["status"])
+
+    op.drop_table("lot")
@@ -0,0 +1,27 @@
+"""row versions: parking_slot.version, reservation.version (optimistic concurrency)
+
+Both are the SQLAlchemy version_id_col of their model: every ORM UPDATE
+matches on (id, version) and bumps it. Existing rows start at 1.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ("parking_slot", "reservation"):
+        op.add_column(table, sa.Column("version", sa.Integer, nullable=False, server_default="1"))
+
+
+def downgrade():
+    for table in ("reservation", "parking_slot"):
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column("version")
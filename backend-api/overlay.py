@@ -0,0 +1,201 @@
+"""
+overlay.py  —  Cached overlay layers for the grid renderers
+───────────────────────────────────────────────────────────
+The grid, slot labels and hatch patterns only change when the layout (frame
+size / white boundary) changes, and the per-cell artwork only changes when a
+cell changes state.  Instead of re-drawing every line and label with
+cv2.line / cv2.putText on each frame we:
+
+  • render every cell once per layout for each possible state ("stamps")
+  • assemble the current cell states from those stamps into one composite
+    layer, only when a state actually changes; the last few composites are
+    kept, so viewers that want different states do not rebuild each other's
+  • blend the composite onto each frame with a single fixed-point blend
+    into preallocated buffers (no per-frame allocations)
+
+Used by both vision_irregular.draw_grid and app._draw_overlay.
+"""
+
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+ALPHA_ONE = 256     # fixed-point blend weight, 256 == fully opaque
+CELL_PAD  = 3       # px copied around each cell (borders drawn with thickness ≤ 2)
+
+
+class OverlayLayer:
+    """BGR artwork plus a per-pixel alpha mask, blended onto frames in place."""
+
+    def __init__(self, shape):
+        h, w = shape[:2]
+        self.shape = (h, w)
+        self.colour = np.zeros((h, w, 3), dtype=np.uint8)
+        self.alpha = np.zeros((h, w), dtype=np.uint8)       # 255 == opaque
+        self._weight = np.zeros((h, w, 1), dtype=np.uint16)  # alpha on 0..256
+        self._premul = np.zeros((h, w, 3), dtype=np.uint16)
+        self._inv = np.zeros((h, w, 1), dtype=np.uint16)
+        self._scratch = np.zeros((h, w, 3), dtype=np.uint16)
+        self._roi = None
+
+    # ── drawing (same arguments as the cv2 primitives + opacity) ─────────────
+
+    def rectangle(self, p1, p2, colour, thickness=1, opacity=1.0):
+        cv2.rectangle(self.colour, p1, p2, colour, thickness)
+        cv2.rectangle(self.alpha, p1, p2, _alpha(opacity), thickness)
+
+    def line(self, p1, p2, colour, thickness=1, opacity=1.0):
+        cv2.line(self.colour, p1, p2, colour, thickness)
+        cv2.line(self.alpha, p1, p2, _alpha(opacity), thickness)
+
+    def text(self, text, org, scale, colour, thickness=1, opacity=1.0):
+        # Text may be anti-aliased: render its coverage separately so edge
+        # pixels keep the full text colour and only the alpha is partial.
+        (tw, th), base = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX,
+                                         scale, thickness)
+        h, w = self.shape
+        x, y = org
+        y1 = min(max(y - th - thickness - 2, 0), h)
+        x1 = min(max(x - thickness - 2, 0), w)
+        ys = slice(y1, min(max(y + base + thickness + 2, 0), h))
+        xs = slice(x1, min(max(x + tw + thickness + 2, 0), w))
+        cov = np.zeros((ys.stop - ys.start, xs.stop - xs.start), dtype=np.uint8)
+        if cov.size == 0:
+            return
+        cv2.putText(cov, text, (x - x1, y - y1), cv2.FONT_HERSHEY_SIMPLEX,
+                    scale, _alpha(opacity), thickness)
+        painted = cov > 0
+        self.colour[ys, xs][painted] = colour
+        np.maximum(self.alpha[ys, xs], cov, out=self.alpha[ys, xs])
+
+    # ── compositing ──────────────────────────────────────────────────────────
+
+    def clear(self):
+        self.colour.fill(0)
+        self.alpha.fill(0)
+        self._roi = None
+
+    def copy_cell(self, src, ys, xs):
+        """Copy the painted pixels of `src` inside the given slices."""
+        painted = src.alpha[ys, xs] > 0
+        np.copyto(self.colour[ys, xs], src.colour[ys, xs], where=painted[..., None])
+        np.copyto(self.alpha[ys, xs], src.alpha[ys, xs], where=painted)
+
+    def seal(self):
+        """Precompute the blend terms. Call once after drawing, before apply()."""
+        rows = np.flatnonzero(self.alpha.any(axis=1))
+        cols = np.flatnonzero(self.alpha.any(axis=0))
+        if rows.size == 0:
+            self._roi = None
+            return
+        self._roi = (slice(rows[0], rows[-1] + 1), slice(cols[0], cols[-1] + 1))
+        wgt = self._weight
+        np.right_shift(self.alpha[..., None], 7, out=wgt)     # 255 -> 256
+        np.add(wgt, self.alpha[..., None], out=wgt)
+        np.multiply(self.colour, wgt, out=self._premul)
+        np.subtract(ALPHA_ONE, wgt, out=self._inv)
+
+    def apply(self, frame):
+        """frame = frame·(1-α) + colour·α, in place, restricted to painted area."""
+        if self._roi is None:
+            return frame
+        ys, xs = self._roi
+        dst = frame[ys, xs]
+        acc = self._scratch[ys, xs]
+        np.multiply(dst, self._inv[ys, xs], out=acc)
+        np.add(acc, self._premul[ys, xs], out=acc)
+        np.right_shift(acc, 8, out=acc)
+        np.copyto(dst, acc, casting="unsafe")
+        return frame
+
+
+class GridOverlay:
+    """
+    ROWS x COLS grid whose per-state cell artwork is rendered once per layout.
+
+    `painters` maps a cell state to painter(layer, code, x1, y1, x2, y2); the
+    dict order is the paint order (later states are drawn on top).
+    `tolerance` lets a jittering boundary rect reuse the cached layout.
+    `cache` is how many sealed composites (one per distinct states dict) are
+    kept; each costs about 20 bytes per frame pixel.
+    """
+
+    def __init__(self, rows, cols, painters, tolerance=0, cache=1):
+        self.rows = rows
+        self.cols = cols
+        self.painters = painters
+        self.tolerance = tolerance
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._shape = None
+        self._rect = None
+        self._cells = []
+        self._stamps = {}
+        self._composites = OrderedDict()     # frozen states -> (layer, apply lock)
+
+    def render(self, frame, rect, states):
+        """
+        Blend the grid onto `frame` in place.
+        rect   : (x, y, w, h) of the grid inside the frame
+        states : {slot_code: state}; codes missing from it use the first state
+        """
+        key = frozenset(states.items())
+        with self._lock:
+            self._ensure_layout(frame.shape[:2], rect)
+            entry = self._composites.get(key)
+            if entry is None:
+                entry = self._composites[key] = (self._compose(states), threading.Lock())
+                while len(self._composites) > self.cache:
+                    self._composites.popitem(last=False)
+            else:
+                self._composites.move_to_end(key)
+        layer, lock = entry
+        with lock:                          # apply() reuses the layer's scratch buffer
+            layer.apply(frame)
+        return frame
+
+    def _ensure_layout(self, shape, rect):
+        if (self._shape == shape and self._rect is not None and
+                all(abs(a - b) <= self.tolerance for a, b in zip(rect, self._rect))):
+            return
+
+        bx, by, bw, bh = rect
+        sw = bw / self.cols
+        sh = bh / self.rows
+        h, w = shape
+        self._cells = []
+        for r in range(self.rows):
+            for c in range(self.cols):
+                x1 = int(bx + c * sw);  y1 = int(by + r * sh)
+                x2 = int(x1 + sw);      y2 = int(y1 + sh)
+                ys = slice(max(y1 - CELL_PAD, 0), min(y2 + CELL_PAD + 1, h))
+                xs = slice(max(x1 - CELL_PAD, 0), min(x2 + CELL_PAD + 1, w))
+                self._cells.append((f"A{r * self.cols + c + 1}", x1, y1, x2, y2, ys, xs))
+
+        self._stamps = {}
+        for state, paint in self.painters.items():
+            stamp = OverlayLayer(shape)
+            for code, x1, y1, x2, y2, _, _ in self._cells:
+                paint(stamp, code, x1, y1, x2, y2)
+            self._stamps[state] = stamp
+
+        self._shape = shape
+        self._rect = tuple(rect)
+        self._composites.clear()
+
+    def _compose(self, states):
+        default = next(iter(self.painters))
+        comp = OverlayLayer(self._shape)
+        for state in self.painters:
+            stamp = self._stamps[state]
+            for code, _, _, _, _, ys, xs in self._cells:
+                if states.get(code, default) == state:
+                    comp.copy_cell(stamp, ys, xs)
+        comp.seal()
+        return comp
+
+
+def _alpha(opacity):
+    return int(round(opacity * 255))
@@ -0,0 +1,351 @@
+"""
+ratelimit.py  —  Per-client rate limiting and admission control
+────────────────────────────────────────────────────────────────
+Every route is put in a traffic class in ENDPOINT_CLASSES:
+
+  snapshot   /video-snapshot, /video-feed          (lowest priority)
+  analytics  /analytics/*, /forecast/occupancy
+  poll       /slots/status, notification / reservation / vehicle / lot
+             lists, guidance
+  vision     /update-slot, /update-slot/batch
+  booking    reservations, vehicles, auth, feedback (highest)
+
+/metrics and /debug/profile are exempt. A route missing from the table is
+treated as poll, so it can be shed.
+
+Rate limiting — token buckets keyed by client type + identity:
+  • client type: X-Client-Type header (mobile / vision / operator …), else
+    "vision" for the vision class and "web" for the rest
+  • identity: the client IP, plus the email in the route or JSON body when
+    there is one. Emails are not authenticated, so a client can only ever
+    spend buckets of its own address.
+A second, looser bucket per IP stops anyone dodging the per-user bucket by
+rotating emails. Over-limit requests get 429 with Retry-After set to the
+time until the next token.
+
+Bucket state lives in one of three backends (RATE_LIMIT_BACKEND):
+  memory  per process (default for a single worker)
+  shm     a hash table in a shared mmap'd tmpfs file, guarded by flock,
+          shared by every gunicorn worker on the host (default when the
+          serving profile runs more than one worker)
+  redis   any Redis-compatible server (RATE_LIMIT_REDIS_URL); needs the
+          optional `redis` package
+
+Admission control — each worker counts the requests it is handling. When
+that depth crosses a class's share of ADMISSION_CAPACITY the class is shed
+with 503 + Retry-After, lowest priority first: snapshots and analytics at
+50 %, polls at 75 %, vision updates at 100 %; bookings are never shed.
+
+Limits are "rate/burst" in requests per second, e.g. RATE_LIMIT_POLL=2/10.
+RATE_LIMIT_ENABLED=0 turns both mechanisms off.
+"""
+
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+import metrics
+from serving import SERVING_ROLE, gunicorn_settings
+
+try:
+    import redis
+except ImportError:                     # redis not installed
+    redis = None
+
+
+def _limit(name, default):
+    rate, _, burst = os.getenv(name, default).partition("/")
+    return float(rate), float(burst or rate)
+
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND") or (
+    "shm" if gunicorn_settings(SERVING_ROLE)["workers"] > 1 else "memory")
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_SHM_PATH = os.getenv("RATE_LIMIT_SHM_PATH") or os.path.join(
+    "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "smartpark-ratelimit")
+TRUST_PROXY = os.getenv("TRUST_PROXY", "0") == "1"     # use X-Forwarded-For
+
+LIMITS = {
+    "snapshot":  _limit("RATE_LIMIT_SNAPSHOT", "5/10"),   # guidance view runs at ≤ 4 fps
+    "analytics": _limit("RATE_LIMIT_ANALYTICS", "1/5"),
+    "poll":      _limit("RATE_LIMIT_POLL", "2/10"),
+    "vision":    _limit("RATE_LIMIT_VISION", "20/50"),
+    "booking":   _limit("RATE_LIMIT_BOOKING", "2/10"),
+}
+IP_LIMIT = _limit("RATE_LIMIT_IP", "50/100")
+
+ADMISSION_CAPACITY = int(os.getenv("ADMISSION_CAPACITY") or gunicorn_settings(SERVING_ROLE)["threads"])
+SHED_AT = {"snapshot": 0.5, "analytics": 0.5, "poll": 0.75, "vision": 1.0}
+SHED_RETRY_AFTER = {"snapshot": 1, "analytics": 5, "poll": 3, "vision": 1}
+
+ENDPOINT_CLASSES = {
+    "/video-snapshot": "snapshot",
+    "/video-feed": "snapshot",
+    "/analytics/occupancy": "analytics",
+    "/analytics/slots": "analytics",
+    "/forecast/occupancy": "analytics",
+    "/slots/status": "poll",
+    "/notifications/<email>": "poll",
+    "/reservation/list/<email>": "poll",
+    "/vehicle/list/<email>": "poll",
+    "/guidance/<slot_code>": "poll",
+    "/lots": "poll",
+    "/static/<path:filename>": "poll",
+    "/update-slot": "vision",
+    "/update-slot/batch": "vision",
+    "/reservation/create": "booking",
+    "/reservation/create/batch": "booking",
+    "/reservation/cancel": "booking",
+    "/reservation/cancel/batch": "booking",
+    "/vehicle/details": "booking",
+    "/vehicle/details/batch": "booking",
+    "/signup": "booking",
+    "/login": "booking",
+    "/feedback": "booking",
+    "/reset-slots": "booking",
+    "/metrics": None,
+    "/debug/profile": None,
+}
+
+REJECTED = metrics.REGISTRY.counter(
+    "smartpark_requests_rejected_total", "Requests refused by rate limiting / admission control",
+    labels=("reason", "traffic_class"))
+IN_FLIGHT = metrics.REGISTRY.gauge(
+    "smartpark_requests_in_flight", "Requests being handled by this worker")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Bucket backends — take(key, rate, burst) -> (allowed, retry_after_seconds)
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _refill(tokens, ts, now, rate, burst):
+    tokens = min(burst, tokens + (now - ts) * rate)
+    if tokens >= 1:
+        return tokens - 1, True, 0.0
+    return tokens, False, (1 - tokens) / rate
+
+
+class MemoryBackend:
+    name = "memory"
+
+    def __init__(self, max_keys=100_000):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._max_keys = max_keys
+
+    def take(self, key, rate, burst):
+        now = time.monotonic()
+        with self._lock:
+            tokens, ts = self._buckets.get(key, (burst, now))
+            tokens, allowed, wait = _refill(tokens, ts, now, rate, burst)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self._max_keys:
+                self._evict()
+        return allowed, wait
+
+    def _evict(self):
+        # drop the least recently used half
+        idle = sorted(self._buckets.items(), key=lambda kv: kv[1][1])
+        for key, _ in idle[: len(idle) // 2]:
+            del self._buckets[key]
+
+
+class SharedMemoryBackend:
+    """
+    Open-addressed hash table of (key hash, tokens, timestamp) rows in an
+    mmap'd file. All workers map the same file; flock serialises updates
+    between processes and a thread lock between a worker's own threads.
+    When every probed row is taken, the least recently used one is reused —
+    at worst a client gets a fresh (full) bucket.
+    """
+
+    name = "shm"
+    ROW = np.dtype([("key", "<u8"), ("tokens", "<f8"), ("ts", "<f8")])
+    PROBES = 8
+
+    def __init__(self, path=RATE_LIMIT_SHM_PATH, rows=1 << 16):
+        self.rows = rows
+        size = rows * self.ROW.itemsize
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._lock = threading.Lock()
+        with self._locked():
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+        self._mm = mmap.mmap(self._fd, size)
+        self._table = np.frombuffer(self._mm, dtype=self.ROW)
+
+    @contextmanager
+    def _locked(self):
+        # flock is held per open file, so threads sharing self._fd would all pass it
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def take(self, key, rate, burst):
+        h = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") | 1
+        start = h % self.rows
+        now = time.time()               # wall clock: shared across processes
+        t = self._table
+        with self._locked():
+            victim = None
+            for p in range(self.PROBES):
+                i = (start + p) % self.rows
+                if t["key"][i] == h or t["key"][i] == 0:
+                    victim = i
+                    break
+                if victim is None or t["ts"][i] < t["ts"][victim]:
+                    victim = i
+            i = victim
+            if t["key"][i] == h:
+                tokens, ts = float(t["tokens"][i]), float(t["ts"][i])
+            else:
+                tokens, ts = burst, now
+            tokens, allowed, wait = _refill(tokens, ts, now, rate, burst)
+            t[i] = (h, tokens, now)
+        return allowed, wait
+
+
+class RedisBackend:
+    """Token bucket evaluated atomically server-side with a Lua script."""
+
+    name = "redis"
+    SCRIPT = """
+    local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local b = redis.call('HMGET', KEYS[1], 't', 'ts')
+    local tokens, ts = tonumber(b[1]) or burst, tonumber(b[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    local allowed, wait = 0, (1 - tokens) / rate
+    if tokens >= 1 then
+        tokens, allowed, wait = tokens - 1, 1, 0
+    end
+    redis.call('HSET', KEYS[1], 't', tokens, 'ts', now)
+    redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+    return {allowed, tostring(wait)}
+    """
+
+    def __init__(self, url=RATE_LIMIT_REDIS_URL):
+        if redis is None:
+            raise RuntimeError("redis is not installed")
+        self._client = redis.Redis.from_url(url, socket_timeout=0.05)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    def take(self, key, rate, burst):
+        allowed, wait = self._script(keys=[f"smartpark:rl:{key}"], args=[rate, burst, time.time()])
+        return bool(allowed), float(wait)
+
+
+BACKENDS = {"memory": MemoryBackend, "shm": SharedMemoryBackend, "redis": RedisBackend}
+
+
+def make_backend(name=RATE_LIMIT_BACKEND):
+    return BACKENDS[name]()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Flask integration
+# ─────────────────────────────────────────────────────────────────────────────
+
+def client_ip(request):
+    if TRUST_PROXY and request.headers.get("X-Forwarded-For"):
+        return request.headers["X-Forwarded-For"].split(",")[0].strip()
+    return request.remote_addr or "-"
+
+
+def client_identity(request):
+    """Client IP, plus the email from the route or JSON body when given."""
+    identity = "ip:" + client_ip(request)
+    email = (request.view_args or {}).get("email")
+    if email is None and request.is_json:
+        body = request.get_json(silent=True)
+        email = body.get("email") if isinstance(body, dict) else None
+    if isinstance(email, str) and email.strip():
+        identity += ":user:" + email.lower().strip()
+    return identity
+
+
+def _reject(reason, traffic_class, status, retry_after, message):
+    from flask import jsonify
+
+    REJECTED.inc(reason=reason, traffic_class=traffic_class)
+    retry = str(max(1, math.ceil(retry_after)))
+    return jsonify({"message": message, "retry_after": int(retry)}), status, {"Retry-After": retry}
+
+
+class Limiter:
+    def __init__(self, backend=None, capacity=ADMISSION_CAPACITY):
+        self.backend = backend or make_backend()
+        self.capacity = capacity
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        IN_FLIGHT.set_function(lambda: [({}, self._in_flight)])
+
+    def admit(self, traffic_class):
+        """Count the request in; False if its class is being shed."""
+        with self._lock:
+            share = SHED_AT.get(traffic_class)
+            if share is not None and self._in_flight >= share * self.capacity:
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def check(self, request, traffic_class):
+        """None if allowed, else a 429 / 503 response tuple."""
+        if not self.admit(traffic_class):
+            return _reject("shed", traffic_class, 503, SHED_RETRY_AFTER[traffic_class],
+                           "Server busy, try again shortly")
+        request.environ["smartpark.admitted"] = True
+
+        ip = client_ip(request)
+        client_type = request.headers.get("X-Client-Type") or (
+            "vision" if traffic_class == "vision" else "web")
+        key = f"{traffic_class}:{client_type}:{client_identity(request)}"
+        for bucket, (rate, burst) in ((key, LIMITS[traffic_class]), ("ip:" + ip, IP_LIMIT)):
+            if not rate:
+                continue
+            try:
+                allowed, wait = self.backend.take(bucket, rate, burst)
+            except Exception:           # a broken shared backend must not take the API down
+                continue
+            if not allowed:
+                return _reject("rate_limit", traffic_class, 429, wait, "Too many requests")
+        return None
+
+
+def install(app, limiter=None):
+    """Register the limiter on `app`. Returns it (None when disabled)."""
+    if not RATE_LIMIT_ENABLED:
+        return None
+    from flask import request
+
+    limiter = limiter or Limiter()
+
+    @app.before_request
+    def _limit():
+        rule = request.url_rule.rule if request.url_rule else None
+        traffic_class = ENDPOINT_CLASSES.get(rule, "poll")
+        if rule is None or traffic_class is None or request.method == "OPTIONS":
+            return None
+        return limiter.check(request, traffic_class)
+
+    @app.teardown_request
+    def _done(exc):
+        if request.environ.pop("smartpark.admitted", False):
+            limiter.release()
+
+    return limiter
@@ -0,0 +1,68 @@
+"""
+serving.py  —  Serving profile shared by gunicorn.conf.py and app.py
+────────────────────────────────────────────────────────────────────
+Two roles, same codebase (SERVING_ROLE env):
+
+  api     short JSON requests on gthread workers. Each worker reserves
+          MAX_STREAMS_PER_WORKER extra threads for /video-feed, so open
+          streams can never take the threads the API needs. If
+          STREAM_BASE_URL is set, video requests are redirected to a
+          separate stream server instead and never touch API workers.
+          Workers are sized from the CPU count only when the API does not
+          open the camera itself (STREAM_BASE_URL or FRAME_BUS is set);
+          otherwise there is one worker, since only one process can hold
+          the webcam.
+
+  stream  long-lived /video-feed + /video-snapshot. One worker (the camera
+          can only be opened by one process) with a thread per stream;
+          with FRAME_BUS the vision process owns the camera and any number
+          of workers read its frames from shared memory (frame_bus.py).
+          cv2 capture/encode release the GIL but would block a gevent hub,
+          so threads are used rather than greenlets.
+
+Every value can be overridden through the environment.
+"""
+
+import os
+
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+CPU_COUNT = os.cpu_count() or 1
+SERVING_ROLE = os.getenv("SERVING_ROLE", "api")
+STREAM_BASE_URL = os.getenv("STREAM_BASE_URL", "").rstrip("/")
+FRAME_BUS = os.getenv("FRAME_BUS", "")          # see frame_bus.py
+
+MAX_STREAMS_PER_WORKER = _env_int("MAX_STREAMS_PER_WORKER",
+                                  16 if SERVING_ROLE == "stream" else 2)
+
+
+def gunicorn_settings(role=SERVING_ROLE):
+    """gunicorn settings for `role`, as a dict of config-file names."""
+    if role == "stream":
+        workers = _env_int("WEB_CONCURRENCY", 1)
+        api_threads = 2                 # snapshots + health checks
+        timeout = 120
+    else:
+        camera_elsewhere = bool(STREAM_BASE_URL or FRAME_BUS)
+        workers = _env_int("WEB_CONCURRENCY", min(2 * CPU_COUNT + 1, 12) if camera_elsewhere else 1)
+        api_threads = _env_int("GUNICORN_THREADS", 4)
+        timeout = 30
+
+    stream_threads = 0 if (role == "api" and STREAM_BASE_URL) else MAX_STREAMS_PER_WORKER
+    return {
+        "bind": f"0.0.0.0:{os.getenv('PORT', '5000')}",
+        "worker_class": "gthread",
+        "workers": workers,
+        "threads": api_threads + stream_threads,
+        "timeout": _env_int("GUNICORN_TIMEOUT", timeout),
+        "graceful_timeout": _env_int("GUNICORN_GRACEFUL_TIMEOUT", 20),
+        "keepalive": _env_int("GUNICORN_KEEPALIVE", 5),
+        "max_requests": _env_int("GUNICORN_MAX_REQUESTS", 2000),
+        "max_requests_jitter": _env_int("GUNICORN_MAX_REQUESTS_JITTER", 200),
+    }
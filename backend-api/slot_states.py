@@ -0,0 +1,59 @@
+"""
+slot_states.py  —  ParkingSlot status transitions
+─────────────────────────────────────────────────
+Every slot status change is looked up in TRANSITIONS by (current status,
+event). Events are what the vision system reports (available / occupied /
+blocked) plus the booking side's "reserve" and "release" (cancel, expiry).
+An entry is the next status, or:
+
+  KEEP        leave the slot as it is (vision cannot see bookings, so an
+              empty reserved bay stays reserved)
+  REALLOCATE  block the slot and move its active reservation, if any, to a
+              free slot in the same lot
+
+An "available" result is only the table's view: apply_slot_update() turns
+it into "reserved" while an active reservation still holds the slot.
+
+A missing entry means the event is not allowed in that status and
+transition() returns None (a status vision cannot report, or reserving a
+slot that is no longer available).
+
+Decisions are only as good as the row they were made on, so ParkingSlot
+and Reservation carry a version column: every UPDATE is
+"... WHERE id = ? AND version = ?" and loses to any concurrent writer with
+StaleDataError. The caller then re-reads and decides again (see
+app.with_cas_retry) instead of serialising slot writes through a lock.
+"""
+
+AVAILABLE, RESERVED, OCCUPIED, BLOCKED = "available", "reserved", "occupied", "blocked"
+STATUSES = (AVAILABLE, RESERVED, OCCUPIED, BLOCKED)
+
+VISION_EVENTS = (AVAILABLE, OCCUPIED, BLOCKED)     # what a camera can report
+RESERVE, RELEASE = "reserve", "release"
+KEEP, REALLOCATE = "keep", "reallocate"
+
+TRANSITIONS = {
+    AVAILABLE: {AVAILABLE: AVAILABLE, OCCUPIED: OCCUPIED, BLOCKED: BLOCKED,
+                RESERVE: RESERVED, RELEASE: AVAILABLE},
+    RESERVED:  {AVAILABLE: KEEP, OCCUPIED: OCCUPIED, BLOCKED: REALLOCATE,
+                RELEASE: AVAILABLE},
+    OCCUPIED:  {AVAILABLE: AVAILABLE, OCCUPIED: OCCUPIED, BLOCKED: REALLOCATE,
+                RELEASE: KEEP},
+    BLOCKED:   {AVAILABLE: AVAILABLE, OCCUPIED: OCCUPIED, BLOCKED: BLOCKED,
+                RELEASE: KEEP},
+}
+
+
+def transition(current, event):
+    """Next status / KEEP / REALLOCATE for `event` on a slot in `current`, else None."""
+    return TRANSITIONS.get(current or AVAILABLE, {}).get(event)
+
+
+def settle(current, event):
+    """The status a slot ends in after `event` (KEEP resolved, REALLOCATE → blocked)."""
+    action = transition(current, event)
+    if action == KEEP:
+        return current
+    if action == REALLOCATE:
+        return BLOCKED
+    return action
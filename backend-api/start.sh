@@ -1,4 +1,7 @@
 #!/usr/bin/env bash
 set -e
 
-gunicorn app:app --bind 0.0.0.0:$PORT
\ No newline at end of file
+# Worker / thread / timeout sizing lives in gunicorn.conf.py (see serving.py).
+# SERVING_ROLE=stream runs the video-only profile on its own port.
+alembic upgrade head
+exec gunicorn -c gunicorn.conf.py app:app
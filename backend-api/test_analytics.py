@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+import analytics
+import app as smartpark
+from app import SlotEvent, SlotRollup
+
+
+def _event(old, new, since, at, slot="A1"):
+    return {"lot_id": 1, "slot_code": slot, "old_status": old, "new_status": new,
+            "status_since": since, "created_at": at}
+
+
+def test_rollup_splits_intervals_across_buckets():
+    t = datetime(2030, 1, 1, 10, 0)
+    events = [
+        _event("available", "occupied", t, t.replace(minute=50)),
+        _event("occupied", "available", t.replace(minute=50), t.replace(hour=11, minute=20)),
+        _event("available", "blocked", t.replace(hour=11, minute=20), t.replace(hour=11, minute=30)),
+    ]
+    hours = analytics.rollup(events, granularities=("hour",))
+    ten, eleven = hours[("hour", t, 1, "A1")], hours[("hour", t.replace(hour=11), 1, "A1")]
+
+    assert ten["occupied_s"] == 10 * 60 and eleven["occupied_s"] == 20 * 60
+    assert ten["arrivals"] == 1 and eleven["departures"] == 1
+    assert eleven["dwell_s"] == 30 * 60
+    assert eleven["block_incidents"] == 1
+
+    minutes = analytics.rollup(events, granularities=("minute",))
+    occupied = sum(v["occupied_s"] for v in minutes.values())
+    assert occupied == 30 * 60
+
+
+def test_minute_buckets_stop_at_the_retention_window():
+    now = datetime(2030, 3, 1, 12, 0)
+    since = now - analytics.MINUTE_RETENTION - timedelta(days=30)
+    deltas = analytics.rollup([_event("occupied", "available", since, now)], now=now)
+
+    minutes = [b for g, b, _, _ in deltas if g == "minute"]
+    assert min(minutes) == now - analytics.MINUTE_RETENTION
+    occupied = sum(v["occupied_s"] for (g, *_), v in deltas.items() if g == "minute")
+    assert occupied == analytics.MINUTE_RETENTION.total_seconds()
+    hours = sum(v["occupied_s"] for (g, *_), v in deltas.items() if g == "hour")
+    assert hours == (now - since).total_seconds()
+    assert deltas[("minute", now, 1, "A1")]["dwell_s"] == (now - since).total_seconds()
+
+
+def test_committed_slot_changes_reach_the_rollups(client):
+    client.get("/slots/status")                    # seeds the slots
+    for status in ("occupied", "available", "blocked", "available"):
+        client.post("/update-slot", json={"slot_code": "A1", "status": status})
+    smartpark.slot_history.flush()
+
+    with smartpark.app.app_context():
+        events = SlotEvent.query.order_by(SlotEvent.id).all()
+        assert [(e.old_status, e.new_status) for e in events] == [
+            ("available", "occupied"), ("occupied", "available"),
+            ("available", "blocked"), ("blocked", "available")]
+        assert events[0].source == "/update-slot"
+        assert SlotRollup.query.filter_by(granularity="hour", slot_code="A1").one().arrivals == 1
+
+    slots = {s["slot_code"]: s for s in client.get("/analytics/slots").get_json()["slots"]}
+    assert slots["A1"]["arrivals"] == 1
+    assert slots["A1"]["departures"] == 1
+    assert slots["A1"]["block_incidents"] == 1
+
+    series = client.get("/analytics/occupancy?granularity=minute").get_json()["series"]
+    assert len(series) == 61
+    assert sum(b["arrivals"] for b in series) == 1
+
+
+def test_open_intervals_count_towards_current_occupancy(client):
+    client.get("/slots/status")
+    client.post("/update-slot", json={"slot_code": "A2", "status": "occupied"})
+    smartpark.slot_history.flush()
+
+    a2 = client.get("/analytics/occupancy?slot=A2&granularity=minute").get_json()["series"][-1]
+    assert a2["occupancy"] > 0
+
+
+def test_analytics_window_is_validated(client):
+    assert client.get("/analytics/occupancy?granularity=day").status_code == 400
+    assert client.get("/analytics/slots?from=2030-01-02 00:00&to=2030-01-01 00:00").status_code == 400
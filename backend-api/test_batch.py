@@ -0,0 +1,113 @@
+from datetime import datetime
+
+import app as smartpark
+from app import ParkingSlot, Reservation, Vehicle, db
+
+
+def test_vehicle_batch_upserts_and_reports_each_item(client, driver):
+    client.post("/vehicle/details", json={"email": driver, "plate_number": "OLD-1"})
+    resp = client.post("/vehicle/details/batch", json={"email": driver, "vehicles": [
+        {"plate_number": "old-1", "length_m": 4.2},
+        {"plate_number": "NEW-1", "width_m": 1.9},
+        {"plate_number": ""},
+    ]})
+    body = resp.get_json()
+    assert resp.status_code == 200
+    assert (body["succeeded"], body["failed"]) == (2, 1)
+    assert [r.get("action") for r in body["results"]] == ["updated", "created", None]
+
+    with smartpark.app.app_context():
+        rows = {v.plate_number: v for v in Vehicle.query}
+    assert rows["OLD-1"].length == 4.2
+    assert rows["NEW-1"].width == 1.9
+    assert body["results"][1]["vehicle_id"] == rows["NEW-1"].id
+
+
+def test_reservation_batch_books_distinct_slots_then_cancels(client, driver):
+    vid = client.post("/vehicle/details/batch", json={
+        "email": driver, "vehicles": [{"plate_number": "CAR-1"}]}).get_json()["results"][0]["vehicle_id"]
+    booking = {"vehicle_id": vid, "start_time": "2030-01-01 10:00", "end_time": "2030-01-01 12:00"}
+
+    body = client.post("/reservation/create/batch", json={
+        "email": driver, "reservations": [booking] * 13 + [{"vehicle_id": vid}]}).get_json()
+    booked = [r for r in body["results"] if r["ok"]]
+    assert len(booked) == 12                       # ensure_slots creates 12
+    assert len({r["slot"] for r in booked}) == 12
+    assert body["results"][12]["message"] == "Parking Full"
+    assert "required" in body["results"][13]["message"]
+
+    ids = [r["reservation_id"] for r in booked[:3]]
+    body = client.post("/reservation/cancel/batch", json={"reservation_ids": ids + [999]}).get_json()
+    assert (body["succeeded"], body["failed"]) == (3, 1)
+    with smartpark.app.app_context():
+        assert {r.status for r in Reservation.query.filter(Reservation.id.in_(ids))} == {"cancelled"}
+        assert ParkingSlot.query.filter_by(status="available").count() == 3
+
+
+def test_slot_batch_applies_updates_in_order(client):
+    client.get("/slots/status")                    # seeds the slots
+    body = client.post("/update-slot/batch", json={"updates": [
+        {"slot_code": "A1", "status": "occupied"},
+        {"slot_code": "A1", "status": "available"},
+        {"slot_code": "Z9", "status": "occupied"},
+    ]}).get_json()
+    assert [r["ok"] for r in body["results"]] == [True, True, False]
+    with smartpark.app.app_context():
+        assert ParkingSlot.query.filter_by(slot_code="A1").one().status == "available"
+
+
+def test_malformed_batch_items_are_reported_not_fatal(client, driver):
+    booking = {"vehicle_id": "1", "start_time": "2030-01-01 10:00", "end_time": "2030-01-01 12:00"}
+    body = client.post("/reservation/create/batch", json={"email": driver, "reservations": [
+        booking,
+        {**booking, "vehicle_id": [1]},
+        {**booking, "start_time": 202001011000},
+        {**booking, "end_time": ["2030-01-01 12:00"]},
+        {**booking, "vehicle_id": 99},
+    ]}).get_json()
+    assert [r["ok"] for r in body["results"]] == [True, False, False, False, False]
+    assert [r["message"] for r in body["results"][1:]] == [
+        "vehicle_id must be an integer", "Times must be YYYY-MM-DD HH:MM",
+        "Times must be YYYY-MM-DD HH:MM", "Vehicle not found"]
+
+    rid = body["results"][0]["reservation_id"]
+    body = client.post("/reservation/cancel/batch",
+                       json={"reservation_ids": [[rid], {"id": rid}, str(rid)]}).get_json()
+    assert [r["ok"] for r in body["results"]] == [False, False, True]
+
+    body = client.post("/update-slot/batch", json={"updates": [
+        {"slot_code": ["A1"], "status": "occupied"},
+        {"slot_code": "A2", "status": ["occupied"]},
+        "A3",
+        {"slot_code": "A4", "status": "occupied"},
+    ]}).get_json()
+    assert [r["ok"] for r in body["results"]] == [False, False, False, True]
+
+
+def test_batch_size_is_capped(client):
+    resp = client.post("/update-slot/batch",
+                       json={"updates": [{}] * (smartpark.BATCH_MAX_ITEMS + 1)})
+    assert resp.status_code == 413
+
+
+def test_reservation_batch_returns_the_new_ids_next_to_stale_active_rows(client, driver):
+    # active reservations left on free slots (rows seeded directly, as after
+    # a reset that freed the slots but kept the bookings)
+    client.get("/slots/status")                    # seeds the slots
+    start, end = datetime(2030, 1, 1, 8), datetime(2030, 1, 1, 18)
+    with smartpark.app.app_context():
+        db.session.add_all(Reservation(id=1000 + s.id, lot_id=s.lot_id, user_id=1, vehicle_id=1,
+                                       slot_id=s.id, start_time=start, end_time=end,
+                                       status="active")
+                           for s in ParkingSlot.query)
+        db.session.commit()
+
+    booking = {"vehicle_id": 1, "start_time": "2030-01-01 10:00", "end_time": "2030-01-01 12:00"}
+    body = client.post("/reservation/create/batch",
+                       json={"email": driver, "reservations": [booking] * 3}).get_json()
+    assert body["succeeded"] == 3
+    with smartpark.app.app_context():
+        for r in body["results"]:
+            row = db.session.get(Reservation, r["reservation_id"])
+            assert row.start_time == datetime(2030, 1, 1, 10)       # not the stale row
+            assert db.session.get(ParkingSlot, row.slot_id).slot_code == r["slot"]
@@ -0,0 +1,63 @@
+import pytest
+from flask import Flask, g
+from flask_sqlalchemy import SQLAlchemy
+
+import app as smartpark
+import db_config
+from db_routing import RoutingSession, read_only, use_primary
+
+
+@pytest.fixture()
+def routed(tmp_path):
+    """A primary and a "replica" SQLite file, each holding its own copy of one table."""
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'primary.db'}"
+    app.config["SQLALCHEMY_BINDS"] = {"replica": f"sqlite:///{tmp_path / 'replica.db'}"}
+    db = SQLAlchemy(app, session_options={"class_": RoutingSession})
+
+    class Note(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        text = db.Column(db.String(20))
+
+    with app.app_context():
+        for engine in db.engines.values():
+            db.metadata.create_all(engine)
+            with engine.begin() as conn:
+                conn.execute(Note.__table__.insert(), {"id": 1, "text": str(engine.url)[-10:]})
+    return app, db, Note
+
+
+def test_read_only_requests_read_from_the_replica_and_write_to_the_primary(routed):
+    app, db, Note = routed
+
+    @read_only
+    def view():
+        seen = db.session.get(Note, 1).text
+        db.session.add(Note(id=2, text="written"))
+        db.session.commit()
+        return seen
+
+    with app.test_request_context():
+        assert db.session.get(Note, 1).text == "primary.db"
+    with app.test_request_context():
+        assert view() == "replica.db"
+        use_primary()
+        assert db.session.get(Note, 2).text == "written"
+        assert g.read_only is False
+    with app.app_context(), db.engines["replica"].connect() as conn:
+        assert conn.execute(Note.__table__.select()).all() == [(1, "replica.db")]
+
+
+def test_slot_status_seeds_a_new_lot_on_the_primary(client):
+    assert len(client.get("/slots/status").get_json()) == 12
+    assert len(client.get("/slots/status").get_json()) == 12
+    with smartpark.app.app_context():
+        smartpark.ensure_slots(smartpark.lot_directory.get("main"))     # seeded: a no-op
+        assert smartpark.ParkingSlot.query.count() == 12
+
+
+def test_sqlite_engines_get_a_busy_timeout_and_no_mysql_options():
+    options = db_config.engine_options("sqlite:///smartpark.db")
+    assert options["connect_args"]["timeout"] == db_config.SQLITE_BUSY_TIMEOUT
+    assert "isolation_level" not in options
+    assert db_config.engine_options("sqlite://") == {}
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+import encoders
+
+FRAME = np.zeros((48, 64, 3), np.uint8)
+
+
+def test_formats_pick_an_encoder_and_fall_back_to_jpeg():
+    assert encoders.get_encoder("webp").mimetype == "image/webp"
+    assert encoders.get_encoder("WEBP") is encoders.get_encoder("webp")
+    assert encoders.get_encoder("gif") is encoders.ENCODERS["jpeg"]
+    assert encoders.get_encoder(None) is encoders.ENCODERS["jpeg"]
+
+
+def test_jpeg_falls_back_to_opencv_without_turbojpeg(monkeypatch):
+    monkeypatch.setattr(encoders, "TurboJPEG", None)
+    assert isinstance(encoders._best_jpeg(), encoders.OpenCVJpegEncoder)
+
+
+def test_encode_runs_on_the_pool():
+    buf, mimetype = encoders.encode(FRAME, "jpeg", 70)
+    assert mimetype == "image/jpeg" and buf[:2] == b"\xff\xd8"
+    buf, mimetype = encoders.encode_async(FRAME, "webp", 70).result()
+    assert mimetype == "image/webp" and buf[8:12] == b"WEBP"
+
+
+def test_h264_needs_pyav_or_ffmpeg(monkeypatch):
+    monkeypatch.setattr(encoders, "av", None)
+    monkeypatch.setattr(encoders.shutil, "which", lambda name: None)
+    assert not encoders.h264_available()
+    with pytest.raises(RuntimeError):
+        encoders.H264Stream(64, 48)
+
+
+@pytest.mark.skipif(not encoders.h264_available(), reason="no PyAV or ffmpeg")
+def test_h264_stream_produces_fragmented_mp4():
+    stream = encoders.H264Stream(65, 48, fps=5)
+    assert (stream.width, stream.height) == (64, 48)
+    data = b"".join(stream.push_async(FRAME).result() for _ in range(5)) + stream.close()
+    assert b"ftyp" in data[:64] and b"moof" in data
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+
+import app as smartpark
+import forecast
+from app import Reservation, db
+from forecast import LONG, SHORT, DemandModel, Forecast, choose_slot
+
+MONDAY = datetime(2030, 1, 7)             # a Monday
+
+
+def test_coverage_counts_concurrent_reservations_per_hour():
+    base, counts = forecast.coverage(np.array([10.0, 10.5, 12.0]), np.array([12.0, 11.0, 13.5]))
+    assert base == 10
+    assert counts.tolist() == [2, 1, 1, 1]
+
+
+def test_weekly_baseline_learns_the_pattern_and_weights_recent_weeks():
+    model = DemandModel(weeks=4, decay=0.5)
+    starts, ends = [], []
+    for week in range(4):
+        day = MONDAY + timedelta(weeks=week)
+        n = 1 if week < 3 else 3                  # the latest week is busier
+        starts += [day + timedelta(hours=9)] * n  # Monday 09:00–10:00 short stays
+        ends += [day + timedelta(hours=10)] * n
+        starts.append(day + timedelta(days=2, hours=8))   # Wednesday all-day stay
+        ends.append(day + timedelta(days=2, hours=18))
+    model.add(starts, ends)
+    f = model.build(now=MONDAY + timedelta(weeks=4))
+
+    monday_9 = f.curves[SHORT][9]
+    assert 1 < monday_9 < 3                       # between the old and new level
+    assert monday_9 > (1 + 3) / 2                 # recent week weighted up
+    assert f.curves[LONG][2 * 24 + 12] == 1.0     # Wednesday noon
+    assert f.curves[SHORT][2 * 24 + 12] == 0.0
+    assert f.expected(MONDAY + timedelta(weeks=5, hours=8), MONDAY + timedelta(weeks=5, hours=11),
+                      SHORT) == monday_9
+
+
+def test_short_stays_park_near_the_entrance_long_stays_behind_the_demand():
+    slots = [SimpleNamespace(slot_code=f"A{i}") for i in range(1, 13)]
+    depth = lambda s: int(s.slot_code[1:]) - 1
+    curves = np.zeros((2, 168))
+    curves[SHORT, 9] = 3.2                        # Monday 09:00: ~3 short stays expected
+    f = Forecast(curves)
+    start = MONDAY + timedelta(hours=9)
+
+    assert choose_slot(slots[5:], depth, start, start + timedelta(hours=1), f).slot_code == "A6"
+    assert choose_slot(slots, depth, start, start + timedelta(hours=1), f).slot_code == "A1"
+    assert choose_slot(slots, depth, start, start + timedelta(hours=8), f).slot_code == "A5"
+    assert choose_slot(slots[:3], depth, start, start + timedelta(hours=8), f).slot_code == "A3"
+    assert choose_slot([], depth, start, start, f) is None
+
+
+def test_refresh_counts_late_commits_once_and_skips_cancelled(client, driver):
+    def book(hour):
+        return client.post("/reservation/create", json={
+            "email": driver, "vehicle_id": 1,
+            "start_time": f"2030-01-07 {hour:02}:00", "end_time": f"2030-01-07 {hour + 1:02}:00",
+        }).get_json()["reservation_id"]
+
+    first, late, cancelled = book(9), book(10), book(11)
+    client.post("/reservation/cancel", json={"reservation_id": cancelled})
+    demand = forecast.Demand()
+    demand.bind(smartpark.app, db, Reservation)
+    with smartpark.app.app_context():
+        # `late` got its id before `cancelled` but commits after the first refresh
+        row = db.session.get(Reservation, late)
+        values = {c.name: getattr(row, c.name) for c in Reservation.__table__.columns}
+        db.session.delete(row)
+        db.session.commit()
+        assert demand.refresh() == 1
+        db.session.execute(Reservation.__table__.insert(), values)
+        db.session.commit()
+        assert demand.refresh() == 1
+        assert demand.refresh() == 0
+        assert demand.forecast(1).reservations == 2
+
+        client.post("/reservation/cancel", json={"reservation_id": first})
+        assert demand.refresh(rebuild=True) == 1
+        assert demand.forecast(1).reservations == 1
@@ -0,0 +1,70 @@
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+
+import app as smartpark
+import frame_bus
+
+SHAPE = (120, 160, 3)
+
+
+def _publish(name, started, stop):
+    writer = frame_bus.FrameWriter(name, slots=4)
+    n = 0
+    while not stop.is_set():
+        n += 1
+        frame = np.full(SHAPE, n % 200, np.uint8)
+        writer.begin(frame)
+        writer.commit(255 - frame, cars=[(10, 20, 30, 15), (50, 40, 60, 40)],
+                      boundary=(0, 0, 160, 120))
+        started.set()
+        stop.wait(0.01)
+    writer.close()
+
+
+@pytest.fixture()
+def bus():
+    name = f"smartpark-test-{os.getpid()}"
+    ctx = multiprocessing.get_context("fork")
+    started, stop = ctx.Event(), ctx.Event()
+    proc = ctx.Process(target=_publish, args=(name, started, stop))
+    proc.start()
+    assert started.wait(5)
+    yield name, stop
+    stop.set()
+    proc.join(5)
+
+
+def test_frames_are_read_in_place_from_the_writer_process(bus):
+    name, stop = bus
+    reader = frame_bus.FrameReader(name)
+    first = reader.read()
+    assert first is not None and first.valid()
+    value = int(first.image[0, 0, 0])
+    assert (first.image == value).all() and (first.overlay == 255 - value).all()
+    assert first.car == (50, 40, 60, 40) and first.boundary == (0, 0, 160, 120)
+
+    second = reader.read(after=first.seq)
+    assert second.seq > first.seq
+    while first.valid():                 # the 4-slot ring laps the first frame
+        reader.read(after=reader.read().seq)
+    stop.set()
+
+
+def test_video_snapshot_is_served_from_the_bus(bus, monkeypatch):
+    name, _ = bus
+    monkeypatch.setattr(smartpark, "_frame_bus", frame_bus.FrameReader(name))
+    monkeypatch.setattr(smartpark, "_capture", lambda: pytest.fail("camera opened"))
+    client = smartpark.app.test_client()
+
+    for query in ("?slot=A2", "?view=grid", "?view=grid&w=80"):
+        resp = client.get("/video-snapshot" + query)
+        assert resp.status_code == 200 and resp.mimetype == "image/jpeg"
+
+
+def test_video_snapshot_without_a_live_bus_is_unavailable(monkeypatch):
+    monkeypatch.setattr(smartpark, "_frame_bus", frame_bus.FrameReader("smartpark-test-missing"))
+    resp = smartpark.app.test_client().get("/video-snapshot")
+    assert resp.status_code == 503
@@ -0,0 +1,49 @@
+import uuid
+
+import pytest
+
+import app as smartpark
+from app import Notification, Reservation
+
+
+@pytest.fixture()
+def booking(driver):
+    return {"email": driver, "vehicle_id": 1,
+            "start_time": "2030-01-01 10:00", "end_time": "2030-01-01 11:00"}
+
+
+def test_retried_create_replays_the_first_response(client, booking):
+    headers = {"Idempotency-Key": "booking-1"}
+    first = client.post("/reservation/create", json=booking, headers=headers)
+    retry = client.post("/reservation/create", json=booking, headers=headers)
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.get_json() == first.get_json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    with smartpark.app.app_context():
+        assert Reservation.query.count() == 1
+        assert Notification.query.count() == 1
+
+
+def test_key_reused_with_different_body_is_rejected(client, booking):
+    headers = {"Idempotency-Key": "booking-2"}
+    client.post("/reservation/create", json=booking, headers=headers)
+    other = dict(booking, end_time="2030-01-01 12:00")
+    assert client.post("/reservation/create", json=other, headers=headers).status_code == 422
+
+
+def test_cancel_is_idempotent(client, booking):
+    rid = client.post("/reservation/create", json=booking).get_json()["reservation_id"]
+    headers = {"Idempotency-Key": str(uuid.uuid4())}        # one per user action
+    for _ in range(2):
+        resp = client.post("/reservation/cancel", json={"reservation_id": rid}, headers=headers)
+        assert resp.get_json() == {"message": "Cancelled"}
+    with smartpark.app.app_context():
+        assert Notification.query.filter_by(title="Reservation Cancelled").count() == 1
+
+
+def test_requests_without_a_key_are_not_deduplicated(client, booking):
+    client.post("/reservation/create", json=booking)
+    client.post("/reservation/create", json=booking)
+    with smartpark.app.app_context():
+        assert Reservation.query.count() == 2
@@ -0,0 +1,62 @@
+import app as smartpark
+import lots
+from app import ParkingSlot, Reservation, db
+
+
+def _book(client, email, lot=None):
+    body = {"email": email, "vehicle_id": 1,
+            "start_time": "2030-01-01 10:00", "end_time": "2030-01-01 11:00"}
+    if lot:
+        body["lot"] = lot
+    return client.post("/reservation/create", json=body)
+
+
+def test_lots_have_their_own_slots_and_reservations(client, driver):
+    created = client.post("/lots", json={"lot": "North", "name": "North lot", "rows": 2, "cols": 3})
+    assert created.status_code == 201 and created.get_json()["slots"] == 6
+    assert client.post("/lots", json={"lot": "north", "name": "again"}).status_code == 409
+
+    assert len(client.get("/slots/status").get_json()) == 12           # default lot
+    assert len(client.get("/slots/status?lot=north").get_json()) == 6
+
+    client.post("/update-slot", json={"lot": "north", "slot_code": "A1", "status": "occupied"})
+    main = {s["slot_code"]: s["status"] for s in client.get("/slots/status").get_json()}
+    assert main["A1"] == "available"
+
+    booked = _book(client, driver, "north").get_json()
+    assert booked["lot"] == "north"
+    with smartpark.app.app_context():
+        r = db.session.get(Reservation, booked["reservation_id"])
+        assert db.session.get(ParkingSlot, r.slot_id).lot_id == r.lot_id
+
+    # a reservation can only be cancelled through its own lot
+    cancel = {"reservation_id": booked["reservation_id"]}
+    assert client.post("/reservation/cancel", json=cancel).status_code == 404
+    assert client.post("/reservation/cancel", json={**cancel, "lot": "north"}).status_code == 200
+
+
+def test_unknown_lot_is_rejected(client, driver):
+    assert client.get("/slots/status", headers={"X-Lot": "nowhere"}).status_code == 404
+    assert _book(client, driver, "nowhere").status_code == 404
+
+
+def test_requests_for_other_partitions_are_redirected(client, driver, monkeypatch):
+    router = lots.LotRouter({"east": "http://east:5000", "west": "http://west:5000"},
+                            local="east", placement={"north": "west"})
+    monkeypatch.setattr(smartpark, "lot_router", router)
+
+    resp = _book(client, driver, "north")
+    assert resp.status_code == 307
+    assert resp.headers["Location"].startswith("http://west:5000/reservation/create")
+    with smartpark.app.app_context():
+        assert Reservation.query.count() == 0
+
+
+def test_rendezvous_placement_only_moves_lots_to_a_new_partition():
+    codes = [f"lot-{i}" for i in range(200)]
+    two = lots.LotRouter({"a": "http://a", "b": "http://b"}, local="a", placement={})
+    three = lots.LotRouter({"a": "http://a", "b": "http://b", "c": "http://c"},
+                           local="a", placement={})
+    moved = [c for c in codes if two.owner(c) != three.owner(c)]
+    assert all(three.owner(c) == "c" for c in moved)
+    assert 30 < len(moved) < 110
@@ -0,0 +1,60 @@
+import app as smartpark
+import metrics
+
+
+def _scrape(client):
+    resp = client.get("/metrics")
+    assert resp.status_code == 200 and resp.mimetype == "text/plain"
+    samples = {}
+    for line in resp.get_data(as_text=True).splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_requests_show_up_in_the_scrape(client):
+    before = _scrape(client)
+    client.get("/slots/status")
+    client.post("/update-slot", json={"slot_code": "A1", "status": "occupied"})
+    after = _scrape(client)
+
+    queued = 'smartpark_slot_events_total{outcome="queued"}'
+    assert after[queued] == before.get(queued, 0) + 1
+
+    series = 'smartpark_http_request_duration_seconds{}{{method="{}",endpoint="{}",status="200"{}}}'
+    count = series.format("_count", "POST", "/update-slot", "")
+    assert after[count] == before.get(count, 0) + 1
+    assert after[series.format("_bucket", "POST", "/update-slot", ',le="+Inf"')] == after[count]
+    assert after[series.format("_sum", "POST", "/update-slot", "")] > 0
+    assert after['smartpark_sql_queries_per_request_count{endpoint="/update-slot"}'] >= 1
+
+
+def test_histogram_buckets_are_cumulative():
+    h = metrics.Histogram("test_seconds", "test", labels=("stage",), buckets=(0.1, 1.0))
+    for v in (0.05, 0.5, 5.0):
+        h.observe(v, stage="x")
+    assert list(h.render())[2:] == [
+        'test_seconds_bucket{stage="x",le="0.1"} 1',
+        'test_seconds_bucket{stage="x",le="1.0"} 2',
+        'test_seconds_bucket{stage="x",le="+Inf"} 3',
+        'test_seconds_sum{stage="x"} 5.55',
+        'test_seconds_count{stage="x"} 3',
+    ]
+
+
+def test_profiler_is_off_by_default(client, monkeypatch):
+    monkeypatch.delenv("ENABLE_PROFILER", raising=False)
+    assert not smartpark._profiler.running
+    assert client.get("/debug/profile?seconds=0").status_code == 404
+    assert not smartpark._profiler.running
+
+
+def test_profile_duration_is_clamped(client, monkeypatch):
+    monkeypatch.setenv("ENABLE_PROFILER", "1")
+    slept = []
+    monkeypatch.setattr(smartpark.time, "sleep", slept.append)
+    for seconds in ("abc", "nan", "-5", "0.5", "1e9"):
+        assert client.get(f"/debug/profile?seconds={seconds}").status_code == 200
+    assert slept == [10, 10, 0.1, 0.5, 120]
+    assert not smartpark._profiler.running
@@ -0,0 +1,76 @@
+import os
+import re
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, select
+
+import app as smartpark
+from app import Notification, ParkingSlot, Reservation, Vehicle
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+    url = f"sqlite:///{tmp_path_factory.mktemp('mig') / 'smartpark.db'}"
+    cfg = Config(os.path.join(HERE, "alembic.ini"))
+    cfg.set_main_option("script_location", os.path.join(HERE, "migrations"))
+    cfg.set_main_option("sqlalchemy.url", url)
+    cfg.attributes["configure_logger"] = False
+    command.upgrade(cfg, "head")
+    return create_engine(url)
+
+
+def _plan(engine, stmt):
+    sql = str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql).fetchall()
+    return " | ".join(r[-1] for r in rows)
+
+
+# The filters below mirror the hot queries in app.py
+HOT_QUERIES = {
+    "expire_reservations": (
+        select(Reservation).where(Reservation.lot_id == 1, Reservation.status == "active",
+                                  Reservation.end_time <= "2026-01-01 00:00:00"),
+        "ix_reservation_lot_status_end"),
+    "reallocation lookup": (
+        select(Reservation).where(Reservation.slot_id == 1, Reservation.status == "active"),
+        "ix_reservation_slot_status"),
+    "reservation list": (
+        select(Reservation).where(Reservation.user_id == 1, Reservation.status == "active")
+        .order_by(Reservation.start_time.desc()),
+        "ix_reservation_user_status_start"),
+    "notifications": (
+        select(Notification).where(Notification.user_id == 1)
+        .order_by(Notification.created_at.desc()).limit(50),
+        "ix_notification_user_created"),
+    "vehicle upsert": (
+        select(Vehicle).where(Vehicle.user_id == 1, Vehicle.plate_number == "ABC-123"),
+        "uq_vehicle_user_plate"),
+    "free slot": (
+        select(ParkingSlot).where(ParkingSlot.lot_id == 1, ParkingSlot.status == "available"),
+        "ix_parking_slot_lot_status"),
+}
+
+
+@pytest.mark.parametrize("name", list(HOT_QUERIES))
+def test_hot_query_uses_index(engine, name):
+    stmt, index = HOT_QUERIES[name]
+    plan = _plan(engine, stmt)
+    assert "USING" in plan and "INDEX" in plan, plan
+    # the unique constraint shows up under SQLite's autoindex name
+    expected = "sqlite_autoindex_vehicle" if index.startswith("uq_") else index
+    assert expected in plan, plan
+    assert not re.search(r"USE TEMP B-TREE FOR ORDER BY", plan), plan
+
+
+def test_migrated_schema_matches_models(engine):
+    from alembic.autogenerate import compare_metadata
+    from alembic.migration import MigrationContext
+
+    with engine.connect() as conn:
+        diff = compare_metadata(MigrationContext.configure(conn), smartpark.db.metadata)
+    assert diff == []
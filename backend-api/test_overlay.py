@@ -0,0 +1,79 @@
+import numpy as np
+import cv2
+
+from overlay import GridOverlay, OverlayLayer
+
+
+def _frame():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (240, 320, 3), dtype=np.uint8)
+
+
+def test_opaque_layer_matches_direct_drawing():
+    frame = _frame()
+    expected = frame.copy()
+    cv2.rectangle(expected, (10, 10), (100, 80), (0, 0, 255), 2)
+    cv2.putText(expected, "A1", (14, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (200, 200, 200), 1)
+
+    layer = OverlayLayer(frame.shape)
+    layer.rectangle((10, 10), (100, 80), (0, 0, 255), 2)
+    layer.text("A1", (14, 30), 0.4, (200, 200, 200), 1)
+    layer.seal()
+    layer.apply(frame)
+
+    assert np.abs(frame.astype(int) - expected.astype(int)).max() <= 1
+
+
+def test_translucent_fill_matches_add_weighted():
+    frame = _frame()
+    tinted = frame.copy()
+    cv2.rectangle(tinted, (20, 20), (60, 60), (40, 0, 80), cv2.FILLED)
+    expected = cv2.addWeighted(tinted, 0.3, frame, 0.7, 0)
+
+    layer = OverlayLayer(frame.shape)
+    layer.rectangle((20, 20), (60, 60), (40, 0, 80), cv2.FILLED, opacity=0.3)
+    layer.seal()
+    layer.apply(frame)
+
+    assert np.abs(frame.astype(int) - expected.astype(int)).max() <= 1
+
+
+def test_grid_rebuilds_only_on_layout_or_state_change():
+    painted = []
+
+    def paint(layer, code, x1, y1, x2, y2):
+        painted.append(code)
+        layer.rectangle((x1, y1), (x2, y2), (255, 255, 255), 1)
+
+    grid = GridOverlay(3, 4, {"available": paint, "occupied": paint}, tolerance=4)
+    grid.render(_frame(), (10, 10, 200, 150), {})
+    first = len(painted)
+    assert first == 2 * 12
+
+    grid.render(_frame(), (12, 9, 201, 150), {"A3": "occupied"})
+    assert len(painted) == first            # jitter within tolerance, state-only change
+
+    grid.render(_frame(), (40, 10, 200, 150), {})
+    assert len(painted) == 2 * first        # boundary moved: stamps re-rendered
+
+
+def test_grid_keeps_a_composite_per_viewer_state():
+    def idle(layer, code, x1, y1, x2, y2):
+        layer.rectangle((x1, y1), (x2, y2), (180, 180, 180), 1)
+
+    def target(layer, code, x1, y1, x2, y2):
+        layer.rectangle((x1, y1), (x2, y2), (0, 255, 0), 2)
+
+    grid = GridOverlay(3, 4, {"idle": idle, "target": target}, cache=2)
+    composed = []
+    compose = grid._compose
+    grid._compose = lambda states: composed.append(dict(states)) or compose(states)
+
+    viewers = [{"A1": "target"}, {"A7": "target"}]
+    frames = [grid.render(_frame(), (0, 0, 320, 240), viewers[i % 2]) for i in range(6)]
+    assert composed == viewers                       # each built once, then reused
+    assert np.array_equal(frames[0], frames[4]) and not np.array_equal(frames[0], frames[1])
+
+    grid.render(_frame(), (0, 0, 320, 240), {})
+    grid.render(_frame(), (0, 0, 320, 240), viewers[0])
+    assert composed[2:] == [{}, viewers[0]]          # the least recently used one was dropped
@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+from flask import Flask
+
+import app as smartpark
+import ratelimit
+
+
+@pytest.fixture()
+def limited(monkeypatch):
+    """A small app behind a Limiter with tight buckets and room for 4 requests."""
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setitem(ratelimit.LIMITS, "booking", (1.0, 2.0))
+    monkeypatch.setattr(ratelimit, "IP_LIMIT", (100.0, 100.0))
+    app = Flask(__name__)
+    for rule in ("/reservation/create", "/slots/status"):
+        app.add_url_rule(rule, rule, lambda: "ok", methods=["GET", "POST"])
+    limiter = ratelimit.install(app, ratelimit.Limiter(ratelimit.MemoryBackend(), capacity=4))
+    return app.test_client(), limiter
+
+
+def test_every_route_has_a_traffic_class():
+    rules = {r.rule for r in smartpark.app.url_map.iter_rules()}
+    assert rules <= set(ratelimit.ENDPOINT_CLASSES), rules - set(ratelimit.ENDPOINT_CLASSES)
+
+
+def test_bucket_refills_at_its_rate():
+    backend = ratelimit.MemoryBackend()
+    assert [backend.take("k", 1.0, 2.0)[0] for _ in range(3)] == [True, True, False]
+    allowed, wait = backend.take("k", 1.0, 2.0)
+    assert not allowed and 0 < wait <= 1.0
+
+
+def test_over_limit_gets_429_with_retry_after(limited):
+    client, _ = limited
+    body = {"email": "a@example.com"}
+    codes = [client.post("/reservation/create", json=body).status_code for _ in range(3)]
+    assert codes == [200, 200, 429]
+    resp = client.post("/reservation/create", json=body)
+    assert resp.headers["Retry-After"] == "1" and resp.get_json()["retry_after"] == 1
+
+
+def test_a_client_cannot_drain_another_addresses_bucket(limited):
+    client, _ = limited
+    body = {"email": "victim@example.com"}
+    for _ in range(3):
+        client.post("/reservation/create", json=body, environ_base={"REMOTE_ADDR": "10.0.0.9"})
+    assert client.post("/reservation/create", json=body,
+                       environ_base={"REMOTE_ADDR": "10.0.0.1"}).status_code == 200
+
+
+def test_low_priority_classes_are_shed_first(limited):
+    client, limiter = limited
+    for _ in range(3):                  # 3 of 4 in flight: polls shed at 75 %
+        assert limiter.admit("booking")
+    resp = client.get("/slots/status")
+    assert resp.status_code == 503 and resp.headers["Retry-After"] == "3"
+    assert client.post("/reservation/create", json={}).status_code == 200
+
+
+
+def test_shared_memory_updates_exclude_other_threads(tmp_path):
+    backend = ratelimit.SharedMemoryBackend(str(tmp_path / "buckets"), rows=64)
+    done = threading.Event()
+    other = threading.Thread(target=lambda: (backend.take("ip:10.0.0.1", 1.0, 5), done.set()))
+    with backend._locked():
+        other.start()
+        # flock alone lets a thread sharing the fd straight through
+        assert not done.wait(0.2)
+    assert done.wait(5)
+    other.join()
@@ -0,0 +1,41 @@
+import gzip
+import json
+from datetime import datetime
+
+import pytest
+from flask.json.provider import DefaultJSONProvider
+
+import app as smartpark
+import json_provider
+from app import db
+
+
+@pytest.mark.skipif(json_provider.orjson is None, reason="orjson not installed")
+def test_orjson_provider_matches_stdlib():
+    payload = {"id": 1, "when": datetime(2030, 1, 2, 3, 4), "items": [1.5, None, "é"]}
+    fast = json_provider.OrjsonProvider(smartpark.app)
+    stdlib = DefaultJSONProvider(smartpark.app)
+    assert json.loads(fast.dumps(payload)) == json.loads(stdlib.dumps(payload))
+
+
+def test_large_lists_are_gzipped_when_accepted(client):
+    with smartpark.app.app_context():
+        lot = smartpark.lot_directory.get(smartpark.lots.DEFAULT_LOT)
+        db.session.add_all(smartpark.ParkingSlot(lot_id=lot.id, slot_code=f"A{i}", status="available")
+                           for i in range(1, 201))
+        db.session.commit()
+
+    plain = client.get("/slots/status")
+    assert "Content-Encoding" not in plain.headers
+    assert "Accept-Encoding" in plain.headers["Vary"]
+
+    packed = client.get("/slots/status", headers={"Accept-Encoding": "gzip"})
+    assert packed.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(packed.data)) == plain.get_json()
+    assert len(packed.data) < len(plain.data) // 4
+
+
+def test_small_responses_are_not_compressed(client):
+    resp = client.get("/notifications/nobody@example.com", headers={"Accept-Encoding": "gzip"})
+    assert resp.get_json() == []
+    assert "Content-Encoding" not in resp.headers
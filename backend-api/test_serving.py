@@ -0,0 +1,18 @@
+import serving
+
+
+def test_api_runs_one_worker_while_it_owns_the_camera(monkeypatch):
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    monkeypatch.setattr(serving, "CPU_COUNT", 4)
+    monkeypatch.setattr(serving, "STREAM_BASE_URL", "")
+    monkeypatch.setattr(serving, "FRAME_BUS", "")
+    assert serving.gunicorn_settings("api")["workers"] == 1
+
+    monkeypatch.setattr(serving, "FRAME_BUS", "smartpark-frames")
+    assert serving.gunicorn_settings("api")["workers"] == 9
+
+    monkeypatch.setattr(serving, "FRAME_BUS", "")
+    monkeypatch.setattr(serving, "STREAM_BASE_URL", "http://stream:5001")
+    settings = serving.gunicorn_settings("api")
+    assert settings["workers"] == 9
+    assert settings["threads"] == 4                 # no stream threads: video is redirected
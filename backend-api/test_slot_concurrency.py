@@ -0,0 +1,76 @@
+import random
+import threading
+from collections import Counter
+
+import app as smartpark
+import slot_states
+from app import ParkingSlot, Reservation
+
+BOOKERS, VISION, UPDATES = 24, 4, 15
+
+
+def test_transition_table_covers_every_status():
+    for status in slot_states.STATUSES:
+        for event in (*slot_states.VISION_EVENTS, slot_states.RELEASE):
+            assert slot_states.transition(status, event) is not None
+    assert slot_states.transition("reserved", "available") == slot_states.KEEP
+    assert slot_states.transition("occupied", "reserve") is None
+    assert slot_states.transition("available", "reserved") is None     # only bookings reserve
+    assert slot_states.settle("blocked", slot_states.RELEASE) == "blocked"
+
+
+def test_concurrent_bookings_and_vision_updates_never_double_book(client, driver):
+    client.get("/slots/status")                      # seeds the 12 slots
+    start = threading.Barrier(BOOKERS + VISION)
+    statuses, lock = Counter(), threading.Lock()
+
+    def book():
+        c = smartpark.app.test_client()
+        start.wait()
+        resp = c.post("/reservation/create", json={
+            "email": driver, "vehicle_id": 1,
+            "start_time": "2030-01-01 10:00", "end_time": "2030-01-01 11:00"})
+        with lock:
+            statuses[resp.status_code] += 1
+
+    def vision(seed):
+        rng = random.Random(seed)
+        c = smartpark.app.test_client()
+        start.wait()
+        for _ in range(UPDATES):
+            resp = c.post("/update-slot", json={"slot_code": f"A{rng.randint(1, 12)}",
+                                                "status": rng.choice(slot_states.VISION_EVENTS)})
+            with lock:
+                statuses[resp.status_code] += 1
+
+    threads = ([threading.Thread(target=book) for _ in range(BOOKERS)]
+               + [threading.Thread(target=vision, args=(n,)) for n in range(VISION)])
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert set(statuses) <= {200, 201, 404, 409}, statuses
+    with smartpark.app.app_context():
+        active = Reservation.query.filter_by(status="active").all()
+        slots = {s.id: s for s in ParkingSlot.query}
+        # one active reservation per slot, and its slot is not up for grabs
+        assert max(Counter(r.slot_id for r in active).values(), default=0) == 1
+        assert all(slots[r.slot_id].status != "available" for r in active)
+        assert len(active) == statuses[201]
+        reserved = {s.id for s in slots.values() if s.status == "reserved"}
+        assert reserved <= {r.slot_id for r in active}
+
+
+
+def test_a_car_leaving_does_not_free_a_booked_slot(client, driver):
+    booking = {"email": driver, "vehicle_id": 1,
+               "start_time": "2030-01-01 10:00", "end_time": "2030-01-01 11:00"}
+    code = client.post("/reservation/create", json=booking).get_json()["slot"]
+    client.post("/update-slot", json={"slot_code": code, "status": "occupied"})
+    client.post("/update-slot", json={"slot_code": code, "status": "available"})
+    with smartpark.app.app_context():
+        assert ParkingSlot.query.filter_by(slot_code=code).one().status == "reserved"
+
+    for _ in range(11):
+        assert client.post("/reservation/create", json=booking).get_json()["slot"] != code
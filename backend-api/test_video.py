@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from werkzeug.datastructures import MultiDict
+
+import app as smartpark
+import encoders
+
+
+def _params(**query):
+    return smartpark._stream_params(MultiDict(query), default_quality=75)
+
+
+def test_adaptive_width_is_capped_by_an_explicit_width():
+    slow = _params(adaptive="1", rtt="1000", w="640")
+    assert (slow["width"], slow["quality"], slow["fps"]) == (256, 45, 4)
+    assert _params(adaptive="1", rtt="50", w="400")["width"] == 400
+    assert _params(adaptive="1", rtt="1000", q="90")["quality"] == 90
+    assert _params(w="640")["width"] == 640          # not adaptive: w is exact
+
+
+@pytest.mark.skipif(not encoders.h264_available(), reason="no PyAV or ffmpeg")
+def test_h264_feed_encodes_every_frame_on_the_pool(monkeypatch):
+    frames = [np.full((48, 64, 3), v, np.uint8) for v in (0, 80, 160)]
+    monkeypatch.setattr(smartpark, "_read_frames", lambda *a: ((f, None) for f in frames))
+    pushed = []
+    push_async = encoders.H264Stream.push_async
+    monkeypatch.setattr(encoders.H264Stream, "push_async",
+                        lambda self, frame: pushed.append(frame) or push_async(self, frame))
+
+    data = b"".join(smartpark._generate_h264(None, _params(fps="5")))
+    assert len(pushed) == 3 and b"ftyp" in data[:64]
+
+
+def test_guidance_video_uses_the_lot_grid(client, monkeypatch):
+    client.post("/lots", json={"lot": "wide", "name": "Wide lot", "rows": 2, "cols": 6})
+    monkeypatch.setattr(smartpark, "_capture", lambda: (True, np.zeros((240, 360, 3), np.uint8)))
+    monkeypatch.setattr(encoders, "encode", lambda frame, fmt, q: (frame, "image/x-test"))
+    seen = []
+    draw = smartpark._draw_overlay
+    monkeypatch.setattr(smartpark, "_draw_overlay", lambda *a: seen.append(a[3]) or draw(*a))
+
+    assert client.get("/video-snapshot?lot=wide&slot=A8").status_code == 200
+    assert client.get("/video-snapshot?slot=A8").status_code == 200
+    assert seen == [(2, 6), (3, 4)]
+
+    frame = smartpark._draw_overlay(np.zeros((240, 360, 3), np.uint8), "A8", None, (2, 6))
+    green = np.argwhere((frame[..., 1] == 255) & (frame[..., 0] == 0))
+    top, left = green.min(axis=0)
+    bottom, right = green.max(axis=0)
+    # row 2, column 2 of a 2 x 6 grid: y 120..240, x 60..120 (plus the border)
+    assert abs(top - 120) <= 4 and abs(left - 60) <= 4 and abs(right - 120) <= 4
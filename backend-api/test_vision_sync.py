@@ -0,0 +1,94 @@
+import pytest
+import requests
+
+import app as smartpark
+import vision_sync
+from app import db
+
+CODES = [f"A{n}" for n in range(1, 13)]
+
+
+class Backend:
+    """requests-style get/post against the app's test client; down=True refuses connections."""
+
+    def __init__(self, client):
+        self.client = client
+        self.down = False
+        self.posted = []
+
+    def get(self, url, params=None, timeout=None):
+        return self._send("get", url, query_string=params)
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        self.posted.append(json)
+        return self._send("post", url, json=json, headers=headers)
+
+    def _send(self, method, url, **kwargs):
+        if self.down:
+            raise requests.ConnectionError("backend down")
+        return Reply(getattr(self.client, method)(url.removeprefix(vision_sync.SERVER), **kwargs))
+
+
+class Reply:
+    def __init__(self, resp):
+        self.status_code, self.json = resp.status_code, resp.get_json
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"HTTP {self.status_code}")
+
+
+@pytest.fixture()
+def backend(client):
+    b = Backend(client)
+    client.get("/slots/status")                     # seeds the 12 slots
+    return b
+
+
+def _backend_status(backend):
+    return {s["slot_code"]: s["status"] for s in backend.client.get("/slots/status").get_json()}
+
+
+def test_updates_survive_an_outage_and_a_restart(backend, tmp_path):
+    path = str(tmp_path / "vision.db")
+    sync = vision_sync.SlotSync(vision_sync.SlotStore(path), http=backend)
+    assert sync.reconcile(CODES, jitter=0) is True
+    backend.down = True
+    sync.observe({"A1": "occupied", "A2": "occupied"})
+    sync.observe({"A2": "available"})               # came and went: nothing to send
+    assert sync.flush() == 0
+    assert _backend_status(backend)["A1"] == "available"
+
+    # the process restarts while the backend is still down
+    sync.store.close()
+    sync = vision_sync.SlotSync(vision_sync.SlotStore(path), http=backend)
+    assert sync.store.pending("") == [("A1", "occupied")]
+    assert sync.reconcile(CODES, jitter=0) is False
+
+    backend.down = False
+    assert sync.flush() == 1
+    assert _backend_status(backend)["A1"] == "occupied"
+    assert sync.store.pending("") == []
+    assert sync.store.acked("")["A1"] == "occupied"
+
+
+def test_reconcile_only_sends_real_differences(backend, tmp_path):
+    backend.client.post("/update-slot", json={"slot_code": "A3", "status": "blocked"})
+    with smartpark.app.app_context():
+        slot = smartpark.ParkingSlot.query.filter_by(slot_code="A4").one()
+        slot.status = "reserved"
+        db.session.commit()
+
+    sync = vision_sync.SlotSync(vision_sync.SlotStore(str(tmp_path / "vision.db")), http=backend)
+    assert sync.reconcile(CODES, jitter=0) is True
+    assert sync.acked["A3"] == "blocked"            # hidden by /slots/status
+
+    frame = dict.fromkeys(CODES, "available")
+    frame["A3"] = "blocked"
+    frame["A5"] = "occupied"
+    # A4 is an empty reserved bay: vision seeing it free changes nothing
+    assert sync.observe(frame) == 1
+    backend.posted.clear()
+    assert sync.flush() == 1
+    assert backend.posted == [{"updates": [{"slot_code": "A5", "status": "occupied"}]}]
+    assert sync.observe(frame) == 0 and sync.flush() == 0
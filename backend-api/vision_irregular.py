@@ -8,15 +8,28 @@ Rules (inside white boundary only):
 
 Dynamic allocation:
   • Each frame we decide which grid cell each detected object is in
-  • Changes are POSTed to the Flask backend (/update-slot)
+  • Changes are journalled locally and POSTed to the Flask backend
+    (/update-slot/batch) — see vision_sync.py
   • Backend handles: reallocation when green enters a reserved slot
+  • With FRAME_BUS set, frames, car boxes and the rendered overlay are
+    published to shared memory for the Flask video endpoints (frame_bus.py)
 """
 
+import os
+
 import cv2
 import numpy as np
-import requests
 
-SERVER_URL = "http://127.0.0.1:5000/update-slot"
+import frame_bus
+import metrics
+import vision_sync
+from log_config import get_logger
+from overlay import GridOverlay
+
+LOT = os.getenv("VISION_LOT") or None                       # None = the server's default lot
+METRICS_PORT = int(os.getenv("VISION_METRICS_PORT", "0"))   # 0 = no /metrics server
+
+log = get_logger("smartpark.vision")
 
 ROWS = 3
 COLS = 4
@@ -80,7 +93,8 @@ def detect_boundary(frame, hsv):
 def _detect_colour(hsv, rect_mask, colour_ranges, min_area, frame,
                    draw_colour, label):
     """
-    Build colour mask, restrict to inside boundary rect, find contour centres.
+    Build colour mask, restrict to inside boundary rect, find contour boxes
+    (x, y, w, h).
     """
     combo = np.zeros(hsv.shape[:2], dtype=np.uint8)
     for lo, hi in colour_ranges:
@@ -94,17 +108,21 @@ def _detect_colour(hsv, rect_mask, colour_ranges, min_area, frame,
     combo = cv2.morphologyEx(combo, cv2.MORPH_CLOSE, kernel)
 
     cnts, _ = cv2.findContours(combo, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    centres = []
+    boxes = []
     for cnt in cnts:
         if cv2.contourArea(cnt) < min_area:
             continue
         rx, ry, rw, rh = cv2.boundingRect(cnt)
-        cx, cy = rx + rw // 2, ry + rh // 2
-        centres.append((cx, cy))
+        boxes.append((rx, ry, rw, rh))
         cv2.rectangle(frame, (rx, ry), (rx + rw, ry + rh), draw_colour, 2)
         cv2.putText(frame, label, (rx, max(ry - 6, 10)),
                     cv2.FONT_HERSHEY_SIMPLEX, 0.55, draw_colour, 2)
-    return centres
+    return boxes
+
+
+def centre(box):
+    x, y, w, h = box
+    return x + w // 2, y + h // 2
 
 
 def detect_cars(hsv, rect_mask, frame):
@@ -141,123 +159,152 @@ def pix_to_cell(cx, cy, bx, by, bw, bh):
 # 4. DRAW GRID OVERLAY
 # ─────────────────────────────────────────────────────────────────────────────
 
-def draw_grid(frame, bx, by, bw, bh, car_cells, green_cells):
-    sw = bw / COLS
-    sh = bh / ROWS
+def _paint_available(layer, code, x1, y1, x2, y2):
+    layer.rectangle((x1, y1), (x2, y2), CLR_AVAILABLE, 1)
+    layer.text(code, (x1+4, y1+20), 0.4, CLR_AVAILABLE, 1)
 
-    for r in range(ROWS):
-        for c in range(COLS):
-            x1 = int(bx + c * sw);  y1 = int(by + r * sh)
-            x2 = int(x1 + sw);      y2 = int(y1 + sh)
-            code = f"A{r * COLS + c + 1}"
 
-            if (r, c) in green_cells:
-                cv2.rectangle(frame, (x1, y1), (x2, y2), CLR_BLOCKED, 2)
-                for sy in range(y1, y2, 10):
-                    cv2.line(frame, (x1, sy), (x2, sy), CLR_BLOCKED, 1)
-                cv2.putText(frame, "BLOCKED", (x1+4, y1+20),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.35, CLR_BLOCKED, 1)
-            elif (r, c) in car_cells:
-                overlay = frame.copy()
-                cv2.rectangle(overlay, (x1,y1), (x2,y2), (40,0,80), cv2.FILLED)
-                cv2.addWeighted(overlay, 0.3, frame, 0.7, 0, frame)
-                cv2.rectangle(frame, (x1,y1), (x2,y2), CLR_OCCUPIED, 2)
-                cv2.putText(frame, f"{code} CAR", (x1+4, y1+20),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.35, CLR_OCCUPIED, 1)
-            else:
-                cv2.rectangle(frame, (x1,y1), (x2,y2), CLR_AVAILABLE, 1)
-                cv2.putText(frame, code, (x1+4, y1+20),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.4, CLR_AVAILABLE, 1)
+def _paint_occupied(layer, code, x1, y1, x2, y2):
+    layer.rectangle((x1, y1), (x2, y2), (40, 0, 80), cv2.FILLED, opacity=0.3)
+    layer.rectangle((x1, y1), (x2, y2), CLR_OCCUPIED, 2)
+    layer.text(f"{code} CAR", (x1+4, y1+20), 0.35, CLR_OCCUPIED, 1)
 
 
-# ─────────────────────────────────────────────────────────────────────────────
-# 5. BACKEND SYNC  (only post when status changes)
-# ─────────────────────────────────────────────────────────────────────────────
+def _paint_blocked(layer, code, x1, y1, x2, y2):
+    layer.rectangle((x1, y1), (x2, y2), CLR_BLOCKED, 2)
+    for sy in range(y1, y2, 10):
+        layer.line((x1, sy), (x2, sy), CLR_BLOCKED, 1)
+    layer.text("BLOCKED", (x1+4, y1+20), 0.35, CLR_BLOCKED, 1)
+
+
+# Cell artwork is rendered once per boundary; a boundary that jitters by a
+# few pixels between frames keeps the cached layout.
+_grid = GridOverlay(ROWS, COLS, {
+    "available": _paint_available,
+    "occupied":  _paint_occupied,
+    "blocked":   _paint_blocked,
+}, tolerance=4)
 
-def sync_slots(car_cells, green_cells, slot_states):
+
+def cell_states(car_cells, green_cells):
+    """Map grid cells to {slot_code: available / occupied / blocked}."""
+    states = {}
     for r in range(ROWS):
         for c in range(COLS):
             code = f"A{r * COLS + c + 1}"
             if (r, c) in green_cells:
-                status = "blocked"
+                states[code] = "blocked"
             elif (r, c) in car_cells:
-                status = "occupied"
+                states[code] = "occupied"
             else:
-                status = "available"
+                states[code] = "available"
+    return states
+
 
-            if slot_states.get(code) != status:
-                try:
-                    resp = requests.post(SERVER_URL,
-                                         json={"slot_code": code, "status": status},
-                                         timeout=2)
-                    slot_states[code] = status
-                    print(f"[SYNC] {code} → {status}  (HTTP {resp.status_code})")
-                except Exception as e:
-                    print(f"[SYNC ERR] {code}: {e}")
+def draw_grid(frame, bx, by, bw, bh, car_cells, green_cells):
+    _grid.render(frame, (bx, by, bw, bh), cell_states(car_cells, green_cells))
 
 
 # ─────────────────────────────────────────────────────────────────────────────
-# 6. MAIN LOOP
+# 5. BACKEND SYNC  (only post real changes; survives restarts and outages)
 # ─────────────────────────────────────────────────────────────────────────────
 
-cap = cv2.VideoCapture(0)
-if not cap.isOpened():
-    print("[ERROR] Cannot open camera.")
-    exit(1)
+def sync_slots(car_cells, green_cells, sync):
+    sync.observe(cell_states(car_cells, green_cells))
+    sync.flush()
 
-slot_states = {}
-print("SmartPark Vision started.  Press 'q' to quit.")
-print(f"Grid: {ROWS}x{COLS}  |  RED/YELLOW=car  GREEN=blocked  WHITE=boundary\n")
 
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        continue
+# ─────────────────────────────────────────────────────────────────────────────
+# 6. MAIN LOOP
+# ─────────────────────────────────────────────────────────────────────────────
+
+def main():
+    cap = cv2.VideoCapture(0)
+    if not cap.isOpened():
+        log.error("cannot open camera")
+        return
+
+    if METRICS_PORT:
+        metrics.serve(METRICS_PORT)
+    report = metrics.StageReport(log)
+
+    sync = vision_sync.SlotSync(vision_sync.SlotStore(), lot=LOT)
+    sync.reconcile(cell_states(set(), set()))
+    bus = frame_bus.FrameWriter() if frame_bus.FRAME_BUS else None
+    print("SmartPark Vision started.  Press 'q' to quit.")
+    print(f"Grid: {ROWS}x{COLS}  |  RED/YELLOW=car  GREEN=blocked  WHITE=boundary\n")
+
+    while True:
+        report.tick()
+        with report.stage("capture"):
+            ret, frame = cap.read()
+        if not ret:
+            continue
+        if bus:
+            with report.stage("publish"):
+                bus.begin(frame)            # raw frame, before anything is drawn on it
+
+        with report.stage("hsv"):
+            hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+
+        # ── 1. Find boundary ──────────────────────────────────────────────────
+        with report.stage("boundary"):
+            boundary, rect, rect_mask = detect_boundary(frame, hsv)
+
+        if boundary is None:
+            cv2.putText(frame, "No white boundary detected", (20, 40),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 80, 255), 2)
+            cv2.putText(frame, "Place white sheet in camera view", (20, 70),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.55, (0, 80, 255), 1)
+            if bus:
+                bus.commit(frame)
+            cv2.imshow("SmartPark Vision", frame)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+            continue
 
-    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        bx, by, bw, bh = rect
+        cv2.drawContours(frame, [boundary], -1, CLR_BOUNDARY, 2)
 
-    # ── 1. Find boundary ──────────────────────────────────────────────────────
-    boundary, rect, rect_mask = detect_boundary(frame, hsv)
+        # ── 2. Detect colours inside boundary ────────────────────────────────
+        with report.stage("detect"):
+            car_boxes   = detect_cars(hsv, rect_mask, frame)
+            green_boxes = detect_green(hsv, rect_mask, frame)
 
-    if boundary is None:
-        cv2.putText(frame, "No white boundary detected", (20, 40),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 80, 255), 2)
-        cv2.putText(frame, "Place white sheet in camera view", (20, 70),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.55, (0, 80, 255), 1)
-        cv2.imshow("SmartPark Vision", frame)
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-        continue
+        # ── 3. Map to grid cells ──────────────────────────────────────────────
+        car_cells   = {pix_to_cell(*centre(b), bx, by, bw, bh) for b in car_boxes}
+        green_cells = {pix_to_cell(*centre(b), bx, by, bw, bh) for b in green_boxes}
+        car_cells  -= green_cells   # obstacle wins
 
-    bx, by, bw, bh = rect
-    cv2.drawContours(frame, [boundary], -1, CLR_BOUNDARY, 2)
+        # ── 4. Overlay ────────────────────────────────────────────────────────
+        with report.stage("overlay"):
+            draw_grid(frame, bx, by, bw, bh, car_cells, green_cells)
 
-    # ── 2. Detect colours inside boundary ────────────────────────────────────
-    car_centres   = detect_cars(hsv, rect_mask, frame)
-    green_centres = detect_green(hsv, rect_mask, frame)
+        # ── 5. Sync to backend ────────────────────────────────────────────────
+        with report.stage("sync"):
+            sync_slots(car_cells, green_cells, sync)
 
-    # ── 3. Map to grid cells ──────────────────────────────────────────────────
-    car_cells   = {pix_to_cell(cx, cy, bx, by, bw, bh) for cx, cy in car_centres}
-    green_cells = {pix_to_cell(gx, gy, bx, by, bw, bh) for gx, gy in green_centres}
-    car_cells  -= green_cells   # obstacle wins
+        # ── 6. HUD ────────────────────────────────────────────────────────────
+        free = ROWS * COLS - len(car_cells) - len(green_cells)
+        hud  = (f"  Cars:{len(car_cells)}  Blocked:{len(green_cells)}  "
+                f"Free:{free}  Boundary:{bw}x{bh}")
+        cv2.putText(frame, hud, (10, frame.shape[0] - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, CLR_HUD, 1)
 
-    # ── 4. Overlay ────────────────────────────────────────────────────────────
-    draw_grid(frame, bx, by, bw, bh, car_cells, green_cells)
+        if bus:
+            with report.stage("publish"):
+                bus.commit(frame, cars=car_boxes, boundary=rect)
 
-    # ── 5. Sync to backend ────────────────────────────────────────────────────
-    sync_slots(car_cells, green_cells, slot_states)
+        cv2.imshow("SmartPark Vision", frame)
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            print("\nVision stopped.")
+            break
 
-    # ── 6. HUD ────────────────────────────────────────────────────────────────
-    free = ROWS * COLS - len(car_cells) - len(green_cells)
-    hud  = (f"  Cars:{len(car_cells)}  Blocked:{len(green_cells)}  "
-            f"Free:{free}  Boundary:{bw}x{bh}")
-    cv2.putText(frame, hud, (10, frame.shape[0] - 10),
-                cv2.FONT_HERSHEY_SIMPLEX, 0.5, CLR_HUD, 1)
+    cap.release()
+    if bus:
+        bus.close()
+    cv2.destroyAllWindows()
 
-    cv2.imshow("SmartPark Vision", frame)
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        print("\nVision stopped.")
-        break
 
-cap.release()
-cv2.destroyAllWindows()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+vision_sync.py  —  Durable slot sync from a vision node to the backend
+──────────────────────────────────────────────────────────────────────
+The camera loop reports what it sees every frame; SlotSync turns that into
+as few backend writes as possible and never loses one:
+
+  acked     the status the backend last confirmed for each slot (2xx only)
+  pending   updates the backend has not confirmed yet — one row per slot,
+            the latest observation wins, so a car that comes and goes
+            during an outage is not replayed as two stale writes
+
+Both live in a small SQLite file (VISION_STATE_PATH, WAL mode) on the
+vision node and survive restarts. pending is flushed through
+/update-slot/batch; network errors and non-2xx responses keep the journal
+and back off exponentially with full jitter, per-item rejections (unknown
+slot) drop the item.
+
+On startup reconcile() reads /slots/status once, after a random delay of
+up to VISION_START_JITTER seconds, and replaces acked with the backend's
+view, so cameras restarting together only send real differences instead
+of re-posting every cell. An observation is a real difference when it
+would change the slot per slot_states (an empty reserved bay is not).
+"""
+
+import os
+import random
+import sqlite3
+import time
+
+import requests
+
+import metrics
+import slot_states
+from log_config import get_logger
+
+SERVER = os.getenv("VISION_SERVER", "http://127.0.0.1:5000").rstrip("/")
+STATE_PATH = os.getenv("VISION_STATE_PATH", "vision_state.db")
+START_JITTER = float(os.getenv("VISION_START_JITTER", 3))   # seconds
+
+RETRY_BASE, RETRY_MAX = 0.5, 60.0     # seconds, backoff between failed flushes
+BATCH_SIZE = 100
+TIMEOUT = 2
+
+log = get_logger("smartpark.vision")
+
+SYNCED = metrics.REGISTRY.counter(
+    "smartpark_vision_sync_total", "Slot updates sent by the vision node", labels=("outcome",))
+PENDING = metrics.REGISTRY.gauge(
+    "smartpark_vision_pending_updates", "Slot updates waiting for the backend")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS acked (
+    lot        TEXT NOT NULL,
+    slot_code  TEXT NOT NULL,
+    status     TEXT NOT NULL,
+    PRIMARY KEY (lot, slot_code)
+);
+CREATE TABLE IF NOT EXISTS pending (
+    lot        TEXT NOT NULL,
+    slot_code  TEXT NOT NULL,
+    status     TEXT NOT NULL,
+    queued_at  REAL NOT NULL,
+    PRIMARY KEY (lot, slot_code)
+);
+"""
+
+
+def is_change(current, status):
+    """True when reporting `status` would change a slot the backend has in `current`."""
+    return slot_states.settle(current, status) != current
+
+
+class SlotStore:
+    """acked / pending tables for one or more lots in a SQLite file."""
+
+    def __init__(self, path=STATE_PATH):
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def acked(self, lot):
+        rows = self.conn.execute("SELECT slot_code, status FROM acked WHERE lot = ?", (lot,))
+        return dict(rows)
+
+    def pending(self, lot):
+        """[(slot_code, status)] oldest first."""
+        return self.conn.execute(
+            "SELECT slot_code, status FROM pending WHERE lot = ? ORDER BY queued_at, slot_code",
+            (lot,)).fetchall()
+
+    def queue(self, lot, updates, cancel=()):
+        """Upsert `updates` {slot_code: status} into pending and remove `cancel` codes."""
+        now = time.time()
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "INSERT INTO pending (lot, slot_code, status, queued_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (lot, slot_code) DO UPDATE SET status = excluded.status",
+                [(lot, code, status, now) for code, status in updates.items()])
+            self.conn.executemany("DELETE FROM pending WHERE lot = ? AND slot_code = ?",
+                                  [(lot, code) for code in cancel])
+
+    def ack(self, lot, confirmed, done):
+        """
+        Record `confirmed` {slot_code: status} as the backend's state and
+        remove the `done` [(slot_code, status)] items from pending — unless a
+        newer status was queued for that slot meanwhile.
+        """
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO acked (lot, slot_code, status) VALUES (?, ?, ?)",
+                [(lot, code, status) for code, status in confirmed.items()])
+            self.conn.executemany(
+                "DELETE FROM pending WHERE lot = ? AND slot_code = ? AND status = ?",
+                [(lot, code, status) for code, status in done])
+
+    def replace_acked(self, lot, states):
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.execute("DELETE FROM acked WHERE lot = ?", (lot,))
+            self.conn.executemany("INSERT INTO acked (lot, slot_code, status) VALUES (?, ?, ?)",
+                                  [(lot, code, status) for code, status in states.items()])
+
+    def close(self):
+        self.conn.close()
+
+
+class SlotSync:
+    """Per-lot sync state for the camera loop: observe() every frame, then flush()."""
+
+    def __init__(self, store, lot=None, server=SERVER, http=None):
+        self.store, self.lot, self.server = store, lot, server
+        self.http = http or requests.Session()
+        self._key = lot or ""                 # None = the server's default lot
+        self.acked = store.acked(self._key)
+        self.seen = {**self.acked, **dict(store.pending(self._key))}
+        self._failures = 0
+        self._retry_at = 0.0
+        PENDING.set(len(store.pending(self._key)))
+
+    def reconcile(self, codes=(), jitter=START_JITTER):
+        """
+        Adopt the backend's current slot statuses as acked and drop pending
+        updates they already satisfy. `codes` are the camera's cells, so a
+        blocked one (not listed by /slots/status) is known to be blocked.
+        Returns False (keeping the stored state) when the backend cannot be
+        reached.
+        """
+        if jitter:
+            time.sleep(random.uniform(0, jitter))
+        try:
+            resp = self.http.get(f"{self.server}/slots/status",
+                                 params={"lot": self.lot} if self.lot else None, timeout=TIMEOUT)
+            resp.raise_for_status()
+            backend = {s["slot_code"]: s["status"] for s in resp.json()}
+        except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+            log.warning("reconcile failed, using stored slot state", extra={"error": str(e)})
+            return False
+
+        # /slots/status hides blocked slots from the UI
+        for code in (*codes, *self.seen):
+            backend.setdefault(code, slot_states.BLOCKED)
+        pending = self.store.pending(self._key)
+        stale = [code for code, status in pending if not is_change(backend.get(code), status)]
+        self.store.replace_acked(self._key, backend)
+        self.store.queue(self._key, {}, cancel=stale)
+        self.acked = backend
+        self.seen = {**backend, **{code: status for code, status in pending if code not in stale}}
+        PENDING.set(len(pending) - len(stale))
+        log.info("slot state reconciled", extra={"slots": len(backend),
+                                                 "pending": len(pending) - len(stale)})
+        return True
+
+    def observe(self, states):
+        """Journal the cells in `states` {slot_code: status} that changed since last seen."""
+        changed = {code: status for code, status in states.items() if self.seen.get(code) != status}
+        if not changed:
+            return 0
+        self.seen.update(changed)
+        updates = {code: status for code, status in changed.items()
+                   if is_change(self.acked.get(code), status)}
+        self.store.queue(self._key, updates, cancel=[c for c in changed if c not in updates])
+        PENDING.set(len(self.store.pending(self._key)))
+        return len(updates)
+
+    def flush(self):
+        """
+        Send pending updates as one batch unless backing off. Returns the
+        number the backend confirmed.
+        """
+        if time.monotonic() < self._retry_at:
+            return 0
+        pending = self.store.pending(self._key)[:BATCH_SIZE]
+        if not pending:
+            return 0
+        body = {"updates": [{"slot_code": code, "status": status} for code, status in pending]}
+        if self.lot:
+            body["lot"] = self.lot
+        try:
+            resp = self.http.post(f"{self.server}/update-slot/batch", json=body,
+                                  headers={"X-Client-Type": "vision"}, timeout=TIMEOUT)
+            if resp.status_code // 100 != 2:
+                return self._back_off(f"HTTP {resp.status_code}", len(pending))
+            results = resp.json()["results"]
+        except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+            return self._back_off(str(e), len(pending))
+
+        confirmed = {}
+        for result in results:
+            code, status = pending[result["index"]]
+            if result["ok"]:
+                confirmed[code] = slot_states.settle(self.acked.get(code), status)
+            else:
+                log.warning("slot update rejected", extra={"slot": code, "status": status,
+                                                           "error": result.get("message")})
+        self.store.ack(self._key, confirmed, pending)
+        self.acked.update(confirmed)
+        self._failures, self._retry_at = 0, 0.0
+        SYNCED.inc(len(confirmed), outcome="acked")
+        SYNCED.inc(len(pending) - len(confirmed), outcome="rejected")
+        PENDING.set(len(self.store.pending(self._key)))
+        log.info("slots synced", extra={"acked": len(confirmed),
+                                        "rejected": len(pending) - len(confirmed)})
+        return len(confirmed)
+
+    def _back_off(self, error, count):
+        self._failures += 1
+        delay = random.uniform(0, min(RETRY_MAX, RETRY_BASE * 2 ** self._failures))
+        self._retry_at = time.monotonic() + delay
+        SYNCED.inc(count, outcome="retry")
+        log.warning("slot sync failed", extra={"pending": count, "error": error,
+                                               "retry_in_s": round(delay, 2)})
+        return 0
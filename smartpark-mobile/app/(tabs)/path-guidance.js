@@ -9,6 +9,8 @@ import {
   ScrollView,
   ActivityIndicator,
   TouchableOpacity,
+  Dimensions,
+  PixelRatio,
 } from "react-native";
 import { router } from "expo-router";
 import GradientScreen from "../../components/GradientScreen";
@@ -17,6 +19,18 @@ import PrimaryButton from "../../components/PrimaryButton";
 import { session } from "../../src/api/store/session";
 import { api } from "../../src/api/client";
 
+// Snapshot polling: the next frame is requested once the previous one has
+// loaded, never faster than MIN_FRAME_MS. The smoothed load time is sent to
+// the backend, which picks resolution / quality to match the network.
+const MIN_FRAME_MS = 250;
+const RTT_SMOOTHING = 0.3;
+
+// Never ask for more pixels than the camera box can show
+const SNAPSHOT_WIDTH = Math.min(
+  640,
+  Math.round((Dimensions.get("window").width - 32) * PixelRatio.get())
+);
+
 export default function PathGuidance() {
   const [slot, setSlot] = useState(null);
   const [instructions, setInstructions] = useState([]);
@@ -25,6 +39,8 @@ export default function PathGuidance() {
   const [error, setError] = useState(null);
   const [imgError, setImgError] = useState(false);
   const intervalRef = useRef(null);
+  const requestedAt = useRef(0);
+  const rttMs = useRef(null);
 
   // ── Load slot + instructions ──────────────────────────────────────────────
   const loadData = useCallback(async () => {
@@ -76,23 +92,41 @@ export default function PathGuidance() {
 
   useEffect(() => {
     loadData();
-
-    // Poll new snapshot every 600 ms for a live-ish feed
-    intervalRef.current = setInterval(() => setTick((t) => t + 1), 600);
-    return () => clearInterval(intervalRef.current);
+    return () => clearTimeout(intervalRef.current);
   }, [loadData]);
 
+  // Schedule the next snapshot after the current one finished loading
+  const onFrameLoaded = useCallback(() => {
+    const took = Date.now() - requestedAt.current;
+    rttMs.current =
+      rttMs.current == null
+        ? took
+        : rttMs.current + RTT_SMOOTHING * (took - rttMs.current);
+    clearTimeout(intervalRef.current);
+    intervalRef.current = setTimeout(
+      () => setTick((t) => t + 1),
+      Math.max(0, MIN_FRAME_MS - took)
+    );
+  }, []);
+
   function endParking() {
-    clearInterval(intervalRef.current);
+    clearTimeout(intervalRef.current);
     Alert.alert("Parking", "Your parking session is complete.");
     router.replace("/(tabs)/home");
   }
 
   // ── Camera snapshot URL ───────────────────────────────────────────────────
   const snapshotUri = slot
-    ? `${api.videoSnapshotUrl(slot)}&_t=${tick}`
+    ? `${api.videoSnapshotUrl(slot, {
+        width: SNAPSHOT_WIDTH,
+        rttMs: rttMs.current,
+      })}&_t=${tick}`
     : null;
 
+  useEffect(() => {
+    requestedAt.current = Date.now();
+  }, [tick, slot]);
+
   // ── Render ────────────────────────────────────────────────────────────────
   return (
     <GradientScreen>
@@ -145,6 +179,7 @@ export default function PathGuidance() {
                   source={{ uri: snapshotUri, cache: "reload" }}
                   style={styles.camImage}
                   resizeMode="cover"
+                  onLoad={onFrameLoaded}
                   onError={() => setImgError(true)}
                 />
               ) : (
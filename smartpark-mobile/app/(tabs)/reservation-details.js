@@ -1,6 +1,6 @@
 // app/(tabs)/reservation-details.js
 
-import React, { useEffect, useMemo, useState } from "react";
+import React, { useEffect, useMemo, useRef, useState } from "react";
 import {
   Alert,
   StyleSheet,
@@ -16,7 +16,7 @@ import DateTimePicker from "@react-native-community/datetimepicker";
 import GradientScreen from "../../components/GradientScreen";
 import TopBar from "../../components/TopBar";
 import PrimaryButton from "../../components/PrimaryButton";
-import { api } from "../../src/api/client";
+import { api, newIdempotencyKey } from "../../src/api/client";
 import { session } from "../../src/api/store/session";
 
 export default function ReservationDetails() {
@@ -32,6 +32,12 @@ export default function ReservationDetails() {
   const [date, setDate] = useState(new Date());
   const [time, setTime] = useState(new Date());
 
+  // Reused when the user retries the same booking after a timeout
+  const bookingKey = useRef(null);
+  useEffect(() => {
+    bookingKey.current = null;
+  }, [vehicleId, date, time]);
+
   useEffect(() => {
     (async () => {
       if (!email) return;
@@ -79,7 +85,9 @@ export default function ReservationDetails() {
         end_time: formatDT(end),
       };
 
-      const res = await api.createReservation(payload);
+      if (!bookingKey.current) bookingKey.current = newIdempotencyKey();
+      const res = await api.createReservation(payload, bookingKey.current);
+      bookingKey.current = null;
 
       router.push({
         pathname: "/(tabs)/reservation-confirmation",
@@ -2,6 +2,12 @@
 
 export const API_BASE_URL = "http://172.20.10.4:5000"; // ✅ Connected via mobile hotspot
 
+// One key per user action (not per retry): the backend replays the first
+// response for a repeated Idempotency-Key instead of booking again.
+export function newIdempotencyKey() {
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`;
+}
+
 async function request(path, { method = "GET", body, headers } = {}) {
   const controller = new AbortController();
   const timeout = setTimeout(() => controller.abort(), 12000); // 12s timeout
@@ -11,6 +17,7 @@ async function request(path, { method = "GET", body, headers } = {}) {
       method,
       headers: {
         "Content-Type": "application/json",
+        "X-Client-Type": "mobile", // server-side rate-limit bucket
         ...(headers || {}),
       },
       body: body ? JSON.stringify(body) : undefined,
@@ -76,16 +83,23 @@ export const api = {
   // RESERVATION
   // ==============================
 
-  createReservation: (payload) =>
-    request("/reservation/create", { method: "POST", body: payload }),
+  createReservation: (payload, idempotencyKey = newIdempotencyKey()) =>
+    request("/reservation/create", {
+      method: "POST",
+      body: payload,
+      headers: { "Idempotency-Key": idempotencyKey },
+    }),
 
   listReservations: (email) =>
     request(`/reservation/list/${encodeURIComponent(email)}`),
 
-  cancelReservation: (reservationId) =>
+  // lot: the "lot" field of the reservation (from listReservations)
+  // like createReservation: pass the same key only when retrying one tap
+  cancelReservation: (reservationId, lot, idempotencyKey = newIdempotencyKey()) =>
     request("/reservation/cancel", {
       method: "POST",
-      body: { reservation_id: reservationId },
+      body: { reservation_id: reservationId, lot },
+      headers: { "Idempotency-Key": idempotencyKey },
     }),
 
   // ==============================
@@ -126,8 +140,16 @@ export const api = {
     request(`/guidance/${encodeURIComponent(slotCode)}`),
 
   // Live webcam snapshot URL (for Image source — NOT a fetch call)
-  videoSnapshotUrl: (slotCode) =>
-    `${API_BASE_URL}/video-snapshot?slot=${encodeURIComponent(slotCode)}`,
+  // opts: { width, quality, crop, rttMs } — rttMs turns on adaptive mode, in
+  // which width is only an upper bound for the server's pick
+  videoSnapshotUrl: (slotCode, opts = {}) => {
+    let url = `${API_BASE_URL}/video-snapshot?slot=${encodeURIComponent(slotCode)}`;
+    if (opts.width) url += `&w=${Math.round(opts.width)}`;
+    if (opts.quality) url += `&q=${Math.round(opts.quality)}`;
+    if (opts.crop) url += "&crop=1";
+    if (opts.rttMs != null) url += `&adaptive=1&rtt=${Math.round(opts.rttMs)}`;
+    return url;
+  },
 
   // MJPEG stream URL (for browser testing)
   videoFeedUrl: (slotCode) =>